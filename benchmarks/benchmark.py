@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+'''
+Offline benchmarks for the `generate`, `build`, `precompute` and `sources` subcommands.
+
+For each scale, the harness creates a synthetic Unreal Engine tree with the requested number of ThirdParty libraries and headers,
+then runs each subcommand in a fresh process with a fake ue4cli manager (see driver.py) and a fake `conan` executable (see fakeconan.py).
+No network access, Unreal Engine installation or Conan cache is required.
+Before benchmarking, the harness also checks that Conan commands fall back to the CLI when the Conan API worker cannot be initialised.
+
+The following metrics are recorded for each subcommand at each scale:
+
+- wallTime: the wall time of the subcommand process in seconds (the median if --repeat is greater than one)
+- subprocesses: the number of external commands run by the subcommand, as recorded by the command tracer
+- conanCalls: the number of times the subcommand invoked `conan`
+- bytesCopied: the number of bytes the subcommand wrote to its output directories (precomputed data, source archives and caches)
+- peakRSS: the peak resident set size of the subcommand process in bytes
+
+Example usage:
+    
+    python3 benchmarks/benchmark.py --scale 10:1000 --scale 100:10000 -o results.json
+    python3 benchmarks/benchmark.py --scale 10:1000 --baseline results.json
+'''
+import argparse, json, os, platform, shutil, statistics, subprocess, sys, tempfile, time
+from os.path import abspath, dirname, exists, join
+
+# The directory containing the benchmark scripts
+BENCHMARK_DIR = dirname(abspath(__file__))
+
+# The subcommands that we benchmark, in the order they are run (later subcommands rely on the profile created by `generate`)
+COMMANDS = ['generate', 'build', 'precompute', 'sources']
+
+# The scales that we benchmark by default, as (libraries, headers) tuples
+DEFAULT_SCALES = [(10, 1000), (100, 10000), (500, 100000)]
+
+# The Unreal Engine version reported by the fake ue4cli manager
+ENGINE_VERSION = '4.27.2'
+
+# The number of headers placed in each subdirectory of a synthetic library's include directory
+HEADERS_PER_DIR = 100
+
+# A stand-in for the Conan API of early Conan 1.x releases, whose `Command` constructor takes additional arguments
+# (Everything else that the worker imports is present, so the worker only fails when it actually creates a `Command`)
+STUB_CONAN_API = {
+	'conans/__init__.py': '__version__ = "1.7.4"\n',
+	'conans/client/__init__.py': '',
+	'conans/client/conan_api.py': 'class Conan(object):\n\t@staticmethod\n\tdef factory():\n\t\treturn (Conan(), None, None)\n',
+	'conans/client/command.py': 'class Command(object):\n\tdef __init__(self, conan_api, client_cache, user_io, outputer):\n\t\tpass\n',
+	'conans/client/cache/__init__.py': '',
+	'conans/client/cache/remote_registry.py': 'class Remotes(object):\n\tpass\n\nclass RemoteRegistry(object):\n\tdef load_remotes(self):\n\t\treturn Remotes()\n',
+	'conans/errors.py': 'class ConanException(Exception):\n\tpass\n'
+}
+
+
+# Parses a scale in LIBS:HEADERS format
+def _parseScale(value):
+	libs, _, headers = value.partition(':')
+	try:
+		return (int(libs), int(headers))
+	except ValueError:
+		raise argparse.ArgumentTypeError('scales must be specified in LIBS:HEADERS format, e.g. 100:10000')
+
+# Writes a file of the specified size
+def _writeFile(path, size):
+	_writeText(path, 'x' * size)
+
+# Writes a text file with the specified contents, creating any missing parent directories
+def _writeText(path, contents):
+	os.makedirs(dirname(path), exist_ok=True)
+	with open(path, 'w') as f:
+		f.write(contents)
+
+# Computes the total size of the files under the specified directories
+def _treeSize(directories):
+	total = 0
+	for directory in directories:
+		for root, dirnames, filenames in os.walk(directory):
+			total += sum([os.path.getsize(join(root, f)) for f in filenames if not os.path.islink(join(root, f))])
+	return total
+
+
+def createEngineTree(workDir, numLibs, numHeaders, headerSize, libSize):
+	'''
+	Creates a synthetic Unreal Engine tree and returns the description of it that is used by the fake manager and fake conan
+	'''
+	engineRoot = join(workDir, 'engine')
+	thirdParty = join(engineRoot, 'Engine', 'Source', 'ThirdParty')
+	arch = 'x86_64-unknown-linux-gnu'
+	
+	# Create the version file and a bundled clang that simply succeeds
+	major, minor, patch = ENGINE_VERSION.split('.')
+	_writeText(join(engineRoot, 'Engine', 'Build', 'Build.version'), json.dumps({'MajorVersion': int(major), 'MinorVersion': int(minor), 'PatchVersion': int(patch)}))
+	clang = join(engineRoot, 'Engine', 'Extras', 'ThirdPartyNotUE', 'SDKs', 'HostLinux', 'Linux_x64', 'v19_clang-11.0.1-centos7', arch, 'bin', 'clang')
+	_writeText(clang, '#!/bin/sh\necho "clang version 11.0.1 (synthetic)"\n')
+	os.chmod(clang, 0o755)
+	
+	# Create the bundled libc++
+	libcxx = join(thirdParty, 'Linux', 'LibCxx', 'lib', 'Linux', arch, 'libc++.a')
+	_writeFile(libcxx, libSize)
+	
+	# Create each of the libraries, distributing the headers evenly between them
+	libs = []
+	for index in range(numLibs):
+		name = 'Lib{:04d}'.format(index)
+		root = join(thirdParty, name)
+		headers = numHeaders // numLibs + (1 if index < numHeaders % numLibs else 0)
+		for header in range(headers):
+			_writeFile(join(root, 'include', name.lower(), 'dir{:03d}'.format(header // HEADERS_PER_DIR), 'header{:05d}.h'.format(header)), headerSize)
+		_writeFile(join(root, 'lib', 'Linux', arch, 'lib{}.a'.format(name.lower())), libSize)
+		_writeFile(join(root, 'data', '{}.dat'.format(name.lower())), headerSize)
+		_writeFile(join(root, '{}.Build.cs'.format(name)), headerSize)
+		libs.append({
+			'name': name,
+			'root': root,
+			'include': join(root, 'include'),
+			'lib': join(root, 'lib', 'Linux', arch),
+			'file': join(root, 'lib', 'Linux', arch, 'lib{}.a'.format(name.lower()))
+		})
+	
+	return {'root': engineRoot, 'version': ENGINE_VERSION, 'libcxx': libcxx, 'libs': libs}
+
+def createConanState(workDir, engine):
+	'''
+	Creates the recipes and package descriptions that the fake conan reports, with one recipe and package for each synthetic library
+	'''
+	recipesDir = join(workDir, 'recipes')
+	recipes = []
+	packages = []
+	for lib in engine['libs']:
+		name = lib['name'].lower() + '-ue4'
+		_writeText(join(recipesDir, name, '1.0', 'conanfile.py'), 'from conans import ConanFile\n\nclass Recipe(ConanFile):\n    name = "{}"\n    version = "1.0"\n'.format(name))
+		recipes.append({'reference': '{}/1.0@adamrehn/{}'.format(name, ENGINE_VERSION.rsplit('.', 1)[0]), 'source': lib['root']})
+		packages.append({
+			'name': name,
+			'version': '1.0',
+			'description': 'Synthetic package for {}'.format(lib['name']),
+			'rootpath': lib['root'],
+			'include_paths': [lib['include']],
+			'lib_paths': [lib['lib']],
+			'bin_paths': [],
+			'res_paths': [join(lib['root'], 'data')],
+			'libs': [lib['name'].lower()],
+			'defines': ['WITH_{}=1'.format(lib['name'].upper())],
+			'system_libs': []
+		})
+	
+	stateFile = join(workDir, 'state.json')
+	with open(stateFile, 'w') as f:
+		json.dump({'recipes': recipes, 'packages': packages}, f)
+	return stateFile, recipesDir
+
+def runCommand(runDir, engineFile, stateFile, latency, command, args, outputs):
+	'''
+	Runs a subcommand in a fresh driver process and returns its metrics
+	'''
+	traceFile = join(runDir, 'traces', '{}.json'.format(command))
+	logFile = join(runDir, 'logs', '{}.jsonl'.format(command))
+	os.makedirs(dirname(logFile), exist_ok=True)
+	
+	# Isolate the subcommand from the user's configuration, Conan cache and recipe cache
+	env = dict(os.environ)
+	env.update({
+		'HOME': join(runDir, 'home'),
+		'CONAN_USER_HOME': join(runDir, 'home'),
+		'UE4CLI_CONFIG_DIR': join(runDir, 'home', '.config', 'ue4cli'),
+		'PATH': join(runDir, 'bin') + os.pathsep + os.environ.get('PATH', ''),
+		'CONAN_UE4CLI_BACKEND': 'cli',
+		'CONAN_UE4CLI_TRACE': traceFile,
+		'FAKE_CONAN_LOG': logFile,
+		'FAKE_CONAN_STATE': stateFile,
+		'FAKE_CONAN_LATENCY': str(latency)
+	})
+	
+	# Run the subcommand, waiting for it ourselves so we can retrieve its resource usage
+	sizeBefore = _treeSize(outputs)
+	started = time.time()
+	child = subprocess.Popen(
+		[sys.executable, join(BENCHMARK_DIR, 'driver.py'), engineFile, command] + args,
+		cwd=runDir,
+		env=env,
+		stdout=subprocess.PIPE,
+		stderr=subprocess.STDOUT
+	)
+	output = child.stdout.read()
+	_, status, usage = os.wait4(child.pid, 0)
+	wallTime = time.time() - started
+	child.returncode = os.waitstatus_to_exitcode(status) if hasattr(os, 'waitstatus_to_exitcode') else status
+	child.stdout.close()
+	if child.returncode != 0:
+		raise RuntimeError('`ue4 conan {}` failed with exit code {}:\n{}'.format(command, child.returncode, output.decode('utf-8', errors='replace')))
+	
+	# Gather the external commands recorded in the trace and the invocations recorded by the fake conan
+	with open(traceFile, 'r') as f:
+		events = json.load(f)['traceEvents']
+	conanCalls = 0
+	if exists(logFile):
+		with open(logFile, 'r') as f:
+			conanCalls = len(f.readlines())
+	
+	return {
+		'wallTime': wallTime,
+		'subprocesses': len([event for event in events if event['cat'] == 'subprocess']),
+		'conanCalls': conanCalls,
+		'bytesCopied': max(0, _treeSize(outputs) - sizeBefore),
+		'peakRSS': usage.ru_maxrss if platform.system() == 'Darwin' else usage.ru_maxrss * 1024
+	}
+
+def checkBackendFallback(workDir):
+	'''
+	Verifies that Conan commands fall back to the CLI when the Conan API worker cannot be initialised, by running a command with the
+	API backend selected against a Conan API that is incompatible with the worker, and checking that the fake conan ran it instead
+	'''
+	stubDir = join(workDir, 'stub')
+	for path, contents in STUB_CONAN_API.items():
+		_writeText(join(stubDir, path), contents)
+	conan = join(workDir, 'bin', 'conan')
+	_writeText(conan, '#!/bin/sh\nexec "{}" "{}" "$@"\n'.format(sys.executable, join(BENCHMARK_DIR, 'fakeconan.py')))
+	os.chmod(conan, 0o755)
+	
+	# Run a single Conan command through the same code path that the subcommands use
+	logFile = join(workDir, 'conan.jsonl')
+	env = dict(os.environ)
+	env.update({
+		'HOME': join(workDir, 'home'),
+		'CONAN_USER_HOME': join(workDir, 'home'),
+		'PATH': join(workDir, 'bin') + os.pathsep + os.environ.get('PATH', ''),
+		'PYTHONPATH': stubDir,
+		'CONAN_UE4CLI_BACKEND': 'api',
+		'FAKE_CONAN_LOG': logFile
+	})
+	code = 'import sys\nsys.path.insert(0, {})\nfrom conan_ue4cli.common import Utility\nUtility.run(["conan", "--version"], check=True)\n'.format(repr(dirname(BENCHMARK_DIR)))
+	proc = subprocess.run([sys.executable, '-c', code], env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+	output = proc.stdout.decode('utf-8', errors='replace')
+	
+	# The command should succeed, warn about the fallback, and be run by the fake conan exactly once
+	calls = len(open(logFile, 'r').readlines()) if exists(logFile) else 0
+	if proc.returncode != 0 or 'falling back to the Conan CLI' not in output or calls != 1:
+		raise RuntimeError('the Conan API backend did not fall back to the CLI (exit code {}, {} CLI invocations):\n{}'.format(proc.returncode, calls, output))
+	print('The Conan API backend falls back to the CLI when the worker cannot be initialised.', flush=True)
+
+def runScale(workDir, numLibs, numHeaders, args):
+	'''
+	Creates the synthetic tree for a scale and benchmarks each of the requested subcommands against it
+	'''
+	print('Creating synthetic engine tree with {} libraries and {} headers...'.format(numLibs, numHeaders), flush=True)
+	engine = createEngineTree(workDir, numLibs, numHeaders, args.header_size, args.lib_size)
+	engineFile = join(workDir, 'engine.json')
+	with open(engineFile, 'w') as f:
+		json.dump(engine, f)
+	stateFile, recipesDir = createConanState(workDir, engine)
+	profile = 'ue{}-Linux-x86_64-unknown-linux-gnu'.format(ENGINE_VERSION.rsplit('.', 1)[0])
+	
+	samples = {command: [] for command in args.commands}
+	for repetition in range(args.repeat):
+		
+		# Each repetition starts from an empty home directory and empty output directories
+		runDir = join(workDir, 'run{}'.format(repetition))
+		moduleDir = join(runDir, 'module')
+		archiveDir = join(runDir, 'archives')
+		for directory in [join(runDir, 'home'), join(runDir, 'bin'), moduleDir, archiveDir]:
+			os.makedirs(directory)
+		_writeText(join(moduleDir, 'conanfile.py'), 'from conans import ConanFile\n\nclass Module(ConanFile):\n    pass\n')
+		
+		# Place our fake conan at the front of the PATH
+		conan = join(runDir, 'bin', 'conan')
+		_writeText(conan, '#!/bin/sh\nexec "{}" "{}" "$@"\n'.format(sys.executable, join(BENCHMARK_DIR, 'fakeconan.py')))
+		os.chmod(conan, 0o755)
+		
+		# The arguments and output directories for each subcommand
+		invocations = {
+			'generate': ([], []),
+			'build': (['--no-cache', '--no-cwd', '-s', recipesDir, 'all'], []),
+			'precompute': (['-d', moduleDir, profile], [join(moduleDir, 'precomputed')]),
+			'sources': (['-d', archiveDir, profile, join(moduleDir, 'conanfile.py')], [archiveDir, join(runDir, 'home', '.config')])
+		}
+		
+		# Generate the profile even when `generate` itself isn't being benchmarked, since the other subcommands require it
+		if 'generate' not in args.commands:
+			runCommand(runDir, engineFile, stateFile, 0, 'generate', ['--profile-only'], [])
+		
+		for command in args.commands:
+			commandArgs, outputs = invocations[command]
+			print('  Running `ue4 conan {}` (repetition {} of {})...'.format(command, repetition + 1, args.repeat), flush=True)
+			samples[command].append(runCommand(runDir, engineFile, stateFile, args.latency, command, commandArgs, outputs))
+		
+		if args.keep == False:
+			shutil.rmtree(runDir)
+	
+	# Report the median wall time alongside the individual samples, and the remaining metrics from the final repetition
+	results = []
+	for command in args.commands:
+		result = dict(samples[command][-1])
+		result['wallTime'] = statistics.median([sample['wallTime'] for sample in samples[command]])
+		result['samples'] = [sample['wallTime'] for sample in samples[command]]
+		results.append(dict({'libs': numLibs, 'headers': numHeaders, 'command': command}, **result))
+		print('    {:<10} {:>8.2f}s  {:>5} subprocesses  {:>12} bytes copied  {:>6.1f} MiB peak RSS'.format(
+			command,
+			result['wallTime'],
+			result['subprocesses'],
+			result['bytesCopied'],
+			result['peakRSS'] / (1024 ** 2)
+		), flush=True)
+	
+	return results
+
+def compareResults(results, baseline, threshold):
+	'''
+	Prints the change in each metric relative to the baseline results, returning False if any wall time regressed beyond the threshold
+	'''
+	key = lambda result: (result['libs'], result['headers'], result['command'])
+	previous = {key(result): result for result in baseline['results']}
+	passed = True
+	print('\nComparison against baseline:')
+	for result in results:
+		if key(result) not in previous:
+			print('  {} at {}:{} has no baseline result'.format(result['command'], result['libs'], result['headers']))
+			continue
+		
+		before = previous[key(result)]
+		changes = []
+		for metric in ['wallTime', 'subprocesses', 'conanCalls', 'bytesCopied', 'peakRSS']:
+			if before[metric] > 0:
+				changes.append('{} {:+.1%}'.format(metric, (result[metric] - before[metric]) / before[metric]))
+			else:
+				changes.append('{} {} -> {}'.format(metric, before[metric], result[metric]))
+		
+		regressed = before['wallTime'] > 0 and (result['wallTime'] - before['wallTime']) / before['wallTime'] > threshold
+		passed = passed and not regressed
+		print('  {:<10} {:>4}:{:<6} {}{}'.format(result['command'], result['libs'], result['headers'], ', '.join(changes), '  REGRESSED' if regressed else ''))
+	
+	return passed
+
+
+def main():
+	
+	# Our supported command-line arguments
+	parser = argparse.ArgumentParser(description='Runs the offline conan-ue4cli benchmarks against synthetic engine trees')
+	parser.add_argument('--scale', action='append', dest='scales', type=_parseScale, metavar='LIBS:HEADERS', help='Benchmark a synthetic tree with the specified numbers of libraries and headers (can be specified multiple times, defaults to {})'.format(', '.join(['{}:{}'.format(*s) for s in DEFAULT_SCALES])))
+	parser.add_argument('-c', '--command', action='append', dest='commands', choices=COMMANDS, help='Benchmark only the specified subcommand (can be specified multiple times, defaults to all subcommands)')
+	parser.add_argument('-n', '--repeat', type=int, default=1, metavar='N', help='Run each subcommand N times at each scale and report the median wall time (default is 1)')
+	parser.add_argument('--latency', type=float, default=0.05, metavar='SECONDS', help='The simulated latency of each conan invocation (default is 0.05)')
+	parser.add_argument('--header-size', type=int, default=1024, metavar='BYTES', help='The size of each synthetic header file (default is 1024)')
+	parser.add_argument('--lib-size', type=int, default=65536, metavar='BYTES', help='The size of each synthetic library file (default is 65536)')
+	parser.add_argument('--work-dir', default=None, metavar='DIR', help='Create the synthetic trees under the specified directory instead of a temporary directory')
+	parser.add_argument('--keep', action='store_true', help='Keep the output of each run for inspection (requires --work-dir)')
+	parser.add_argument('-o', '--output', default=None, metavar='FILE', help='Write the results to the specified JSON file')
+	parser.add_argument('--baseline', default=None, metavar='FILE', help='Compare the results against a JSON file written by a previous run')
+	parser.add_argument('--threshold', type=float, default=0.2, metavar='FRACTION', help='The wall time increase relative to the baseline that counts as a regression (default is 0.2)')
+	args = parser.parse_args()
+	args.scales = args.scales if args.scales is not None else DEFAULT_SCALES
+	args.commands = [c for c in COMMANDS if args.commands is None or c in args.commands]
+	if args.keep == True and args.work_dir is None:
+		parser.error('--keep requires --work-dir')
+	
+	# Benchmark each scale in its own directory, after checking that the subcommands can run when the Conan API is unusable
+	results = []
+	workRoot = abspath(args.work_dir) if args.work_dir is not None else tempfile.mkdtemp(prefix='conan-ue4cli-bench-')
+	try:
+		fallbackDir = join(workRoot, 'fallback')
+		if exists(fallbackDir):
+			shutil.rmtree(fallbackDir)
+		checkBackendFallback(fallbackDir)
+		if args.keep == False:
+			shutil.rmtree(fallbackDir)
+		for numLibs, numHeaders in args.scales:
+			workDir = join(workRoot, '{}-{}'.format(numLibs, numHeaders))
+			if exists(workDir):
+				shutil.rmtree(workDir)
+			results.extend(runScale(workDir, numLibs, numHeaders, args))
+			if args.keep == False:
+				shutil.rmtree(workDir)
+	finally:
+		if args.work_dir is None:
+			shutil.rmtree(workRoot, ignore_errors=True)
+	
+	# Write the results to file, along with the details of the environment they were recorded in
+	from conan_ue4cli.version import __version__
+	report = {
+		'version': __version__,
+		'python': platform.python_version(),
+		'platform': platform.platform(),
+		'timestamp': time.time(),
+		'latency': args.latency,
+		'results': results
+	}
+	if args.output is not None:
+		with open(args.output, 'w') as f:
+			json.dump(report, f, indent=4)
+		print('Wrote results to {}'.format(args.output))
+	
+	# Compare the results against the baseline, if one was specified
+	if args.baseline is not None:
+		with open(args.baseline, 'r') as f:
+			baseline = json.load(f)
+		if compareResults(results, baseline, args.threshold) == False:
+			sys.exit(1)
+
+
+if __name__ == '__main__':
+	sys.path.insert(0, dirname(BENCHMARK_DIR))
+	main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+'''
+Runs a single conan-ue4cli subcommand against the synthetic engine tree created by benchmark.py, using a fake ue4cli manager.
+
+Usage: driver.py ENGINE_JSON SUBCOMMAND [ARGS...]
+
+The harness runs each subcommand in a fresh driver process, so it can measure the wall time and peak memory usage of the whole process.
+'''
+import json, os, sys
+from os.path import abspath, dirname, join
+
+# Ensure we benchmark the conan-ue4cli source tree that this script lives in, rather than any installed copy
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+
+class FakeUnrealManager(object):
+	'''
+	Stands in for the ue4cli UnrealManager, answering queries from the description of the synthetic engine tree
+	'''
+	
+	def __init__(self, details):
+		self._details = details
+	
+	def getEngineRoot(self):
+		return self._details['root']
+	
+	def getEngineVersion(self, outputFormat = 'full'):
+		major, minor, patch = self._details['version'].split('.')
+		return {
+			'major': major,
+			'minor': minor,
+			'patch': patch,
+			'short': '{}.{}'.format(major, minor),
+			'full': self._details['version']
+		}[outputFormat]
+	
+	def getPlatformIdentifier(self):
+		return 'Linux'
+	
+	def isInstalledBuild(self):
+		return False
+	
+	def listThirdPartyLibs(self):
+		return [lib['name'] for lib in self._details['libs']] + ['libc++']
+	
+	def getThirdpartyLibs(self, libs, configuration = 'Development', includePlatformDefaults = True):
+		from ue4cli import ThirdPartyLibraryDetails
+		
+		# The platform defaults include the bundled libc++, which is the only library that `ue4 conan generate` queries this way
+		requested = [lib for lib in self._details['libs'] if lib['name'] in libs]
+		return ThirdPartyLibraryDetails(
+			prefixDirs = [lib['root'] for lib in requested],
+			includeDirs = [lib['include'] for lib in requested],
+			linkDirs = [lib['lib'] for lib in requested],
+			libs = [lib['file'] for lib in requested] + ([self._details['libcxx']] if includePlatformDefaults == True else [])
+		)
+
+
+if __name__ == '__main__':
+	from conan_ue4cli.main import main
+	with open(sys.argv[1], 'r') as f:
+		details = json.load(f)
+	main(FakeUnrealManager(details), sys.argv[2:])
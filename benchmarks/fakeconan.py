@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+'''
+A stand-in for the `conan` executable that records each invocation and simulates Conan's startup latency.
+
+The benchmark harness places a `conan` script that runs this file at the front of the PATH, and configures it with the following environment variables:
+
+- FAKE_CONAN_LOG: the JSON-lines file that each invocation is appended to
+- FAKE_CONAN_STATE: the JSON file describing the synthetic packages and recipes (written by benchmark.py)
+- FAKE_CONAN_LATENCY: the number of seconds that each invocation sleeps for (defaults to zero)
+
+Only the subcommands and arguments that conan-ue4cli actually uses are emulated, and all other invocations simply succeed.
+'''
+import json, os, sys, time
+from os.path import join
+
+
+# Returns the path to the Conan profiles directory, using the same location as Conan itself
+def _profileDir():
+	home = os.environ.get('CONAN_USER_HOME', os.path.expanduser('~'))
+	return join(home, '.conan', 'profiles')
+
+# Parses a profile file into an ordered list of (section, [lines]) tuples
+def _readProfile(name):
+	sections = []
+	with open(join(_profileDir(), name), 'r') as f:
+		for line in f.read().splitlines():
+			if line.startswith('[') and line.endswith(']'):
+				sections.append((line[1:-1], []))
+			elif len(line.strip()) > 0 and len(sections) > 0:
+				sections[-1][1].append(line)
+	return sections
+
+# Writes a list of (section, [lines]) tuples to a profile file
+def _writeProfile(name, sections):
+	os.makedirs(_profileDir(), exist_ok=True)
+	with open(join(_profileDir(), name), 'w') as f:
+		f.write('\n'.join(['[{}]\n{}'.format(section, ''.join([line + '\n' for line in lines])) for section, lines in sections]))
+
+# Retrieves the value of an optional argument that is specified as either `--name=value` or `--name value`
+def _option(args, names):
+	for index, arg in enumerate(args):
+		for name in names:
+			if arg.startswith(name + '='):
+				return arg.split('=', 1)[1]
+			elif arg == name and index + 1 < len(args):
+				return args[index + 1]
+	return None
+
+
+def profile(args, state):
+	action = args[0]
+	if action == 'new':
+		_writeProfile(args[1], [
+			('settings', ['os=Linux', 'os_build=Linux', 'arch=x86_64', 'arch_build=x86_64', 'compiler=clang', 'compiler.version=11', 'compiler.libcxx=libstdc++11', 'build_type=Release']),
+			('options', []),
+			('build_requires', []),
+			('env', [])
+		])
+	elif action == 'update':
+		key, value = args[1].split('=', 1)
+		section, name = key.split('.', 1)
+		sections = _readProfile(args[2])
+		for current, lines in sections:
+			if current == section:
+				lines[:] = [line for line in lines if line.split('=', 1)[0] != name] + ['{}={}'.format(name, value)]
+		_writeProfile(args[2], sections)
+	elif action == 'get':
+		section, name = args[1].split('.', 1)
+		for current, lines in _readProfile(args[2]):
+			for line in lines:
+				if current == section and line.split('=', 1)[0] == name:
+					print(line.split('=', 1)[1])
+					return 0
+		return 1
+	return 0
+
+def install(args, state):
+	
+	# Installing a consumer conanfile with the JSON generator produces the dependency info for all of our synthetic packages
+	# (Installing a package reference, as `ue4 conan build` does, has no observable output)
+	if '-g=json' in args or _option(args, ['-g', '--generator']) == 'json':
+		info = {
+			'dependencies': [package for package in state['packages']],
+			'deps_user_info': {package['name']: {} for package in state['packages']}
+		}
+		with open(join(os.getcwd(), 'conanbuildinfo.json'), 'w') as f:
+			json.dump(info, f)
+	return 0
+
+def info(args, state):
+	
+	# Report each synthetic recipe as a dependency of the consumer conanfile
+	graph = [{'reference': 'conanfile.py', 'is_ref': False}] + [{'reference': recipe['reference'], 'is_ref': True} for recipe in state['recipes']]
+	with open(_option(args, ['--json']), 'w') as f:
+		json.dump(graph, f)
+	return 0
+
+def lock(args, state):
+	
+	# Record the synthetic packages as the locked dependency graph
+	if args[0] == 'create':
+		with open(_option(args, ['--lockfile-out']), 'w') as f:
+			json.dump({'graph_lock': {'nodes': {str(index): {'ref': package['name']} for index, package in enumerate(state['packages'])}}}, f)
+	return 0
+
+def get(args, state):
+	reference = [arg for arg in args if not arg.startswith('-')][0]
+	print('from conans import ConanFile\n\nclass Recipe(ConanFile):\n    # {}\n    pass\n'.format(reference))
+	return 0
+
+def source(args, state):
+	
+	# Populate the source folder with the files of the synthetic library that the recipe wraps
+	conanfile = [arg for arg in args if not arg.startswith('-')][0]
+	with open(conanfile, 'r') as f:
+		reference = f.read().split('# ', 1)[1].split('\n', 1)[0]
+	recipe = [r for r in state['recipes'] if r['reference'] == reference][0]
+	sourceDir = _option(args, ['-sf', '--source-folder'])
+	for root, dirnames, filenames in os.walk(recipe['source']):
+		destDir = join(sourceDir, os.path.relpath(root, recipe['source']))
+		os.makedirs(destDir, exist_ok=True)
+		for filename in filenames:
+			with open(join(root, filename), 'rb') as src, open(join(destDir, filename), 'wb') as dest:
+				dest.write(src.read())
+	return 0
+
+
+if __name__ == '__main__':
+	
+	# Record the invocation
+	args = sys.argv[1:]
+	started = time.time()
+	if 'FAKE_CONAN_LOG' in os.environ:
+		with open(os.environ['FAKE_CONAN_LOG'], 'a') as f:
+			f.write(json.dumps({'args': args, 'cwd': os.getcwd(), 'time': started}) + '\n')
+	
+	# Simulate the time that Conan spends starting up and loading its cache
+	time.sleep(float(os.environ.get('FAKE_CONAN_LATENCY', '0')))
+	
+	# Emulate the requested subcommand
+	handlers = {'profile': profile, 'install': install, 'info': info, 'lock': lock, 'get': get, 'source': source}
+	if len(args) > 0 and args[0] in handlers:
+		with open(os.environ['FAKE_CONAN_STATE'], 'r') as f:
+			state = json.load(f)
+		sys.exit(handlers[args[0]](args[1:], state))
+	sys.exit(0)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+'''
+Verifies that loading the plugin descriptor stays within its import-time budget.
+
+ue4cli loads the descriptor of every installed plugin on every `ue4` invocation, so importing it must be fast and must not
+pull in Conan, pkg_resources or ue4cli itself. The descriptor is imported in a fresh interpreter so that nothing imported by
+this script affects the measurement. Exits with a non-zero status code if the budget is exceeded.
+
+Example usage:
+    
+    python3 benchmarks/importtime.py
+    python3 benchmarks/importtime.py --budget 0.1
+'''
+import argparse, json, subprocess, sys
+from os.path import abspath, dirname
+
+# The maximum number of seconds that importing the plugin descriptor may take
+DEFAULT_BUDGET = 0.25
+
+# The modules that are too expensive to be imported when the plugin descriptor is loaded
+HEAVY_MODULES = ['conans', 'pkg_resources', 'ue4cli']
+
+# The code that measures the import in the fresh interpreter and reports the results as JSON
+MEASUREMENT = '''
+import json, sys, time
+started = time.perf_counter()
+import conan_ue4cli.descriptor
+elapsed = time.perf_counter() - started
+print(json.dumps({'elapsed': elapsed, 'heavy': [m for m in HEAVY_MODULES if m in sys.modules]}))
+'''
+
+
+if __name__ == '__main__':
+	
+	# Our supported command-line arguments
+	parser = argparse.ArgumentParser(description='Verifies that loading the plugin descriptor stays within its import-time budget')
+	parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET, metavar='SECONDS', help='The maximum import time in seconds (default is {})'.format(DEFAULT_BUDGET))
+	args = parser.parse_args()
+	
+	# Import the descriptor from the source tree that this script lives in, rather than any installed copy
+	code = 'HEAVY_MODULES = {}\n{}'.format(repr(HEAVY_MODULES), MEASUREMENT)
+	output = subprocess.run([sys.executable, '-c', code], cwd=dirname(dirname(abspath(__file__))), stdout=subprocess.PIPE, check=True).stdout
+	results = json.loads(output.decode('utf-8'))
+	
+	# Report the results and fail if either the time budget was exceeded or any heavy modules were imported
+	print('Imported plugin descriptor in {:.3f}s (budget is {:.3f}s), heavy modules imported: {}'.format(results['elapsed'], args.budget, results['heavy']))
+	sys.exit(0 if results['elapsed'] < args.budget and len(results['heavy']) == 0 else 1)
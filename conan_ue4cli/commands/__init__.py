@@ -1,6 +1,2 @@
-from .boilerplate import boilerplate
-from .build import build
-from .generate import generate
-from .precompute import precompute
-from .sources import sources
-from .update import update
+# Command modules are imported individually by `main()` when their subcommand is invoked,
+# so this package deliberately avoids importing them all up front
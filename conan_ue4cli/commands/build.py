@@ -1,6 +1,7 @@
 import argparse, os, shutil, tempfile
-from os.path import basename, exists, join
-from ..common import CommandExecutor, PackageBuilder, ProfileManagement, RecipeCache, RecipeManagement
+from os.path import abspath, basename, exists, isdir, join
+from ..common import CommandExecutor, ConanTools, OfflineMode, PackageBuilder, ProfileManagement, RecipeCache, RecipeManagement, Utility
+from ..common.PackageManagement import LOCKFILE_MIN_VERSION
 from .update import update
 
 # The default username used when building packages
@@ -19,8 +20,9 @@ def build(manager, argv):
 	parser.add_argument('--no-build', action='store_true', help='Do not build or upload binaries for packages')
 	parser.add_argument('--no-cache', action='store_true', help='Do not include recipes from the conan-ue4cli recipe cache when exporting package recipes to the local Conan cache')
 	parser.add_argument('--no-cwd', action='store_true', help='Do not include recipes from the current working directory when exporting package recipes to the local Conan cache')
-	parser.add_argument('-s', '-source', action='append', dest='sources', metavar='DIR', help='Add the specified directory as an additional source of buildable package recipes (the only sources available by default are the conan-ue4cli recipe cache and the current working directory)')
+	parser.add_argument('-s', '-source', action='append', dest='sources', metavar='DIR', help='Add the specified directory (or file:// URL) as an additional source of buildable package recipes, taking precedence over earlier sources (the only sources available by default are the conan-ue4cli recipe cache and the current working directory)')
 	parser.add_argument('-o', '-option', action='append', dest='options', metavar='PKG:OPTION=VALUE', help='Specify options to pass to package recipes when building them')
+	parser.add_argument('--lockfile', default=None, metavar='FILE', help='Use the dependency graph recorded in the specified Conan lockfile when building packages, creating the lockfile if it does not exist (by default, a temporary lockfile is used for the duration of the build)')
 	parser.add_argument('-user', default=DEFAULT_USER, help='Set the user for the built packages (default user is "{}")'.format(DEFAULT_USER))
 	parser.add_argument('-upload', default=None, metavar='REMOTE', dest='remote', help='Upload the built packages to the specified Conan remote')
 	parser.add_argument('-p', '-profile', dest='profile', metavar='PROFILE', default=None, choices=ProfileManagement.listGeneratedProfiles(), help='Build packages using the specified Conan profile (defaults to the profile for the host platform and the Unreal Engine installation ue4cli is currently acting as an interface for)')
@@ -29,6 +31,14 @@ def build(manager, argv):
 	# Parse the supplied command-line arguments
 	args = parser.parse_args(argv)
 	
+	# Lockfiles require a newer version of Conan than the rest of our functionality, so fail before doing any work if it is too old
+	if args.lockfile is not None and ConanTools.isVersionAtLeast(LOCKFILE_MIN_VERSION) == False:
+		parser.error('the --lockfile flag requires Conan {} or newer'.format(LOCKFILE_MIN_VERSION))
+	
+	# Uploading requires access to the remote, so fail before doing any work if we are in offline mode
+	if args.remote is not None and OfflineMode.isEnabled() == True:
+		parser.error('packages cannot be uploaded to the remote "{}" in offline mode'.format(args.remote))
+	
 	# If a profile was not specified, fallback to the default for the host platform (or use the generic one if the default doesn't exist)
 	if args.profile is None:
 		preferredDefault = ProfileManagement.profileForHostPlatform(manager)
@@ -42,7 +52,8 @@ def build(manager, argv):
 			args.profile = genericFallback
 	
 	# Retrieve the Unreal Engine version string for the specified Conan profile and use it as the channel
-	channel = ProfileManagement.profileEngineVersion(args.profile)
+	with ProfileManagement.lockProfile(args.profile, shared=True):
+		channel = ProfileManagement.profileEngineVersion(args.profile)
 	
 	# Create a CommandExecutor to run commands or print them, depending on whether we are in dry-run mode
 	executor = CommandExecutor(args.dry_run)
@@ -50,7 +61,7 @@ def build(manager, argv):
 	# Create our package builder
 	builder = PackageBuilder(args.user, channel, args.profile, args.rebuild, executor)
 	
-	# Keep track of the list of exported package names in case the user asked us to build all available packages
+	# Keep track of the list of exported package names and versions in case the user asked us to build all available packages
 	exported = []
 	
 	# Determine if we are performing the export step
@@ -61,7 +72,7 @@ def build(manager, argv):
 		# If the recipe cache directory does not exist (usually because this is our first build) and we are including it in our export, then populate it
 		cacheDir = RecipeCache.getCacheDirectory()
 		if args.no_cache == False and exists(cacheDir) == False:
-			update(manager, argv)
+			update(manager, [])
 		
 		# Gather the list of enabled recipe source directories
 		sources = []
@@ -70,26 +81,36 @@ def build(manager, argv):
 		if args.no_cwd == False:
 			sources.append(os.getcwd())
 		if args.sources is not None:
-			sources.extend(args.sources)
+			for source in args.sources:
+				localPath = Utility.localPath(source)
+				if localPath is None or isdir(localPath) == False:
+					raise RuntimeError('the recipe source "{}" is not a local directory or file:// URL referring to one'.format(source))
+				sources.append(localPath)
 		
 		# Report the list of recipe source directories to the user
-		print('Exporting package recipes from the following source directories:')
+		print('Exporting package recipes from the following source directories (later sources take precedence):')
 		for source in sources:
 			print('- {}'.format(source))
 		print('', flush=True)
 		
-		# Iterate over our source directories and export all detected recipes to Conan's local cache
-		for source in sources:
-			for recipe in RecipeManagement.listRecipesInDir(source):
+		# Hold a shared lock on the recipe cache whilst we read recipes from it, so another process cannot replace it mid-export
+		with RecipeCache.lock(shared=True):
+			
+			# Resolve the winning recipe for each package version so that shadowed recipes are never exported
+			recipes, shadowed = RecipeManagement.resolveRecipes(sources)
+			for source, name, version, winner in shadowed:
+				print('Ignoring recipe for package "{}/{}" in "{}" because it is shadowed by "{}"'.format(name, version, source, winner))
+			
+			# Export the winning recipes to Conan's local cache
+			for source, name, version in recipes:
 				
 				# Print progress output
-				name, version = recipe
 				print('Exporting recipe for package "{}/{}@{}/{}"...'.format(name, version, args.user, channel), flush=True)
 				
 				# Attempt to export the recipe
 				builder.export(source, name, version)
-				exported.append(name)
-		
+				exported.append((name, version))
+	
 	# Determine if we are performing the build and upload steps
 	if args.no_build == True:
 		print('Skipping package build and upload steps.')
@@ -102,9 +123,12 @@ def build(manager, argv):
 			if len(exported) == 0:
 				raise RuntimeError('the "all" keyword cannot be used when skipping the package recipe export step')
 			else:
+				
+				# Resolve the latest exported version of each package from the recipe index data, without querying Conan
+				names = sorted(set([name for name, _ in exported]))
 				packages.extend(list([
-					(name, RecipeManagement.getLatestVersion(name, args.user, channel))
-					for name in set(exported)
+					(name, RecipeManagement.latestVersion([v for n, v in exported if n == name]))
+					for name in names
 				]))
 		elif '==' in arg:
 			packages.append(tuple(arg.split('==', 1)))
@@ -119,15 +143,24 @@ def build(manager, argv):
 		print('- {}/{}'.format(name, version))
 	print('', flush=True)
 	
-	# Attempt to build each of the packages in turn
-	for package in packages:
+	# Hold a shared lock on the profile whilst Conan uses it, so another process cannot rewrite it mid-build
+	with ProfileManagement.lockProfile(args.profile, shared=True):
 		
-		# Print progress output
-		name, version = package
-		print('Building package "{}/{}@{}/{}"...'.format(name, version, args.user, channel), flush=True)
+		# Resolve the dependency graph for all of the packages once, rather than once per package
+		# (When building a single package without a pinned lockfile there is nothing to reuse, so we skip this step)
+		options = args.options if args.options is not None else []
+		if args.lockfile is not None or len(packages) > 1:
+			builder.lock(packages, options, abspath(args.lockfile) if args.lockfile is not None else None)
 		
-		# Attempt to build the package
-		builder.build(name, version, args.options if args.options is not None else [])
+		# Attempt to build each of the packages in turn
+		for package in packages:
+			
+			# Print progress output
+			name, version = package
+			print('Building package "{}/{}@{}/{}"...'.format(name, version, args.user, channel), flush=True)
+			
+			# Attempt to build the package
+			builder.build(name, version, options)
 	
 	# If a remote has been specified to upload the built packages to, attempt to do so
 	if args.remote is not None:
@@ -1,16 +1,23 @@
-from ..common import ConanTools, DelegateManager, PackageManagement, ProfileManagement, Utility
+from ..common import ConanTools, DelegateManager, OfflineMode, PackageManagement, ProfileManagement, Utility
 import argparse, copy, glob, os, platform, re, sys, tempfile
 from os.path import abspath, dirname, exists, join
-from pkg_resources import parse_version
 
 def _getClangVersion(clangPath):
 	'''
 	Retrieves the version number for the specified clang executable
 	'''
+	from pkg_resources import parse_version
 	(stdout, stderr) = Utility.run([clangPath, '--version'])
 	matches = re.search('clang version (.+) \\(', stdout)
 	return parse_version(matches.group(1).replace('-', '.'))
 
+def _findBundledClang(manager, architecture='x86_64'):
+	'''
+	Returns the list of clang binaries bundled with the supplied Unreal Engine installation for the specified build architecture
+	'''
+	engineRoot = manager.getEngineRoot()
+	return glob.glob(join(engineRoot, 'Engine/Extras/ThirdPartyNotUE/SDKs/HostLinux/Linux_x64/*clang*/*{}*/bin/clang'.format(architecture)))
+
 def _locateClang(manager, architecture='x86_64'):
 	'''
 	Locates the appropriate clang binary for the supplied Unreal Engine installation and build architecture.
@@ -21,15 +28,15 @@ def _locateClang(manager, architecture='x86_64'):
 	# Retrieve the minor version number for the supplied Unreal Engine installation
 	versionMajor = int(manager.getEngineVersion('major'))
 	versionMinor = int(manager.getEngineVersion('minor'))
-
+	
 	# Check if the Unreal Engine installation has a bundled version of clang (introduced in UE4.20.0)
-	engineRoot = manager.getEngineRoot()
-	bundledClang = glob.glob(join(engineRoot, 'Engine/Extras/ThirdPartyNotUE/SDKs/HostLinux/Linux_x64/*clang*/*{}*/bin/clang'.format(architecture)))
+	bundledClang = _findBundledClang(manager, architecture)
 	if len(bundledClang) != 0:
 		return (bundledClang[0], bundledClang[0] + '++', None)
 	elif versionMajor == 4 and versionMinor == 19:
 		
 		# For Unreal Engine 4.19, download the bundled toolchain from 4.20 and use that
+		OfflineMode.check("download the toolchain bundle that Unreal Engine 4.19 requires")
 		print("Downloading toolchain bundle since Unreal Engine 4.19 doesn't include one...")
 		extracted = tempfile.TemporaryDirectory()
 		ConanTools.get('https://cdn.unrealengine.com/Toolchain_Linux/native-linux-v11_clang-5.0.0-centos7.tar.gz', destination=extracted.name)
@@ -49,6 +56,8 @@ def generate(manager, argv):
 	)
 	parser.add_argument('--profile-only', action='store_true', help='Create the profile and base packages only, skipping wrapper package generation')
 	parser.add_argument('--remove-only', action='store_true', help='Remove any existing profile and base packages only, skipping creation of a new profile')
+	parser.add_argument('--prune-toolchain', action='store_true', help='Package only the parts of the bundled toolchain that the toolchain wrapper uses for the target architecture')
+	parser.add_argument('--verify-toolchain', action='store_true', help='Verify that the toolchain wrapper package can compile and link a test program after it is created')
 	
 	# Parse the supplied command-line arguments
 	args = parser.parse_args(argv)
@@ -61,6 +70,12 @@ def generate(manager, argv):
 		print('Warning: the detected UE4 version ({}) is too old (4.19.0 or newer required), skipping installation.'.format(versionFull), file=sys.stderr)
 		return
 	
+	# Under Linux, Unreal Engine 4.19 requires us to download a toolchain bundle, so in offline mode we fail before making any changes
+	if platform.system() == 'Linux' and args.remove_only == False and versionMajor == 4 and versionMinor == 19 and OfflineMode.isEnabled() == True:
+		if len(_findBundledClang(manager)) == 0:
+			print('Error: Unreal Engine 4.19 does not include a clang toolchain, and the toolchain bundle cannot be downloaded in offline mode.', file=sys.stderr)
+			sys.exit(1)
+	
 	# Determine the full path to the directories containing our files
 	dataDir = join(dirname(dirname(abspath(__file__))), 'data')
 	packagesDir = join(dataDir, 'packages')
@@ -73,12 +88,13 @@ def generate(manager, argv):
 	# Create the delegate class manager
 	delegates = DelegateManager(delegatesDir)
 	
-	# Create an auto-deleting temporary directory to hold the generated conanfiles
-	with tempfile.TemporaryDirectory() as tempDir:
-		
-		# Generate a profile with an appropriate target suffix for the current Engine version and host platform
-		# (This naming scheme will become more useful in future when we support cross-compilation rather than always targeting the host platform)
-		profile = ProfileManagement.profileForHostPlatform(manager)
+	# Generate a profile with an appropriate target suffix for the current Engine version and host platform
+	# (This naming scheme will become more useful in future when we support cross-compilation rather than always targeting the host platform)
+	profile = ProfileManagement.profileForHostPlatform(manager)
+	
+	# Create an auto-deleting temporary directory to hold the generated conanfiles, and lock the profiles that we rewrite
+	# (We always lock the host platform profile before the generic one, so concurrent runs cannot deadlock)
+	with tempfile.TemporaryDirectory() as tempDir, ProfileManagement.lockProfile(profile), ProfileManagement.lockProfile(ProfileManagement.genericProfile()):
 		
 		# Remove the UE4 Conan profile if it exists, along with any profile-wide packages
 		print('Removing the "{}" Conan profile if it already exists...'.format(profile))
@@ -166,10 +182,17 @@ def generate(manager, argv):
 			print('Generating and installing toolchain wrapper package...')
 			print('  Wrapping clang: {}'.format(clang))
 			print('  Wrapping lib++: {}'.format(libcxx))
-			PackageManagement.install(join(packagesDir, 'toolchain-wrapper'), channel, profile, [
+			wrapperEnv = [
 				'--env', 'WRAPPED_TOOLCHAIN={}'.format(dirname(dirname(clang))),
 				'--env', 'WRAPPED_LIBCXX={}'.format(dirname(dirname(dirname(dirname(libcxx)))))
-			])
+			]
+			
+			# Package only the toolchain files listed in the wrapper's manifest and verify the result, if requested
+			if args.prune_toolchain == True:
+				wrapperEnv.extend(['--env', 'WRAPPED_TOOLCHAIN_PRUNE=1'])
+			if args.verify_toolchain == True:
+				wrapperEnv.extend(['--env', 'WRAPPED_TOOLCHAIN_VERIFY=1'])
+			PackageManagement.install(join(packagesDir, 'toolchain-wrapper'), channel, profile, wrapperEnv)
 		
 		# Generate the package for each UE4-bundled thirdparty library
 		for lib in libs:
@@ -1,7 +1,13 @@
-import argparse, itertools, os, platform, shutil, subprocess, sys, tempfile
+import argparse, itertools, os, platform, shutil, sys, tempfile
 from os.path import abspath, exists, isdir, join
 from glob import glob
-from ..common import ConanTools, PackageManagement, ProfileManagement, RecipeManagement, Utility
+from ..common import ConanTools, PackageManagement, ProfileManagement, RecipeManagement, SourceArchiver, SourceCache, SubprocessRunner, Utility
+from ..common.PackageManagement import LOCKFILE_MIN_VERSION
+from ..common.SourceArchiver import ARCHIVE_FORMATS
+from ..common.SourceCache import DEFAULT_MAX_SIZE
+
+# The files and directories that are excluded from source archives by default (e.g. version control files)
+DEFAULT_EXCLUDES = ['.git', '.gitattributes', '.gitignore', '.github']
 
 
 # Deletes the specified file or directory
@@ -23,6 +29,13 @@ def _stripSuffixes(s, suffixes):
 		stripped = stripped[0: -len(suffix)] if stripped.endswith(suffix) else stripped
 	return stripped
 
+# Parses a size argument for argparse, so that invalid sizes produce a usage error
+def _parseSize(size):
+	try:
+		return SourceCache.parseSize(size)
+	except RuntimeError as err:
+		raise argparse.ArgumentTypeError(str(err))
+
 
 def sources(manager, argv):
 	
@@ -32,12 +45,23 @@ def sources(manager, argv):
 		description = 'Retrieves the source code of the dependencies for one or more conanfiles'
 	)
 	parser.add_argument('-d', '-dir', dest='dir', metavar='DIR', default=os.getcwd(), help='Specifies output directory where source archives should be generated (defaults to the current working directory)')
+	parser.add_argument('-f', '-format', dest='format', default='zip', choices=sorted(ARCHIVE_FORMATS.keys()), help='Specifies the format of the generated source archives (default is zip)')
+	parser.add_argument('-l', '-level', dest='level', type=int, default=None, metavar='LEVEL', help='Specifies the compression level for the generated source archives (defaults to the standard level for the archive format)')
+	parser.add_argument('-j', '-jobs', dest='jobs', type=int, default=1, metavar='N', help='Use N threads to compress large archive members in parallel (tar.gz and tar.zst formats only)')
+	parser.add_argument('-x', '-exclude', action='append', dest='excludes', metavar='PATTERN', help='Exclude files and directories whose names match the specified pattern, in addition to the default exclusions ({})'.format(', '.join(DEFAULT_EXCLUDES)))
+	parser.add_argument('--cache-max-size', dest='cache_max_size', type=_parseSize, default=DEFAULT_MAX_SIZE, metavar='SIZE', help='Specifies the maximum size of the persistent source code cache, e.g. 512M or 20G (default is {}G, and a size of 0 disables the cache)'.format(DEFAULT_MAX_SIZE // (1024 ** 3)))
+	parser.add_argument('--no-source-cache', action='store_true', help='Do not use the persistent source code cache, retrieving the source code for every dependency from scratch')
+	parser.add_argument('--lockfile', default=None, metavar='FILE', help='Use the dependency graph recorded in the specified Conan lockfile, creating the lockfile if it does not exist (a lockfile can only be created when a single conanfile is specified)')
 	parser.add_argument('profile', metavar='profile', choices=ProfileManagement.listGeneratedProfiles(False) + ['host'], help='The Conan profile to use when retrieving conanfile dependencies')
 	parser.add_argument('conanfile', nargs='+', help='Paths (or glob patterns) specifying one or more conanfiles to process')
 	
 	# Parse the supplied command-line arguments
 	args = parser.parse_args(argv)
 	
+	# Lockfiles require a newer version of Conan than the rest of our functionality, so fail before doing any work if it is too old
+	if args.lockfile is not None and ConanTools.isVersionAtLeast(LOCKFILE_MIN_VERSION) == False:
+		parser.error('the --lockfile flag requires Conan {} or newer'.format(LOCKFILE_MIN_VERSION))
+	
 	# If the user specified "host" as the profile then use the default profile for the host platform
 	if args.profile == 'host':
 		args.profile = ProfileManagement.profileForHostPlatform(manager)
@@ -51,11 +75,18 @@ def sources(manager, argv):
 			print('Error: the file "{}" does not exist'.format(conanfile))
 			sys.exit(1)
 	
-	# Aggregate the dependencies from all specified conanfiles
-	dependencies = list(itertools.chain.from_iterable([
-		PackageManagement.getDependencyGraph(conanfile, args.profile)
-		for conanfile in conanfiles
-	]))
+	# A lockfile records the graph for a single conanfile, so we can only create one when there is only one conanfile to resolve
+	lockfile = abspath(args.lockfile) if args.lockfile is not None else None
+	if lockfile is not None and not exists(lockfile) and len(conanfiles) > 1:
+		print('Error: the lockfile "{}" does not exist and cannot be created for multiple conanfiles'.format(lockfile))
+		sys.exit(1)
+	
+	# Aggregate the dependencies from all specified conanfiles, holding a shared lock on the profile so another process cannot rewrite it underneath us
+	with ProfileManagement.lockProfile(args.profile, shared=True):
+		dependencies = list(itertools.chain.from_iterable([
+			PackageManagement.getDependencyGraph(conanfile, args.profile, lockfile)
+			for conanfile in conanfiles
+		]))
 	
 	# Filter out any wrapper packages in the list of dependencies
 	dependencies = list([
@@ -63,6 +94,12 @@ def sources(manager, argv):
 		if dep['is_ref'] is True and RecipeManagement.parseReference(dep['reference'])['version'] not in ['ue4']
 	])
 	
+	# Create the archiver that will compress the source code for each dependency
+	archiver = SourceArchiver(DEFAULT_EXCLUDES + (args.excludes if args.excludes is not None else []), args.format, args.level, args.jobs)
+	
+	# Create the persistent cache that holds pristine source trees from previous runs
+	cache = SourceCache(0 if args.no_source_cache == True else args.cache_max_size)
+	
 	# Retrieve the source code for each dependency in turn
 	for dependency in dependencies:
 		
@@ -74,15 +111,24 @@ def sources(manager, argv):
 			conanfile = join(tempDir, 'conanfile.py')
 			ConanTools.save(conanfile, recipe)
 			
-			# Retrieve the source code for the dependency
-			sourceDir = join(tempDir, 'source')
-			subprocess.run(['conan', 'source', conanfile, '-sf', sourceDir], check=True)
+			# If the source code for this version of the recipe is already cached then skip retrieval entirely
+			key = SourceCache.key(dependency['reference'], recipe)
+			sourceDir = cache.lookup(key) if cache.enabled() else None
+			if sourceDir is not None:
+				print('Using cached source code for package {}'.format(dependency['reference']), flush=True)
 			
-			# Remove any files or directories from the source code that should be excluded (e.g. version control files)
-			excludePatterns = ['.git', '.gitattributes', '.gitignore', '.github']
-			for match in itertools.chain.from_iterable([glob(join(sourceDir, '**', pattern), recursive=True) for pattern in excludePatterns]):
-				print('Excluding: {}'.format(match), flush=True)
-				_delete(match)
+			# Retrieve the source code for the dependency, storing it in the cache if the cache is enabled
+			elif cache.enabled():
+				stagingDir = cache.stage()
+				try:
+					SubprocessRunner.run(['conan', 'source', conanfile, '-sf', stagingDir])
+				except:
+					cache.discard(stagingDir)
+					raise
+				sourceDir = cache.store(key, dependency['reference'], stagingDir)
+			else:
+				sourceDir = join(tempDir, 'source')
+				SubprocessRunner.run(['conan', 'source', conanfile, '-sf', sourceDir])
 			
 			# Strip any unwanted suffixes from the package name when generating the archive name for the source code
 			details = RecipeManagement.parseReference(dependency['reference'])
@@ -91,14 +137,24 @@ def sources(manager, argv):
 			])
 			
 			# If the archive file already exists in our output directory then remove it
-			archive = join(args.dir, '{}-{}.zip'.format(name, details['version']))
+			archive = join(args.dir, '{}-{}{}'.format(name, details['version'], archiver.suffix()))
 			if exists(archive):
 				print('Removing existing archive: {}'.format(archive), flush=True)
 				_delete(archive)
 			
-			# Compress the source code
+			# Compress the source code, skipping any files or directories that should be excluded
+			# (Cached source trees remain pinned until they have been compressed, so other runs cannot evict or replace them underneath us)
 			print('Compressing source code for package {}...'.format(dependency['reference']), flush=True)
-			shutil.make_archive(_stripSuffixes(archive, ['.zip']), 'zip', sourceDir)
+			try:
+				archiver.archive(sourceDir, archive)
+			finally:
+				if cache.enabled():
+					cache.release(sourceDir)
+	
+	# Evict the least recently used source trees if the cache has grown beyond its maximum size
+	# (We only do this once all of our dependencies have been processed, so we don't evict trees that we stored earlier in this run)
+	if cache.enabled():
+		cache.trim()
 	
 	# Inform the user that source code archival is complete
 	print('Done.')
@@ -0,0 +1,111 @@
+import argparse, glob, json, os, sys
+from os.path import isdir, join
+
+# The environment variable that enables telemetry in the toolchain wrapper and specifies the directory that holds its logs
+TELEMETRY_ENVVAR = 'WRAPPER_TELEMETRY_DIR'
+
+
+# Reads the telemetry records from a JSON-lines log file, skipping any partially-written lines
+def _readRecords(logfile):
+	records = []
+	with open(logfile, 'rb') as f:
+		for line in f:
+			try:
+				records.append(json.loads(line.decode('utf-8')))
+			except ValueError:
+				pass
+	return records
+
+# Formats a size in bytes as a human-readable string
+def _formatSize(size):
+	if size is None:
+		return '-'
+	for suffix in ['B', 'KiB', 'MiB']:
+		if size < 1024:
+			return '{:.0f}{}'.format(size, suffix)
+		size /= 1024
+	return '{:.1f}GiB'.format(size)
+
+# Prints a table of the slowest invocations of the specified mode
+def _printSlowest(slowest, mode, describe):
+	if len(slowest) == 0:
+		return
+	
+	print('  Slowest {}s:'.format(mode))
+	for record in slowest:
+		print('    {:>8.2f}s  {:>8.2f}s cpu  {:>9} rss  {:>9} out  {}'.format(
+			record['wall'],
+			record['user'] + record['sys'],
+			_formatSize(record['max_rss']),
+			_formatSize(record['output_size']),
+			describe(record)
+		))
+
+
+def telemetry(manager, argv):
+	
+	# Our supported command-line arguments
+	parser = argparse.ArgumentParser(
+		prog='ue4 conan telemetry',
+		description = 'Summarises the compile and link telemetry recorded by the toolchain wrapper when {} is set'.format(TELEMETRY_ENVVAR)
+	)
+	parser.add_argument('-n', '-count', dest='count', type=int, default=10, metavar='N', help='Show the N slowest compiles and links for each package (default is 10)')
+	parser.add_argument('-p', '-package', dest='package', default=None, metavar='PATTERN', help='Only summarise packages whose references match the specified glob pattern')
+	parser.add_argument('--json', action='store_true', help='Print the summary as JSON instead of a human-readable report')
+	parser.add_argument('dir', nargs='?', default=os.environ.get(TELEMETRY_ENVVAR), help='The directory containing the telemetry logs (defaults to the value of {})'.format(TELEMETRY_ENVVAR))
+	
+	# Parse the supplied command-line arguments
+	args = parser.parse_args(argv)
+	if args.dir is None or isdir(args.dir) == False:
+		print('Error: a telemetry log directory must be specified, either as an argument or via {}'.format(TELEMETRY_ENVVAR), file=sys.stderr)
+		sys.exit(1)
+	
+	# Group the records from each log file by package
+	packages = {}
+	for logfile in sorted(glob.glob(join(args.dir, '*.jsonl'))):
+		for record in _readRecords(logfile):
+			packages.setdefault(record['package'], []).append(record)
+	
+	# Apply the package filter, if one was specified
+	if args.package is not None:
+		from fnmatch import fnmatch
+		packages = {p: r for p, r in packages.items() if fnmatch(p, args.package)}
+	
+	# Compute the aggregate totals for each package, ordering packages by the total time spent in the compiler and linker
+	summary = []
+	for package, records in packages.items():
+		summary.append({
+			'package': package,
+			'invocations': len(records),
+			'compiles': len([r for r in records if r['mode'] == 'compile']),
+			'links': len([r for r in records if r['mode'] == 'link']),
+			'failures': len([r for r in records if r['returncode'] != 0]),
+			'wall': sum([r['wall'] for r in records]),
+			'cpu': sum([r['user'] + r['sys'] for r in records]),
+			'maxRSS': max([r['max_rss'] for r in records]),
+			'slowestCompiles': sorted([r for r in records if r['mode'] == 'compile'], key=lambda r: r['wall'], reverse=True)[:args.count],
+			'slowestLinks': sorted([r for r in records if r['mode'] == 'link'], key=lambda r: r['wall'], reverse=True)[:args.count]
+		})
+	summary = sorted(summary, key=lambda s: s['wall'], reverse=True)
+	
+	# Print the summary in the requested format
+	if args.json == True:
+		print(json.dumps(summary, indent=4))
+		return
+	
+	if len(summary) == 0:
+		print('No telemetry has been recorded in "{}".'.format(args.dir))
+		return
+	
+	for package in summary:
+		print('{} ({} compiles, {} links, {} other invocations, {} failed)'.format(
+			package['package'],
+			package['compiles'],
+			package['links'],
+			package['invocations'] - package['compiles'] - package['links'],
+			package['failures']
+		))
+		print('  Total: {:.2f}s wall, {:.2f}s cpu, {} peak rss'.format(package['wall'], package['cpu'], _formatSize(package['maxRSS'])))
+		_printSlowest(package['slowestCompiles'], 'compile', lambda r: r['source'] if isinstance(r['source'], str) else ' '.join(r['source']))
+		_printSlowest(package['slowestLinks'], 'link', lambda r: r['output'] or '-')
+		print()
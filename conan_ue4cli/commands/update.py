@@ -1,8 +1,39 @@
-from ..common import RecipeCache
+from ..common import PluginConfiguration, RecipeCache
+from ..common.RecipeCache import RECIPE_ZIP_URL
+import argparse, sys
 
 def update(manager, argv):
 	
-	# Update our recipe cache
-	print('Updating the recipe cache...')
-	RecipeCache.updateCache()
-	print('\nRecipe cache updated.')
+	# Our supported command-line arguments
+	parser = argparse.ArgumentParser(
+		prog='ue4 conan update',
+		description = 'Caches the latest recipe data from the ue4-conan-recipes repo'
+	)
+	parser.add_argument('-mirror', default=None, metavar='LOCATION', help='Retrieve recipe data from the specified HTTP(S) URL, file:// URL, zip file or directory instead of the ue4-conan-recipes GitHub repository (defaults to "{}")'.format(RecipeCache.getDefaultSource()))
+	parser.add_argument('--set-default', action='store_true', help='Use the location specified by -mirror by default in future updates (specify -mirror default to restore the GitHub repository)')
+	
+	# Parse the supplied command-line arguments
+	args = parser.parse_args(argv)
+	
+	# Resolve the location from which we will retrieve recipe data
+	source = RECIPE_ZIP_URL if args.mirror == 'default' else args.mirror
+	source = source if source is not None else RecipeCache.getDefaultSource()
+	
+	# If requested, persist the specified mirror as the default source for recipe data
+	if args.set_default == True:
+		if args.mirror is None:
+			parser.error('the --set-default flag requires a location to be specified using -mirror')
+		PluginConfiguration.setSetting('recipeMirror', None if source == RECIPE_ZIP_URL else source)
+	
+	# Update our recipe cache, skipping the download if the cached recipes are already up-to-date
+	# (This is also called implicitly by `ue4 conan build`, so we report errors such as offline mode refusing a download without a traceback)
+	print('Updating the recipe cache from "{}"...'.format(source))
+	try:
+		updated = RecipeCache.updateCache(source)
+	except RuntimeError as err:
+		print('Error: {}'.format(err), file=sys.stderr)
+		sys.exit(1)
+	if updated == True:
+		print('\nRecipe cache updated.')
+	else:
+		print('\nRecipe cache is already up-to-date.')
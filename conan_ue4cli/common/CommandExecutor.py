@@ -1,4 +1,5 @@
-import subprocess, sys
+from .SubprocessRunner import SubprocessRunner
+import sys
 
 class CommandExecutor(object):
 	'''
@@ -16,4 +17,4 @@ class CommandExecutor(object):
 		if self._dryRun == True:
 			return True
 		else:
-			return subprocess.run(command, **kwargs).returncode == 0
+			return SubprocessRunner.run(command, check=kwargs.pop('check', False), **kwargs).succeeded()
@@ -0,0 +1,108 @@
+import json, os, platform, threading
+
+# The environment variable that can be used to enable tracing in place of the `--trace` flag
+TRACE_ENVVAR = 'CONAN_UE4CLI_TRACE'
+
+
+class CommandTracer(object):
+	'''
+	Provides functionality for recording the external commands that we run and writing them out in Chrome trace format
+	(which can be viewed using chrome://tracing or https://ui.perfetto.dev)
+	'''
+	
+	# The path to the trace file, or None if tracing is disabled
+	_traceFile = None
+	
+	# The trace events recorded so far
+	_events = []
+	
+	# The lock that protects our list of events when commands are run from multiple threads
+	_lock = threading.Lock()
+	
+	@staticmethod
+	def enable(traceFile):
+		'''
+		Enables tracing, with the recorded events to be written to the specified file
+		'''
+		CommandTracer._traceFile = os.path.abspath(traceFile)
+		CommandTracer._events = []
+	
+	@staticmethod
+	def enableFromEnvironment():
+		'''
+		Enables tracing if the trace environment variable is set and tracing is not already enabled
+		'''
+		if CommandTracer._traceFile is None and len(os.environ.get(TRACE_ENVVAR, '')) > 0:
+			CommandTracer.enable(os.environ[TRACE_ENVVAR])
+	
+	@staticmethod
+	def enabled():
+		'''
+		Determines whether tracing is enabled
+		'''
+		return CommandTracer._traceFile is not None
+	
+	@staticmethod
+	def record(name, category, started, finished, details={}):
+		'''
+		Records a completed span, using start and end timestamps in seconds since the epoch
+		'''
+		if CommandTracer.enabled() == False:
+			return
+		
+		with CommandTracer._lock:
+			CommandTracer._events.append({
+				'name': name,
+				'cat': category,
+				'ph': 'X',
+				'ts': int(started * 1000000),
+				'dur': int((finished - started) * 1000000),
+				'pid': os.getpid(),
+				'tid': threading.get_ident(),
+				'args': details
+			})
+	
+	@staticmethod
+	def recordCommand(command, cwd, started, finished, returncode, peakRSS):
+		'''
+		Records an external command, along with its exit code and peak resident set size in bytes (if known)
+		'''
+		# Name each span after the executable and its subcommand (e.g. "conan create") so related commands are easy to spot
+		args = command.split(' ') if isinstance(command, str) else list(command)
+		name = ' '.join([os.path.basename(args[0])] + args[1:2] if len(args) > 1 and not args[1].startswith('-') else [os.path.basename(args[0])])
+		CommandTracer.record(
+			name,
+			'subprocess',
+			started,
+			finished,
+			{
+				'command': command if isinstance(command, str) else ' '.join(command),
+				'cwd': cwd if cwd is not None else os.getcwd(),
+				'exitCode': returncode,
+				'peakRSS': peakRSS
+			}
+		)
+	
+	@staticmethod
+	def peakRSS(rusage):
+		'''
+		Converts the `ru_maxrss` field of a resource usage structure to bytes (Linux reports kilobytes whilst macOS reports bytes)
+		'''
+		return rusage.ru_maxrss if platform.system() == 'Darwin' else rusage.ru_maxrss * 1024
+	
+	@staticmethod
+	def write():
+		'''
+		Writes the recorded events to the trace file, if tracing is enabled
+		'''
+		if CommandTracer.enabled() == False:
+			return
+		
+		with CommandTracer._lock:
+			trace = {'traceEvents': list(CommandTracer._events), 'displayTimeUnit': 'ms'}
+		
+		os.makedirs(os.path.dirname(CommandTracer._traceFile), exist_ok=True)
+		tempFile = CommandTracer._traceFile + '.tmp'
+		with open(tempFile, 'wb') as f:
+			f.write(json.dumps(trace, indent=4).encode('utf-8'))
+		os.replace(tempFile, CommandTracer._traceFile)
@@ -1,5 +1,4 @@
-from conans import tools
-import inspect
+import inspect, os, sys
 
 
 # A dummy config type to pass to Conan
@@ -21,34 +20,73 @@ class ConanTools(object):
 		'''
 		Wraps `conans.tools.get()`
 		'''
-		ConanTools._configureConan()
-		return tools.get(*args, **kwargs)
+		return ConanTools._configureConan().get(*args, **kwargs)
 	
 	@staticmethod
 	def load(*args, **kwargs):
 		'''
 		Wraps `conans.tools.load()`
 		'''
-		ConanTools._configureConan()
-		return tools.load(*args, **kwargs)
+		return ConanTools._configureConan().load(*args, **kwargs)
 	
 	@staticmethod
 	def save(*args, **kwargs):
 		'''
 		Wraps `conans.tools.save()`
 		'''
-		ConanTools._configureConan()
-		return tools.save(*args, **kwargs)
+		return ConanTools._configureConan().save(*args, **kwargs)
+	
+	@staticmethod
+	def isVersionAtLeast(minimum):
+		'''
+		Determines whether the installed version of Conan is the specified version or newer
+		'''
+		from conans import __version__ as conanVersion
+		from pkg_resources import parse_version
+		return parse_version(conanVersion) >= parse_version(minimum)
+	
+	@staticmethod
+	def requireVersion(minimum, feature):
+		'''
+		Raises an error if the installed version of Conan is older than the specified version, which the specified feature requires
+		'''
+		if ConanTools.isVersionAtLeast(minimum) == False:
+			from conans import __version__ as conanVersion
+			raise RuntimeError('{} requires Conan {} or newer, but Conan {} is installed'.format(feature, minimum, conanVersion))
+	
+	@staticmethod
+	def getNetworkSettings():
+		'''
+		Returns the proxy and CA bundle settings from the Conan client configuration as a tuple containing (proxies, noProxyMatch, cacert),
+		so that downloads we perform ourselves behave the same way as downloads performed by Conan. If the configuration cannot be
+		read then we warn the user and return settings that leave the system defaults (such as the HTTP_PROXY environment variable) in place.
+		'''
+		try:
+			from conans.client.conf import ConanClientConfigParser
+			from conans.paths import get_conan_user_home
+			config = ConanClientConfigParser(os.path.join(get_conan_user_home(), '.conan', 'conan.conf'))
+			proxies = dict(config.proxies or {})
+			cacert = config.cacert_path
+		except Exception as err:
+			print('Warning: could not read the proxy and CA bundle settings from the Conan configuration ({}), using the system defaults'.format(err), file=sys.stderr)
+			return {}, [], None
+		
+		# Conan accepts both the current `no_proxy_match` patterns and the deprecated `no_proxy` list of hosts
+		noProxyMatch = [pattern.strip() for pattern in (proxies.pop('no_proxy_match', None) or '').split(',') if len(pattern.strip()) > 0]
+		noProxyMatch += ['*{}*'.format(host.strip()) for host in (proxies.pop('no_proxy', None) or '').split(',') if len(host.strip()) > 0]
+		return proxies, noProxyMatch, cacert if cacert is not None and os.path.exists(cacert) else None
 	
 	@staticmethod
 	def _configureConan():
 		'''
-		Ensures Conan is configured correctly so we can use its utility functionality from outside recipes
+		Ensures Conan is configured correctly so we can use its utility functionality from outside recipes,
+		and returns the `conans.tools` module (which is only imported once it is first needed, since importing Conan is slow)
 		'''
+		from conans import tools
 		
 		# We only need to perform configuration once
 		if ConanTools._isConanConfigured == True:
-			return
+			return tools
 		
 		# Ensure Conan's global configuration object is not `None` when using Conan 1.22.0 or newer
 		if hasattr(tools, 'get_global_instances') and hasattr(tools, 'set_global_instances'):
@@ -57,3 +95,4 @@ class ConanTools(object):
 				tools.set_global_instances(the_output=instances[0], the_requester=instances[1], config=_DummyConfig())
 		
 		ConanTools._isConanConfigured = True
+		return tools
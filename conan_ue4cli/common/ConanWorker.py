@@ -0,0 +1,260 @@
+import atexit, binascii, contextlib, json, os, subprocess, sys, threading, uuid
+
+# The backends that can be used to run Conan commands
+BACKENDS = ['cli', 'api']
+
+# The environment variable that can be used to select the backend in place of the `--backend` flag
+BACKEND_ENVVAR = 'CONAN_UE4CLI_BACKEND'
+
+# The environment variable used to pass the connection authentication key to the worker process
+AUTHKEY_ENVVAR = 'CONAN_UE4CLI_WORKER_AUTHKEY'
+
+
+class ConanWorker(object):
+	'''
+	Runs Conan commands through Conan's Python API in a long-lived worker process, so we only pay the cost of
+	starting an interpreter and importing Conan once rather than once per command. The worker's stdout and stderr
+	are streamed back to us, and each command's output is terminated by a marker line so we know when it is complete.
+	'''
+	
+	# The backend selected with the `--backend` flag, if any
+	_backend = None
+	
+	# The running worker process, if any
+	_instance = None
+	
+	# Whether we have already tried and failed to start the worker process
+	_failed = False
+	
+	@staticmethod
+	def setBackend(backend):
+		'''
+		Overrides the backend used to run Conan commands for the lifetime of the current process
+		'''
+		if backend not in BACKENDS:
+			raise RuntimeError('unrecognised Conan backend "{}" (supported backends are: {})'.format(backend, ', '.join(BACKENDS)))
+		ConanWorker._backend = backend
+	
+	@staticmethod
+	def getBackend():
+		'''
+		Determines the backend used to run Conan commands, which is selected by the `--backend` flag, the
+		environment variable or the `conanBackend` setting (in that order of precedence) and defaults to the CLI
+		'''
+		from .PluginConfiguration import PluginConfiguration
+		if ConanWorker._backend is not None:
+			return ConanWorker._backend
+		
+		backend = os.environ.get(BACKEND_ENVVAR, PluginConfiguration.getSetting('conanBackend', 'cli'))
+		return backend if backend in BACKENDS else 'cli'
+	
+	@staticmethod
+	def forCommand(command, kwargs):
+		'''
+		Returns the worker that should run the supplied command, or None if the command should be run as a child process.
+		Only Conan commands that do not require any process options other than a working directory and environment are
+		run by the worker, and we fall back to the Conan CLI if the worker cannot be started.
+		'''
+		if not isinstance(command, list) or len(command) < 2 or command[0] != 'conan':
+			return None
+		if len(set(kwargs.keys()) - set(['cwd', 'env'])) > 0 or ConanWorker.getBackend() != 'api' or ConanWorker._failed == True:
+			return None
+		
+		if ConanWorker._instance is None or ConanWorker._instance._proc.poll() is not None:
+			try:
+				ConanWorker._instance = ConanWorker()
+			except RuntimeError as err:
+				print('Warning: falling back to the Conan CLI since the Conan API worker could not be started: {}'.format(err), file=sys.stderr, flush=True)
+				ConanWorker._failed = True
+				ConanWorker._instance = None
+		
+		return ConanWorker._instance
+	
+	def __init__(self):
+		'''
+		Starts the worker process and connects to it
+		'''
+		from multiprocessing.connection import Client
+		self._lock = threading.Lock()
+		self._marker = 'conan-ue4cli-worker-done-{}'.format(uuid.uuid4().hex)
+		self._sinks = {'stdout': [], 'stderr': []}
+		self._done = {'stdout': threading.Event(), 'stderr': threading.Event()}
+		
+		# Start the worker using the same interpreter as the current process
+		authkey = os.urandom(32)
+		environment = dict(os.environ)
+		environment[AUTHKEY_ENVVAR] = binascii.hexlify(authkey).decode('utf-8')
+		
+		# Ensure the worker can import our package even if it has not been installed (e.g. when running from a source checkout)
+		packageRoot = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+		environment['PYTHONPATH'] = os.pathsep.join([packageRoot] + ([environment['PYTHONPATH']] if len(environment.get('PYTHONPATH', '')) > 0 else []))
+		self._proc = subprocess.Popen(
+			[sys.executable, '-u', '-m', 'conan_ue4cli.common.ConanWorker', self._marker],
+			stdin=subprocess.DEVNULL,
+			stdout=subprocess.PIPE,
+			stderr=subprocess.PIPE,
+			env=environment
+		)
+		
+		# The worker reports the address it is listening on as its first line of output, or exits if it cannot import Conan
+		announcement = self._proc.stdout.readline().decode('utf-8').strip()
+		if announcement.startswith('LISTENING ') == False:
+			self._proc.wait()
+			raise RuntimeError(self._proc.stderr.read().decode('utf-8', errors='replace').strip() or 'the worker exited unexpectedly')
+		address = json.loads(announcement[len('LISTENING '):])
+		self._connection = Client(tuple(address) if isinstance(address, list) else address, authkey=authkey)
+		
+		# Spawn a thread to read each of the worker's output streams for the lifetime of the worker
+		for stream in ['stdout', 'stderr']:
+			threading.Thread(target=self._pump, args=(getattr(self._proc, stream), stream), daemon=True).start()
+		
+		atexit.register(self.stop)
+	
+	def run(self, args, cwd, env, sinks, timeout):
+		'''
+		Runs the Conan command with the specified arguments, passing each line of its output to the supplied callbacks.
+		Returns a tuple containing the exit code and whether the command timed out.
+		'''
+		with self._lock:
+			for stream in ['stdout', 'stderr']:
+				self._sinks[stream] = sinks[stream]
+				self._done[stream].clear()
+			
+			self._connection.send({
+				'args': list(args),
+				'cwd': os.path.abspath(cwd) if cwd is not None else os.getcwd(),
+				'env': dict(env) if env is not None else dict(os.environ)
+			})
+			
+			# If the command exceeds its timeout then we kill the worker, and a new one will be started for the next command
+			if self._connection.poll(timeout) == False:
+				self.stop(kill=True)
+				return (-9, True)
+			
+			try:
+				returncode = self._connection.recv()['returncode']
+			except EOFError:
+				self._proc.wait()
+				return (self._proc.returncode if self._proc.returncode != 0 else 1, False)
+			
+			# Wait until all of the command's output has been passed to our callbacks
+			for stream in ['stdout', 'stderr']:
+				self._done[stream].wait()
+			
+			return (returncode, False)
+	
+	def stop(self, kill=False):
+		'''
+		Stops the worker process
+		'''
+		if self._proc.poll() is not None:
+			return
+		
+		if kill == True:
+			self._proc.kill()
+		else:
+			try:
+				self._connection.send(None)
+			except (OSError, EOFError):
+				self._proc.kill()
+		self._proc.wait()
+	
+	def _pump(self, pipe, stream):
+		'''
+		Reads lines from one of the worker's output streams, passing each line to the callbacks for the current command
+		'''
+		from .SubprocessRunner import MAX_LINE_LENGTH
+		with pipe:
+			for line in iter(lambda: pipe.readline(MAX_LINE_LENGTH), b''):
+				decoded = line.decode('utf-8', errors='replace').replace('\r\n', '\n')
+				
+				# The marker may follow output that was not terminated by a newline
+				if decoded.rstrip('\n').endswith(self._marker):
+					decoded = decoded.rstrip('\n')[:-len(self._marker)]
+					if len(decoded) > 0:
+						for sink in self._sinks[stream]:
+							sink(decoded, stream)
+					self._done[stream].set()
+				else:
+					for sink in self._sinks[stream]:
+						sink(decoded, stream)
+		
+		# If the worker exits unexpectedly then make sure we don't wait forever for the marker
+		self._done[stream].set()
+
+
+def _createApi(Conan):
+	'''
+	Creates a Conan API object for the current environment
+	'''
+	
+	# Older versions of Conan return a tuple from the factory method
+	api = Conan.factory()
+	return api[0] if isinstance(api, tuple) else api
+
+def _serve(marker):
+	'''
+	Runs the worker side of the protocol, executing each Conan command we receive in-process
+	'''
+	from multiprocessing.connection import Listener
+	
+	# Import the Conan API and create the objects we use to run commands, reporting failure by exiting without announcing our address
+	# (The signatures of these classes differ between Conan 1.x releases, so incompatible versions fail with TypeError or AttributeError)
+	# (Anything Conan prints whilst initialising is redirected to stderr, since our first line of stdout must be the announcement)
+	try:
+		from conans.client.command import Command
+		from conans.client.conan_api import Conan
+		with contextlib.redirect_stdout(sys.stderr):
+			api = _createApi(Conan)
+			Command(api)
+	except (ImportError, TypeError, AttributeError) as err:
+		print('failed to initialise the Conan API: {}'.format(err), file=sys.stderr)
+		sys.exit(1)
+	
+	# Hide the configured remotes from Conan for any commands that are run in offline mode
+	from .OfflineMode import OfflineMode
+	OfflineMode.patchConan()
+	
+	# Listen for a connection from the parent process and announce our address
+	listener = Listener(authkey=binascii.unhexlify(os.environ.pop(AUTHKEY_ENVVAR)))
+	print('LISTENING {}'.format(json.dumps(listener.address)), flush=True)
+	connection = listener.accept()
+	listener.close()
+	
+	# Conan resolves its home directory when the API object is created, so we create a new one whenever that changes
+	userHome = os.environ.get('CONAN_USER_HOME')
+	
+	while True:
+		
+		try:
+			request = connection.recv()
+		except EOFError:
+			break
+		if request is None:
+			break
+		
+		# Replicate the working directory and environment that the command would have had if it were run as a child process
+		os.chdir(request['cwd'])
+		os.environ.clear()
+		os.environ.update(request['env'])
+		
+		try:
+			if os.environ.get('CONAN_USER_HOME') != userHome:
+				userHome = os.environ.get('CONAN_USER_HOME')
+				api = _createApi(Conan)
+			returncode = Command(api).run(request['args'])
+		except SystemExit as err:
+			returncode = err.code if isinstance(err.code, int) else 1
+		except Exception as err:
+			print('Error: {}'.format(err), file=sys.stderr)
+			returncode = 1
+		
+		# Terminate the command's output on both streams and report its exit code
+		for stream in [sys.stdout, sys.stderr]:
+			stream.write(marker + '\n')
+			stream.flush()
+		connection.send({'returncode': returncode if returncode is not None else 0})
+
+
+if __name__ == '__main__':
+	_serve(sys.argv[1])
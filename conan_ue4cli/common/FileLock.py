@@ -0,0 +1,111 @@
+from .PluginConfiguration import PluginConfiguration
+import hashlib, os, platform, sys, time
+
+# The interval in seconds between attempts to acquire a lock under Windows, which does not support blocking until a lock is released
+POLL_INTERVAL = 0.1
+
+
+class FileLock(object):
+	'''
+	Provides advisory locking between conan-ue4cli processes on the same host, so that concurrent jobs can safely share resources
+	such as the recipe cache, Conan profiles and output directories. Any number of processes can hold a shared lock at once, whilst
+	an exclusive lock is only granted when no other process holds the lock. (Under Windows, shared locks are treated as exclusive.)
+	
+	Locks are represented by files in the plugin's config directory rather than alongside the resources themselves, and are
+	released automatically if the process holding them exits.
+	'''
+	
+	def __init__(self, resource, shared=False, quiet=False):
+		'''
+		Creates a lock for the resource with the specified path (the resource itself does not need to exist).
+		Unless `quiet` is True, we tell the user when we have to wait for another process to release the lock.
+		'''
+		self.resource = os.path.abspath(resource)
+		self.shared = shared
+		self.quiet = quiet
+		self._file = None
+	
+	@staticmethod
+	def getLockDirectory():
+		'''
+		Returns the path to the directory that holds our lock files
+		'''
+		return os.path.join(PluginConfiguration.getConfigDirectory(), 'locks')
+	
+	def lockFile(self):
+		'''
+		Returns the path to the lock file for the resource
+		'''
+		digest = hashlib.sha256(os.path.normcase(self.resource).encode('utf-8')).hexdigest()[:16]
+		return os.path.join(FileLock.getLockDirectory(), '{}-{}.lock'.format(os.path.basename(self.resource), digest))
+	
+	def acquire(self):
+		'''
+		Acquires the lock, waiting for any other processes holding a conflicting lock to release it
+		'''
+		os.makedirs(FileLock.getLockDirectory(), exist_ok=True)
+		self._file = open(self.lockFile(), 'a+')
+		if self._lock(False) == False:
+			if self.quiet == False:
+				print('Waiting for another process to release its lock on "{}"...'.format(self.resource), file=sys.stderr, flush=True)
+			self._lock(True)
+		return self
+	
+	def tryAcquire(self):
+		'''
+		Attempts to acquire the lock without waiting, returning False if another process holds a conflicting lock
+		'''
+		os.makedirs(FileLock.getLockDirectory(), exist_ok=True)
+		self._file = open(self.lockFile(), 'a+')
+		if self._lock(False) == False:
+			self._file.close()
+			self._file = None
+			return False
+		return True
+	
+	def release(self):
+		'''
+		Releases the lock
+		'''
+		if self._file is None:
+			return
+		
+		if platform.system() == 'Windows':
+			import msvcrt
+			self._file.seek(0)
+			msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+		else:
+			import fcntl
+			fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+		
+		self._file.close()
+		self._file = None
+	
+	def __enter__(self):
+		return self.acquire()
+	
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.release()
+	
+	def _lock(self, blocking):
+		'''
+		Attempts to lock our lock file, returning False if the lock is held by another process and we are not blocking
+		'''
+		if platform.system() == 'Windows':
+			import msvcrt
+			while True:
+				try:
+					self._file.seek(0)
+					msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+					return True
+				except OSError:
+					if blocking == False:
+						return False
+					time.sleep(POLL_INTERVAL)
+		else:
+			import fcntl
+			try:
+				fcntl.flock(self._file.fileno(), (fcntl.LOCK_SH if self.shared == True else fcntl.LOCK_EX) | (0 if blocking == True else fcntl.LOCK_NB))
+				return True
+			except BlockingIOError:
+				return False
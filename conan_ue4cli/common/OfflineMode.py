@@ -0,0 +1,108 @@
+import os, sys
+
+# The environment variable that can be used to enable offline mode in place of the `--offline` flag
+# (We also set it ourselves when offline mode is enabled, so it propagates to the processes that we run)
+OFFLINE_ENVVAR = 'CONAN_UE4CLI_OFFLINE'
+
+
+class OfflineMode(object):
+	'''
+	Provides functionality for running Conan commands against the local cache only, without contacting any remotes.
+	Conan 1.x has no equivalent of the `--no-remote` flag, so in offline mode we run Conan with an empty remote registry,
+	which makes Conan behave exactly as it does when no remotes are configured (missing binaries are built from source and
+	missing recipes are reported as errors) without modifying the remotes that the user has configured.
+	'''
+	
+	@staticmethod
+	def enable():
+		'''
+		Enables offline mode for the current process and any processes that it runs
+		'''
+		os.environ[OFFLINE_ENVVAR] = '1'
+	
+	@staticmethod
+	def enableFromConfiguration():
+		'''
+		Enables offline mode if it is requested by the environment variable or the `offline` setting (in that order of precedence)
+		'''
+		from .PluginConfiguration import PluginConfiguration
+		value = os.environ.get(OFFLINE_ENVVAR)
+		if value == '1' or (value is None and PluginConfiguration.getSetting('offline', False) == True):
+			OfflineMode.enable()
+	
+	@staticmethod
+	def isEnabled():
+		'''
+		Determines whether offline mode is enabled
+		'''
+		return os.environ.get(OFFLINE_ENVVAR) == '1'
+	
+	@staticmethod
+	def check(action, suggestion=None):
+		'''
+		Raises an error if offline mode is enabled, for actions that cannot be performed without network access
+		'''
+		if OfflineMode.isEnabled() == True:
+			raise RuntimeError('cannot {} in offline mode{}'.format(action, '. ' + suggestion if suggestion is not None else ''))
+	
+	@staticmethod
+	def wrapCommand(command):
+		'''
+		Returns the command that should be run in place of the supplied command, which runs Conan commands with
+		an empty remote registry when offline mode is enabled and leaves all other commands unmodified
+		'''
+		if OfflineMode.isEnabled() == False or not isinstance(command, list) or len(command) == 0 or command[0] != 'conan':
+			return command
+		return [sys.executable, os.path.abspath(__file__)] + command[1:]
+	
+	@staticmethod
+	def patchConan():
+		'''
+		Replaces the remote registry of the Conan instance running in the current process with an empty one whenever offline mode is enabled.
+		The remote registry differs between Conan 1.x releases, so if we cannot patch it then we block Conan's HTTP requests instead,
+		which means Conan reports errors for its remotes rather than behaving as if none were configured.
+		'''
+		try:
+			from conans.client.cache.remote_registry import RemoteRegistry, Remotes
+			from conans.errors import ConanException
+			loadRemotes = RemoteRegistry.load_remotes
+		except (ImportError, AttributeError):
+			OfflineMode._blockRequests()
+			return
+		
+		# Refuse to save the empty registry, since that would delete the user's configured remotes
+		class OfflineRemotes(Remotes):
+			def save(self, filename):
+				raise ConanException('the list of Conan remotes cannot be modified in offline mode')
+		
+		RemoteRegistry.load_remotes = lambda self: OfflineRemotes() if OfflineMode.isEnabled() == True else loadRemotes(self)
+	
+	@staticmethod
+	def _blockRequests():
+		'''
+		Makes every HTTP request that Conan sends fail whenever offline mode is enabled, warning the user the first time this happens
+		(Conan sends all of its requests through the `requests` library, which is the one part of its networking that is stable across releases)
+		'''
+		import requests
+		send = requests.Session.send
+		warned = []
+		
+		def offlineSend(self, request, **kwargs):
+			if OfflineMode.isEnabled() == False:
+				return send(self, request, **kwargs)
+			if len(warned) == 0:
+				print('Warning: this version of Conan does not allow its remotes to be hidden, so requests to them will fail in offline mode', file=sys.stderr, flush=True)
+				warned.append(True)
+			raise requests.exceptions.ConnectionError('cannot contact "{}" in offline mode'.format(request.url))
+		
+		requests.Session.send = offlineSend
+
+
+if __name__ == '__main__':
+	
+	# Run the Conan CLI with the supplied arguments and an empty remote registry
+	from conans.conan import run
+	OfflineMode.enable()
+	OfflineMode.patchConan()
+	sys.argv = ['conan'] + sys.argv[1:]
+	run()
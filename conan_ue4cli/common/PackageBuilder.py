@@ -1,5 +1,7 @@
+from .ConanTools import ConanTools
+from .PackageManagement import LOCKFILE_MIN_VERSION
 import itertools, tempfile
-from os.path import join
+from os.path import exists, join
 
 class PackageBuilder:
 	'''
@@ -12,6 +14,8 @@ class PackageBuilder:
 		self._profile = profile
 		self._rebuild = rebuild
 		self._executor = executor
+		self._lockfile = None
+		self._tempDir = None
 	
 	def export(self, baseDir, name, version):
 		'''
@@ -23,30 +27,79 @@ class PackageBuilder:
 			'{}/{}@{}/{}'.format(name, version, self._user, self._channel)
 		])
 	
+	def lock(self, packages, options=[], lockfile=None):
+		'''
+		Resolves the dependency graph for the specified list of (name, version) packages once and records it in a Conan lockfile,
+		which all subsequent builds then use instead of resolving the graph again. If a lockfile path is specified and the file
+		already exists then it is used as-is, otherwise the lockfile is created at that path (or in a temporary directory).
+		'''
+		
+		# Lockfiles are only supported by newer versions of Conan, so we only require them if the user asked for one
+		if lockfile is not None:
+			ConanTools.requireVersion(LOCKFILE_MIN_VERSION, 'using a lockfile')
+		elif ConanTools.isVersionAtLeast(LOCKFILE_MIN_VERSION) == False:
+			print('Warning: Conan {} or newer is required to share a lockfile between packages, so each package will resolve its own dependency graph.'.format(LOCKFILE_MIN_VERSION), flush=True)
+			return
+		
+		# If the user supplied an existing lockfile then use it without resolving anything
+		if lockfile is not None and exists(lockfile):
+			self._lockfile = lockfile
+			return
+		
+		# Lockfiles that we create ourselves only need to live as long as the builder
+		if lockfile is None:
+			self._tempDir = tempfile.TemporaryDirectory()
+			lockfile = join(self._tempDir.name, 'conan.lock')
+		
+		# Create a consumer conanfile that requires all of the packages, so the lockfile covers every one of them
+		with tempfile.TemporaryDirectory() as consumerDir:
+			consumer = join(consumerDir, 'conanfile.txt')
+			with open(consumer, 'w') as f:
+				f.write('[requires]\n' + ''.join(['{}\n'.format(self._reference(name, version)) for name, version in packages]))
+			
+			# Conan does not accept options alongside a lockfile, so they need to be recorded in the lockfile itself
+			optionArgs = list(itertools.chain.from_iterable([['-o', option] for option in options]))
+			command = ['conan', 'lock', 'create', consumer, '--profile=' + self._profile, '--lockfile-out=' + lockfile] + optionArgs
+			if self._executor.execute(command, check=False) == True:
+				self._lockfile = lockfile
+			elif self._tempDir is not None:
+				print('Warning: failed to create a lockfile for the requested packages, so each package will resolve its own dependency graph.', flush=True)
+			else:
+				raise RuntimeError('failed to create the lockfile "{}"'.format(lockfile))
+	
 	def build(self, name, version, options=[]):
 		'''
-		Attempts to build the specified Conan package
+		Attempts to build the specified Conan package, using the lockfile created by `lock()` if there is one
 		'''
 		
 		# Create an auto-deleting temporary directory to hold the Conan output files that we discard
 		with tempfile.TemporaryDirectory() as tempDir:
 			
 			# Resolve the fully-qualified reference for the package
-			package = '{}/{}@{}/{}'.format(name, version, self._user, self._channel)
+			package = self._reference(name, version)
 			
 			# Use the appropriate Conan build policy based on whether the user has request we rebuild outdated packaged
 			policy = ['--build=outdated', '--build=cascade'] if self._rebuild == True else ['--build=missing']
 			
-			# Propagate any user-specified options
-			optionArgs = list(itertools.chain.from_iterable([['-o', option] for option in options]))
+			# Propagate any user-specified options (which are already recorded in the lockfile if we have one)
+			if self._lockfile is not None:
+				graphArgs = ['--lockfile=' + self._lockfile]
+			else:
+				graphArgs = ['--profile=' + self._profile] + list(itertools.chain.from_iterable([['-o', option] for option in options]))
 			
 			# Attempt to build the package
-			command = ['conan', 'install', package, '--profile=' + self._profile] + policy + optionArgs
+			command = ['conan', 'install', package] + graphArgs + policy
 			self._executor.execute(command, cwd=tempDir, check=True)
 	
 	def upload(self, name, version, remote):
 		'''
 		Attempts to upload the specified Conan package to the specified remote
 		'''
-		package = '{}/{}@{}/{}'.format(name, version, self._user, self._channel)
+		package = self._reference(name, version)
 		self._executor.execute(['conan', 'upload', package, '--all', '--confirm', '-r', remote], check=True)
+	
+	def _reference(self, name, version):
+		'''
+		Returns the fully-qualified reference for the specified package
+		'''
+		return '{}/{}@{}/{}'.format(name, version, self._user, self._channel)
@@ -1,8 +1,12 @@
-import json, os, subprocess, tempfile
+import json, os, tempfile
 from os.path import join
 from .ConanTools import ConanTools
+from .SubprocessRunner import SubprocessRunner
 from .Utility import Utility
 
+# The oldest version of Conan that supports the lockfile format and `conan lock create --lockfile-out` syntax that we use
+LOCKFILE_MIN_VERSION = '1.32.0'
+
 class PackageManagement(object):
 	'''
 	Provides functionality for managing Conan packages
@@ -13,7 +17,7 @@ class PackageManagement(object):
 		'''
 		Installs a Conan package
 		'''
-		return Utility.run(['conan', 'create', '.', 'adamrehn/' + channel, '--profile=' + profile] + args, cwd=packageDir)
+		return SubprocessRunner.run(['conan', 'create', '.', 'adamrehn/' + channel, '--profile=' + profile] + args, cwd=packageDir)
 	
 	@staticmethod
 	def generateWrapper(libName, template, delegates, packageDir, channel, profile):
@@ -26,9 +30,34 @@ class PackageManagement(object):
 		PackageManagement.install(packageDir, channel, profile)
 	
 	@staticmethod
-	def getBuildJson(conanfile, profile):
+	def createLockfile(conanfile, profile, lockfile, args=[]):
+		'''
+		Resolves the dependency graph for a consumer conanfile and records it in a Conan lockfile.
+		Any options must be specified here, since Conan does not accept options alongside a lockfile.
+		
+		Calls the `conan lock create` command internally.
+		'''
+		SubprocessRunner.run(['conan', 'lock', 'create', conanfile, '--profile=' + profile, '--lockfile-out=' + lockfile] + args)
+	
+	@staticmethod
+	def graphArgs(conanfile, profile, lockfile=None):
+		'''
+		Returns the Conan arguments that select the dependency graph for a consumer conanfile.
+		If a lockfile is specified then it is used in place of the profile, and is created first if it does not already exist.
+		'''
+		if lockfile is None:
+			return ['--profile=' + profile]
+		ConanTools.requireVersion(LOCKFILE_MIN_VERSION, 'using a lockfile')
+		if not os.path.exists(lockfile):
+			print('Creating lockfile "{}"...'.format(lockfile), flush=True)
+			PackageManagement.createLockfile(conanfile, profile, lockfile)
+		return ['--lockfile=' + lockfile]
+	
+	@staticmethod
+	def getBuildJson(conanfile, profile, lockfile=None):
 		'''
 		Installs the dependencies for a consumer conanfile and parses the generated `conanbuildinfo.json` file.
+		If a lockfile is specified then the dependency graph it records is used instead of resolving the graph again.
 		
 		Calls the `conan install` command internally.
 		'''
@@ -37,15 +66,16 @@ class PackageManagement(object):
 		with tempfile.TemporaryDirectory() as tempDir:
 			
 			# Run `conan install` to install the dependencies for the target profile and generate our JSON dependency info
-			subprocess.run(['conan', 'install', conanfile, '--profile=' + profile, '-g=json'], cwd=tempDir, check=True)
+			SubprocessRunner.run(['conan', 'install', conanfile, '-g=json'] + PackageManagement.graphArgs(conanfile, profile, lockfile), cwd=tempDir)
 			
 			# Parse the JSON dependency info
 			return json.loads(Utility.readFile(join(tempDir, 'conanbuildinfo.json')))
 	
 	@staticmethod
-	def getDependencyGraph(conanfile, profile):
+	def getDependencyGraph(conanfile, profile, lockfile=None):
 		'''
 		Retrieves the dependency graph for a consumer conanfile without installing dependency packages.
+		If a lockfile is specified then the dependency graph it records is used instead of resolving the graph again.
 		
 		Calls the `conan info` command internally.
 		'''
@@ -55,7 +85,7 @@ class PackageManagement(object):
 			
 			# Run `conan info` to generate the JSON for the dependency graph
 			jsonFile = join(tempDir, 'dependencies.json')
-			subprocess.run(['conan', 'info', conanfile, '-pr', profile, '--json', jsonFile], check=True)
+			SubprocessRunner.run(['conan', 'info', conanfile, '--json', jsonFile] + PackageManagement.graphArgs(conanfile, profile, lockfile))
 			
 			# Parse the JSON dependency graph
 			return json.loads(Utility.readFile(jsonFile))
@@ -1,4 +1,4 @@
-import os, platform
+import json, os, platform
 
 class PluginConfiguration(object):
 	'''
@@ -14,3 +14,42 @@ class PluginConfiguration(object):
 			return os.path.join(os.environ['APPDATA'], 'conan-ue4cli')
 		else:
 			return os.path.join(os.environ['HOME'], '.config', 'conan-ue4cli')
+	
+	@staticmethod
+	def getSettingsFile():
+		'''
+		Returns the path to the JSON file that stores plugin-wide settings
+		'''
+		return os.path.join(PluginConfiguration.getConfigDirectory(), 'config.json')
+	
+	@staticmethod
+	def getSetting(key, default=None):
+		'''
+		Retrieves the value of the specified plugin-wide setting, or the supplied default if the setting has not been set
+		'''
+		settingsFile = PluginConfiguration.getSettingsFile()
+		if not os.path.exists(settingsFile):
+			return default
+		
+		with open(settingsFile, 'rb') as f:
+			return json.loads(f.read().decode('utf-8')).get(key, default)
+	
+	@staticmethod
+	def setSetting(key, value):
+		'''
+		Sets the value of the specified plugin-wide setting, removing the setting if the value is None
+		'''
+		settingsFile = PluginConfiguration.getSettingsFile()
+		settings = {}
+		if os.path.exists(settingsFile):
+			with open(settingsFile, 'rb') as f:
+				settings = json.loads(f.read().decode('utf-8'))
+		
+		if value is None:
+			settings.pop(key, None)
+		else:
+			settings[key] = value
+		
+		os.makedirs(os.path.dirname(settingsFile), exist_ok=True)
+		with open(settingsFile, 'wb') as f:
+			f.write(json.dumps(settings, sort_keys=True, indent=4).encode('utf-8'))
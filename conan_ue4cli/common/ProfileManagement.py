@@ -1,5 +1,6 @@
-import conans, os, re, shutil
-from os.path import exists, join
+import os, re, shutil
+from os.path import exists, isdir, join
+from .FileLock import FileLock
 from .Utility import Utility
 
 class ProfileManagement(object):
@@ -7,6 +8,12 @@ class ProfileManagement(object):
 	Provides functionality for managing Conan profiles
 	'''
 	
+	# Parsed profile files, keyed by profile name and stored alongside the modification time and size of the file they were parsed from
+	_parsedProfiles = {}
+	
+	# The list of profile names, stored alongside the modification time of the profiles directory it was read from
+	_profileList = (None, [])
+	
 	# Methods that apply to all Conan profiles, including those not generated by conan-ue4cli
 	
 	@staticmethod
@@ -14,7 +21,8 @@ class ProfileManagement(object):
 		'''
 		Returns the path to the Conan profiles directory
 		'''
-		return join(conans.paths.get_conan_user_home(), '.conan', 'profiles')
+		from conans.paths import get_conan_user_home
+		return join(get_conan_user_home(), '.conan', 'profiles')
 	
 	@staticmethod
 	def conanProfileFile(profile):
@@ -23,6 +31,14 @@ class ProfileManagement(object):
 		'''
 		return join(ProfileManagement.conanProfileDir(), profile)
 	
+	@staticmethod
+	def lockProfile(profile, shared=False):
+		'''
+		Returns a lock for the specified Conan profile, which should be held exclusively whilst the profile is being rewritten
+		and in shared mode whilst Conan commands are using it
+		'''
+		return FileLock(ProfileManagement.conanProfileFile(profile), shared)
+	
 	@staticmethod
 	def duplicateProfile(source, dest):
 		'''
@@ -65,8 +81,7 @@ class ProfileManagement(object):
 		'''
 		
 		# Retrieve the full list of Conan profiles
-		output = Utility.capture(['conan', 'profile', 'list'])
-		profiles = output.stdout.decode('utf-8').replace('\r\n', '\n').split('\n')
+		profiles = ProfileManagement._listProfiles()
 		
 		# Filter the list to identify the profiles generated by conan-ue4cli
 		filterRegex = re.compile('ue[0-9]+\\.[0-9]+-.+')
@@ -113,9 +128,67 @@ class ProfileManagement(object):
 	
 	# "Private" methods
 	
+	@staticmethod
+	def _listProfiles():
+		'''
+		Lists the files in the Conan profiles directory, reusing the previous listing if the directory has not changed
+		'''
+		profileDir = ProfileManagement.conanProfileDir()
+		if not isdir(profileDir):
+			return []
+		
+		mtime = os.stat(profileDir).st_mtime
+		if ProfileManagement._profileList[0] != mtime:
+			ProfileManagement._profileList = (mtime, sorted([
+				entry.name for entry in os.scandir(profileDir) if entry.is_file()
+			]))
+		
+		return ProfileManagement._profileList[1]
+	
+	@staticmethod
+	def _parseProfile(profile):
+		'''
+		Parses the file for the specified Conan profile into a dictionary mapping "section.key" to values.
+		Returns None if the profile uses features (such as includes or variables) that only Conan itself can evaluate.
+		'''
+		profileFile = ProfileManagement.conanProfileFile(profile)
+		if not exists(profileFile):
+			return None
+		
+		# Reuse the previously parsed values if the profile file has not been modified since they were parsed
+		details = os.stat(profileFile)
+		fingerprint = (details.st_mtime, details.st_size)
+		cached = ProfileManagement._parsedProfiles.get(profile)
+		if cached is not None and cached[0] == fingerprint:
+			return cached[1]
+		
+		values = {}
+		section = None
+		for line in Utility.readFile(profileFile).splitlines():
+			line = line.strip()
+			if len(line) == 0 or line.startswith('#'):
+				continue
+			elif line.startswith('[') and line.endswith(']'):
+				section = line[1:-1]
+			elif section is None or line.startswith('include(') or '$' in line:
+				values = None
+				break
+			elif '=' in line:
+				key, value = line.split('=', 1)
+				values['{}.{}'.format(section, key.strip())] = value.strip()
+		
+		ProfileManagement._parsedProfiles[profile] = (fingerprint, values)
+		return values
+	
 	@staticmethod
 	def _profileValue(profile, key):
 		'''
 		Retrieves the value of the requested key from the specified Conan profile
 		'''
-		return Utility.capture(['conan', 'profile', 'get', key, profile]).stdout.decode('utf-8').strip()
+		
+		# Read the value directly from the profile file where possible, and only fall back to querying Conan when we need to
+		values = ProfileManagement._parseProfile(profile)
+		if values is not None and key in values:
+			return values[key]
+		
+		return Utility.capture(['conan', 'profile', 'get', key, profile]).stdout.strip()
@@ -1,12 +1,16 @@
-from .PluginConfiguration import PluginConfiguration
 from .ConanTools import ConanTools
-import os, shutil
+from .FileLock import FileLock
+from .OfflineMode import OfflineMode
+from .PluginConfiguration import PluginConfiguration
+from .RecipeIndex import INDEX_FILE, RecipeIndex
+from .Utility import Utility
+import hashlib, json, os, platform, shutil, tempfile, time, zipfile
 
 # The URL from which we retrieve the zip file containing the latest recipe data
 RECIPE_ZIP_URL = 'https://github.com/adamrehn/ue4-conan-recipes/archive/master.zip'
 
-# The root directory name of the files in the recipe data zip file
-ZIP_ROOT_DIR = 'ue4-conan-recipes-master'
+# The name of the file inside the cache directory that stores the HTTP validators for the cached recipe data
+METADATA_FILE = '.cache-metadata.json'
 
 class RecipeCache(object):
 	'''
@@ -21,17 +25,198 @@ class RecipeCache(object):
 		return os.path.join(PluginConfiguration.getConfigDirectory(), 'recipes')
 	
 	@staticmethod
-	def updateCache():
+	def getMetadata():
+		'''
+		Returns the metadata for the current contents of the recipe cache, or an empty dictionary if there is none
+		'''
+		metadataFile = os.path.join(RecipeCache.getCacheDirectory(), METADATA_FILE)
+		return json.loads(Utility.readFile(metadataFile)) if os.path.exists(metadataFile) else {}
+	
+	@staticmethod
+	def getDefaultSource():
+		'''
+		Returns the location from which recipe data is retrieved by default, which can be overridden with a local mirror
+		'''
+		return PluginConfiguration.getSetting('recipeMirror', RECIPE_ZIP_URL)
+	
+	@staticmethod
+	def lock(shared=False):
 		'''
-		Updates the contents of the recipe cache with the latest recipes from our repo
+		Returns a lock for the recipe cache, which readers should hold in shared mode whilst they use the cached recipes
 		'''
+		return FileLock(RecipeCache.getCacheDirectory(), shared)
+	
+	@staticmethod
+	def updateCache(source=None):
+		'''
+		Updates the contents of the recipe cache with the latest recipes from our repo, or from the specified source.
+		The source can be an HTTP(S) URL or a `file://` URL or path referring to either a zip file or a directory.
+		Returns True if the cache was updated, or False if the cached recipes were already up-to-date.
+		'''
+		from urllib.error import HTTPError
+		from urllib.request import Request
+		
+		source = source if source is not None else RecipeCache.getDefaultSource()
+		localPath = Utility.localPath(source)
+		metadata = RecipeCache.getMetadata()
+		sameSource = metadata.get('url') == source
 		
-		# Remove the cache directory if it already exists
+		# Remote sources cannot be reached in offline mode, so fail immediately rather than waiting for the download to time out
+		if localPath is None:
+			OfflineMode.check('download recipe data from "{}"'.format(source), 'Use `ue4 conan update -mirror` to retrieve recipe data from a local mirror instead')
+		
+		# For local sources, we fingerprint the file or directory in place of the validators that a web server would provide
+		if localPath is not None:
+			if not os.path.exists(localPath):
+				raise RuntimeError('the recipe source "{}" does not exist'.format(localPath))
+			fingerprint = RecipeCache._fingerprint(localPath)
+			if sameSource == True and metadata.get('fingerprint') == fingerprint:
+				return False
+		
+		# Create a staging directory alongside the cache directory so we can populate it without disturbing the existing cache
 		cacheDir = RecipeCache.getCacheDirectory()
-		if os.path.exists(cacheDir):
-			shutil.rmtree(cacheDir)
+		parentDir = os.path.dirname(cacheDir)
+		os.makedirs(parentDir, exist_ok=True)
+		stagingDir = tempfile.mkdtemp(prefix='.recipes-staging-', dir=parentDir)
+		try:
+			
+			extracted = os.path.join(stagingDir, 'extracted')
+			if localPath is not None:
+				
+				# Copy or extract the recipe data from the local source
+				validators = {'fingerprint': fingerprint}
+				if os.path.isdir(localPath):
+					shutil.copytree(localPath, os.path.join(extracted, 'recipes'), ignore=shutil.ignore_patterns('.git', METADATA_FILE, INDEX_FILE))
+				else:
+					with zipfile.ZipFile(localPath) as zf:
+						zf.extractall(extracted)
+			
+			else:
+				
+				# Send the validators for our existing recipe data (if any) so the server can tell us if nothing has changed
+				request = Request(source)
+				if sameSource == True:
+					if metadata.get('etag') is not None:
+						request.add_header('If-None-Match', metadata['etag'])
+					if metadata.get('lastModified') is not None:
+						request.add_header('If-Modified-Since', metadata['lastModified'])
+				
+				# Download the recipe data, unless the server reports that it has not been modified
+				archive = os.path.join(stagingDir, 'recipes.zip')
+				try:
+					with RecipeCache._openUrl(request) as response, open(archive, 'wb') as outfile:
+						shutil.copyfileobj(response, outfile)
+						validators = {'etag': response.headers.get('ETag'), 'lastModified': response.headers.get('Last-Modified')}
+				except HTTPError as err:
+					if err.code == 304:
+						return False
+					raise
+				
+				# Extract the recipe data
+				with zipfile.ZipFile(archive) as zf:
+					zf.extractall(extracted)
+			
+			# If the recipe data has a single root directory (as GitHub archives do) then that directory holds the recipes
+			children = os.listdir(extracted)
+			root = os.path.join(extracted, children[0]) if len(children) == 1 and os.path.isdir(os.path.join(extracted, children[0])) else extracted
+			
+			# Store the validators for the new recipe data alongside the recipes themselves
+			metadata = {'url': source, 'updated': time.time()}
+			metadata.update(validators)
+			with open(os.path.join(root, METADATA_FILE), 'wb') as f:
+				f.write(json.dumps(metadata, indent=4).encode('utf-8'))
+			
+			# Index the new recipes so consumers of the cache can read a single file instead of crawling the recipe directories
+			RecipeIndex(root, os.path.join(root, INDEX_FILE)).refresh()
+			
+			# Swap the new recipe data into place once any other processes have finished reading the existing recipes
+			with RecipeCache.lock():
+				RecipeCache._swapDirectory(root, cacheDir)
+			return True
+		
+		# Report network, filesystem and archive errors in the same way as our other errors (the existing cache is left untouched)
+		except (OSError, zipfile.BadZipFile) as err:
+			raise RuntimeError('failed to update the recipe cache from "{}": {}'.format(source, err))
 		
-		# Download and extract the latest recipes from our GitHub repository
+		finally:
+			Utility.repeat(lambda: shutil.rmtree(stagingDir))
+	
+	@staticmethod
+	def _openUrl(request):
+		'''
+		Opens the specified request using the proxy and CA bundle settings from the Conan client configuration
+		'''
+		import ssl
+		from fnmatch import fnmatch
+		from urllib.parse import urlparse
+		from urllib.request import HTTPSHandler, ProxyHandler, build_opener
+		proxies, noProxyMatch, cacert = ConanTools.getNetworkSettings()
+		
+		# Conan allows proxies to be specified per host as well as per scheme, and a value of None disables the proxy for the scheme
+		url = urlparse(request.full_url)
+		hostKey = '{}://{}'.format(url.scheme, url.hostname)
+		handlers = []
+		if any([fnmatch(request.full_url, pattern) for pattern in noProxyMatch]):
+			handlers.append(ProxyHandler({}))
+		elif hostKey in proxies or url.scheme in proxies:
+			proxy = proxies[hostKey] if hostKey in proxies else proxies[url.scheme]
+			handlers.append(ProxyHandler({url.scheme: proxy} if proxy is not None else {}))
+		
+		if cacert is not None:
+			handlers.append(HTTPSHandler(context=ssl.create_default_context(cafile=cacert)))
+		return build_opener(*handlers).open(request)
+	
+	@staticmethod
+	def _fingerprint(path):
+		'''
+		Computes a fingerprint for a local recipe source from the names, sizes and modification times of its files
+		'''
+		hash = hashlib.sha256()
+		files = [path]
+		if os.path.isdir(path):
+			files = []
+			for dirpath, dirnames, filenames in os.walk(path):
+				dirnames[:] = [d for d in dirnames if d != '.git']
+				files.extend([os.path.join(dirpath, f) for f in filenames if f not in [METADATA_FILE, INDEX_FILE]])
+		
+		for file in sorted(files):
+			details = os.stat(file)
+			hash.update('{}\0{}\0{}\n'.format(os.path.relpath(file, path), details.st_size, details.st_mtime).encode('utf-8'))
+		return hash.hexdigest()
+	
+	@staticmethod
+	def _swapDirectory(source, cacheDir):
+		'''
+		Replaces the recipe cache directory with the specified source directory, as atomically as the host platform allows
+		'''
 		parentDir = os.path.dirname(cacheDir)
-		ConanTools.get(RECIPE_ZIP_URL, destination=parentDir)
-		shutil.move(os.path.join(parentDir, ZIP_ROOT_DIR), cacheDir)
+		
+		# Move the new data to a uniquely-named directory alongside the cache directory
+		versioned = tempfile.mkdtemp(prefix='recipes-', dir=parentDir)
+		os.rmdir(versioned)
+		os.rename(source, versioned)
+		
+		# Under Windows, creating symlinks requires elevated privileges, so we swap directories with a pair of renames instead
+		if platform.system() == 'Windows':
+			previous = None
+			if os.path.exists(cacheDir):
+				previous = versioned + '-old'
+				os.rename(cacheDir, previous)
+			os.rename(versioned, cacheDir)
+		else:
+			
+			# Under other platforms, the cache directory is a symlink to the current versioned directory, which we replace atomically
+			previous = os.path.join(parentDir, os.readlink(cacheDir)) if os.path.islink(cacheDir) else None
+			
+			# If the cache directory is a real directory created by an older version of conan-ue4cli then move it out of the way first
+			if os.path.isdir(cacheDir) and not os.path.islink(cacheDir):
+				previous = versioned + '-old'
+				os.rename(cacheDir, previous)
+			
+			link = versioned + '-link'
+			os.symlink(os.path.basename(versioned), link)
+			os.replace(link, cacheDir)
+		
+		# Remove the previous recipe data
+		if previous is not None and os.path.exists(previous):
+			Utility.repeat(lambda: shutil.rmtree(previous))
@@ -0,0 +1,110 @@
+from .PluginConfiguration import PluginConfiguration
+from .Utility import Utility
+from os.path import abspath, exists, isdir, join
+import hashlib, json, os
+
+# The filename used for recipe indices that are stored inside the directory they describe (such as the recipe cache)
+INDEX_FILE = '.recipe-index.json'
+
+# The version of the index file format, which is bumped whenever the format of index entries changes
+INDEX_VERSION = 2
+
+
+class RecipeIndex(object):
+	'''
+	Provides functionality for maintaining an index of the package recipes contained in a directory
+	'''
+	
+	def __init__(self, directory, indexFile=None):
+		'''
+		Creates an index for the specified directory, stored in the specified index file.
+		If no index file is specified then the index is stored in the conan-ue4cli config directory.
+		'''
+		self.directory = abspath(directory)
+		self.indexFile = indexFile if indexFile is not None else join(
+			PluginConfiguration.getConfigDirectory(),
+			'indices',
+			'{}.json'.format(hashlib.sha1(self.directory.encode('utf-8')).hexdigest())
+		)
+	
+	@staticmethod
+	def forDirectory(directory):
+		'''
+		Returns the up-to-date list of index entries for the specified directory.
+		Directories that ship with their own index (such as the recipe cache) are trusted without crawling them,
+		whilst all other directories are indexed incrementally, re-indexing only those recipes that have changed.
+		'''
+		embedded = join(directory, INDEX_FILE)
+		if exists(embedded):
+			entries = RecipeIndex(directory, embedded).load()
+			if entries is not None:
+				return entries
+		
+		return RecipeIndex(directory).refresh()
+	
+	def load(self):
+		'''
+		Reads the index entries from the index file without checking them against the directory contents.
+		Returns None if the index file does not exist or uses an incompatible format.
+		'''
+		if not exists(self.indexFile):
+			return None
+		
+		index = json.loads(Utility.readFile(self.indexFile))
+		if index.get('version') != INDEX_VERSION:
+			return None
+		
+		return index['recipes']
+	
+	def refresh(self):
+		'''
+		Brings the index up-to-date with the contents of the directory and returns the index entries
+		'''
+		previous = self.load() or {}
+		entries = {}
+		
+		# Stat each recipe, re-indexing only those recipes that are new or whose conanfile has changed
+		for name, version, conanfile in self._scan():
+			key = '{}/{}'.format(name, version)
+			details = os.stat(conanfile)
+			existing = previous.get(key)
+			if existing is not None and existing['mtime'] == details.st_mtime and existing['size'] == details.st_size:
+				entries[key] = existing
+			else:
+				entries[key] = RecipeIndex._indexRecipe(name, version, conanfile, details)
+		
+		# Only rewrite the index file if something has changed
+		if entries != previous or not exists(self.indexFile):
+			os.makedirs(os.path.dirname(self.indexFile), exist_ok=True)
+			tempFile = self.indexFile + '.tmp'
+			with open(tempFile, 'wb') as f:
+				f.write(json.dumps({'version': INDEX_VERSION, 'recipes': entries}, sort_keys=True, indent=4).encode('utf-8'))
+			os.replace(tempFile, self.indexFile)
+		
+		return entries
+	
+	def _scan(self):
+		'''
+		Yields (name, version, conanfile path) tuples for each recipe in the directory, using the NAME/VERSION/conanfile.py layout
+		'''
+		if not isdir(self.directory):
+			return
+		
+		for nameEntry in os.scandir(self.directory):
+			if nameEntry.is_dir():
+				for versionEntry in os.scandir(nameEntry.path):
+					conanfile = join(versionEntry.path, 'conanfile.py')
+					if versionEntry.is_dir() and exists(conanfile):
+						yield nameEntry.name, versionEntry.name, conanfile
+	
+	@staticmethod
+	def _indexRecipe(name, version, conanfile, details):
+		'''
+		Computes the index entry for a recipe
+		'''
+		return {
+			'name': name,
+			'version': version,
+			'mtime': details.st_mtime,
+			'size': details.st_size
+		}
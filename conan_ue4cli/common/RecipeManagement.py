@@ -1,7 +1,6 @@
-from os.path import basename, dirname, join
-from pkg_resources import parse_version
+from .RecipeIndex import RecipeIndex
 from .Utility import Utility
-import glob, re
+import re
 
 class RecipeManagement(object):
 	'''
@@ -24,8 +23,7 @@ class RecipeManagement(object):
 		
 		# Extract the list of version numbers and return the highest available version
 		references = [RecipeManagement.parseReference(recipe['recipe']['id']) for recipe in recipes[0]]
-		versions = sorted([parse_version(reference['version']) for reference in references])
-		return str(versions[-1])
+		return RecipeManagement.latestVersion([reference['version'] for reference in references])
 	
 	@staticmethod
 	def listRecipesInDir(directory):
@@ -33,12 +31,40 @@ class RecipeManagement(object):
 		Retrieves the list of available package recipes contained in a directory.
 		Return value is a list of tuples containing (package, version).
 		'''
-		recipes = glob.glob(join(directory, '*', '*', 'conanfile.py'))
+		entries = RecipeIndex.forDirectory(directory)
 		return list([
-			(basename(dirname(dirname(recipe))),basename(dirname(recipe)))
-			for recipe in recipes
+			(entries[key]['name'], entries[key]['version'])
+			for key in sorted(entries.keys())
 		])
 	
+	@staticmethod
+	def resolveRecipes(sources):
+		'''
+		Resolves the package recipes from a list of source directories, where recipes in later sources take precedence over earlier ones.
+		Return value is a tuple containing (recipes, shadowed), where recipes is a list of tuples containing (source, package, version)
+		and shadowed is a list of tuples containing (source, package, version, winning source) for recipes that will not be used.
+		'''
+		
+		# Determine the winning source for each package version before anything is exported
+		winners = {}
+		shadowed = []
+		for source in sources:
+			for name, version in RecipeManagement.listRecipesInDir(source):
+				if (name, version) in winners:
+					shadowed.append((winners[(name, version)], name, version, source))
+				winners[(name, version)] = source
+		
+		recipes = list([(winners[recipe], recipe[0], recipe[1]) for recipe in sorted(winners.keys())])
+		return (recipes, shadowed)
+	
+	@staticmethod
+	def latestVersion(versions):
+		'''
+		Returns the highest version number from the supplied list of version strings
+		'''
+		from pkg_resources import parse_version
+		return str(sorted([parse_version(version) for version in versions])[-1])
+	
 	@staticmethod
 	def parseReference(reference):
 		'''
@@ -0,0 +1,180 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from fnmatch import fnmatch
+from os.path import join, relpath
+import gzip, os, sys, tarfile, zipfile
+
+# The archive formats that we support, mapped to their filename suffixes
+ARCHIVE_FORMATS = {
+	'zip': '.zip',
+	'tar.gz': '.tar.gz',
+	'tar.zst': '.tar.zst'
+}
+
+# The default compression level for each of our supported archive formats
+DEFAULT_LEVELS = {
+	'zip': 6,
+	'tar.gz': 6,
+	'tar.zst': 3
+}
+
+# The size of the chunks that are compressed independently when performing parallel gzip compression
+GZIP_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+class _ParallelGzipWriter(object):
+	'''
+	Write-only file object that compresses chunks of its input in parallel, emitting them as concatenated gzip members
+	'''
+	
+	def __init__(self, fileobj, level, threads):
+		self._fileobj = fileobj
+		self._level = level
+		self._threads = threads
+		self._pool = ThreadPoolExecutor(max_workers=threads)
+		self._pending = deque()
+		self._buffer = bytearray()
+	
+	def write(self, data):
+		self._buffer.extend(data)
+		while len(self._buffer) >= GZIP_CHUNK_SIZE:
+			self._submit(bytes(self._buffer[:GZIP_CHUNK_SIZE]))
+			del self._buffer[:GZIP_CHUNK_SIZE]
+		return len(data)
+	
+	def close(self):
+		if len(self._buffer) > 0:
+			self._submit(bytes(self._buffer))
+			self._buffer = bytearray()
+		while len(self._pending) > 0:
+			self._fileobj.write(self._pending.popleft().result())
+		self.shutdown()
+	
+	def shutdown(self):
+		'''
+		Shuts down our thread pool, which is safe to call multiple times (e.g. after an error)
+		'''
+		self._pool.shutdown()
+	
+	def _submit(self, chunk):
+		
+		# Bound the number of in-flight chunks so our memory usage stays proportional to the thread count
+		while len(self._pending) >= self._threads * 2:
+			self._fileobj.write(self._pending.popleft().result())
+		self._pending.append(self._pool.submit(gzip.compress, chunk, self._level))
+
+
+class SourceArchiver(object):
+	'''
+	Provides functionality for archiving source trees in a single streaming pass, skipping excluded files and directories
+	'''
+	
+	def __init__(self, excludePatterns=None, format='zip', level=None, threads=1):
+		'''
+		Creates a new archiver for the specified exclusion patterns, archive format, compression level and thread count
+		'''
+		if format not in ARCHIVE_FORMATS:
+			raise RuntimeError('unsupported archive format "{}"'.format(format))
+		
+		self.excludePatterns = excludePatterns if excludePatterns is not None else []
+		self.format = format
+		self.level = level if level is not None else DEFAULT_LEVELS[format]
+		self.threads = max(1, threads)
+	
+	def suffix(self):
+		'''
+		Returns the filename suffix for archives generated by this archiver
+		'''
+		return ARCHIVE_FORMATS[self.format]
+	
+	def archive(self, sourceDir, archive):
+		'''
+		Archives the contents of the specified source directory into the specified archive file
+		'''
+		if self.format == 'zip':
+			self._writeZip(sourceDir, archive)
+		elif self.format == 'tar.gz':
+			self._writeGzipTar(sourceDir, archive)
+		else:
+			self._writeZstdTar(sourceDir, archive)
+	
+	def _isExcluded(self, name):
+		'''
+		Determines whether the specified file or directory name matches any of our exclusion patterns
+		'''
+		return any([fnmatch(name, pattern) for pattern in self.excludePatterns])
+	
+	def _walk(self, sourceDir):
+		'''
+		Walks the specified source directory, yielding (path, archive name, is directory) tuples for everything not excluded
+		'''
+		for dirpath, dirnames, filenames in os.walk(sourceDir):
+			
+			# Prune excluded directories in-place so we never descend into them
+			for excluded in [d for d in dirnames if self._isExcluded(d)]:
+				print('Excluding: {}'.format(join(dirpath, excluded)), flush=True)
+			dirnames[:] = sorted([d for d in dirnames if not self._isExcluded(d)])
+			
+			for dirname in dirnames:
+				path = join(dirpath, dirname)
+				yield path, relpath(path, sourceDir).replace(os.sep, '/'), True
+			
+			for filename in sorted(filenames):
+				path = join(dirpath, filename)
+				if self._isExcluded(filename):
+					print('Excluding: {}'.format(path), flush=True)
+				elif not os.path.isfile(path):
+					print('Skipping broken symlink or special file: {}'.format(path), flush=True)
+				else:
+					yield path, relpath(path, sourceDir).replace(os.sep, '/'), False
+	
+	def _writeZip(self, sourceDir, archive):
+		'''
+		Writes a zip archive containing the contents of the specified source directory
+		'''
+		
+		# The compression level can only be specified under Python 3.7 and newer (older versions use zlib's default level of 6)
+		options = {'compresslevel': self.level} if sys.version_info >= (3, 7) else {}
+		with zipfile.ZipFile(archive, 'w', compression=zipfile.ZIP_DEFLATED, **options) as zf:
+			for path, name, isDir in self._walk(sourceDir):
+				zf.write(path, name + '/' if isDir else name)
+	
+	def _writeTar(self, sourceDir, fileobj):
+		'''
+		Writes an uncompressed tar stream containing the contents of the specified source directory to the supplied file object
+		'''
+		with tarfile.open(fileobj=fileobj, mode='w|', format=tarfile.PAX_FORMAT) as tf:
+			for path, name, isDir in self._walk(sourceDir):
+				tf.add(path, name, recursive=False)
+	
+	def _writeGzipTar(self, sourceDir, archive):
+		'''
+		Writes a gzip-compressed tar archive, compressing chunks in parallel if multiple threads were requested
+		'''
+		with open(archive, 'wb') as outfile:
+			if self.threads > 1:
+				writer = _ParallelGzipWriter(outfile, self.level, self.threads)
+				try:
+					self._writeTar(sourceDir, writer)
+					writer.close()
+				finally:
+					writer.shutdown()
+			else:
+				with gzip.GzipFile(fileobj=outfile, mode='wb', compresslevel=self.level) as writer:
+					self._writeTar(sourceDir, writer)
+	
+	def _writeZstdTar(self, sourceDir, archive):
+		'''
+		Writes a zstd-compressed tar archive, using zstd's native multithreading if multiple threads were requested
+		'''
+		
+		# The zstandard package is an optional dependency, so only require it when it is actually needed
+		try:
+			import zstandard
+		except ImportError:
+			raise RuntimeError('the "zstandard" Python package is required to create tar.zst archives. Install it with `pip install zstandard`.')
+		
+		compressor = zstandard.ZstdCompressor(level=self.level, threads=self.threads if self.threads > 1 else 0)
+		with open(archive, 'wb') as outfile:
+			with compressor.stream_writer(outfile, closefd=False) as writer:
+				self._writeTar(sourceDir, writer)
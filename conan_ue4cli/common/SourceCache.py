@@ -0,0 +1,253 @@
+from .FileLock import FileLock
+from .PluginConfiguration import PluginConfiguration
+from .Utility import Utility
+from os.path import exists, join
+import hashlib, json, os, re, shutil, stat, tempfile, time
+
+# The default maximum size of the source cache, in bytes
+DEFAULT_MAX_SIZE = 10 * 1024 * 1024 * 1024
+
+# The age in seconds after which a leftover staging directory is assumed to belong to a run that was killed
+STALE_STAGING_AGE = 24 * 60 * 60
+
+# The pattern that the names of cache entry directories match (entries are named after their SHA-256 cache key)
+ENTRY_PATTERN = re.compile('^[0-9a-f]{64}$')
+
+# The multipliers for the size suffixes that we accept when parsing size strings
+SIZE_SUFFIXES = {
+	'': 1,
+	'K': 1024,
+	'M': 1024 ** 2,
+	'G': 1024 ** 3,
+	'T': 1024 ** 4
+}
+
+
+# Clears the read-only attribute of a file that could not be deleted and retries the deletion
+def _clearReadOnly(func, path, excinfo):
+	os.chmod(path, stat.S_IWRITE)
+	func(path)
+
+
+class SourceCache(object):
+	'''
+	Provides functionality for managing the persistent cache of pristine dependency source trees
+	'''
+	
+	def __init__(self, maxSize=DEFAULT_MAX_SIZE, cacheDir=None):
+		'''
+		Creates a new source cache with the specified maximum size in bytes (a size of zero disables the cache)
+		'''
+		self.maxSize = maxSize
+		self.cacheDir = cacheDir if cacheDir is not None else SourceCache.getCacheDirectory()
+		self._indexFile = join(self.cacheDir, 'index.json')
+		self._pins = {}
+	
+	@staticmethod
+	def getCacheDirectory():
+		'''
+		Returns the path to the source cache directory
+		'''
+		return join(PluginConfiguration.getConfigDirectory(), 'sources')
+	
+	@staticmethod
+	def parseSize(size):
+		'''
+		Parses a human-readable size string (e.g. "512M" or "10G") into a number of bytes
+		'''
+		match = re.match('^([0-9]+(\\.[0-9]+)?)\\s*([KMGT]?)i?B?$', size.strip(), re.IGNORECASE)
+		if match is None:
+			raise RuntimeError('invalid size "{}"'.format(size))
+		return int(float(match.group(1)) * SIZE_SUFFIXES[match.group(3).upper()])
+	
+	@staticmethod
+	def key(reference, recipe):
+		'''
+		Computes the cache key for a package reference and the contents of its recipe
+		'''
+		return hashlib.sha256('{}\n{}'.format(reference, recipe).encode('utf-8')).hexdigest()
+	
+	def enabled(self):
+		'''
+		Determines whether the source cache is enabled
+		'''
+		return self.maxSize > 0
+	
+	def lookup(self, key):
+		'''
+		Returns the path to the cached source tree for the specified key, or None if there is no cache entry.
+		The entry is pinned so that other runs cannot replace or evict it until it is passed to `release()`.
+		'''
+		with self._lockIndex():
+			index = self._readIndex()
+			entry = join(self.cacheDir, key)
+			if key not in index or not exists(entry):
+				return None
+			
+			# Mark the entry as the most recently used
+			index[key]['lastUsed'] = time.time()
+			self._writeIndex(index)
+			self._pin(key)
+			return entry
+	
+	def stage(self):
+		'''
+		Creates an empty staging directory inside the cache that source code can be retrieved into prior to calling `store()`
+		'''
+		os.makedirs(self.cacheDir, exist_ok=True)
+		return tempfile.mkdtemp(prefix='.staging-', dir=self.cacheDir)
+	
+	def store(self, key, reference, stagingDir):
+		'''
+		Moves a staged source tree into the cache under the specified key and returns its new location.
+		The entry is pinned so that other runs cannot replace or evict it until it is passed to `release()`.
+		'''
+		size = self._treeSize(stagingDir)
+		with self._lockIndex():
+			entry = join(self.cacheDir, key)
+			if exists(entry):
+				
+				# If another run is using an existing entry for the same key then it is identical to ours, so we use it instead
+				lock = self._tryLockEntry(key)
+				if lock is None:
+					self.discard(stagingDir)
+					self._pin(key)
+					return entry
+				self._removeTree(entry)
+				lock.release()
+			os.rename(stagingDir, entry)
+			
+			index = self._readIndex()
+			index[key] = {
+				'reference': reference,
+				'size': size,
+				'lastUsed': time.time()
+			}
+			self._writeIndex(index)
+			self._pin(key)
+			return entry
+	
+	def release(self, entry):
+		'''
+		Releases the pin on a cache entry returned by `lookup()` or `store()`, allowing other runs to replace or evict it
+		'''
+		lock = self._pins.pop(os.path.basename(entry), None)
+		if lock is not None:
+			lock.release()
+	
+	def discard(self, stagingDir):
+		'''
+		Removes a staging directory that will not be stored in the cache
+		'''
+		if exists(stagingDir):
+			self._removeTree(stagingDir)
+	
+	def trim(self):
+		'''
+		Evicts the least recently used entries until the total size of the cache is within our maximum size,
+		and removes any entries missing from the index and any staging directories left behind by killed runs
+		(Entries that are pinned by any run are never removed, so the cache may temporarily remain above its maximum size)
+		'''
+		with self._lockIndex():
+			index = self._readIndex()
+			
+			# Remove anything that no run can still be using
+			for child in os.listdir(self.cacheDir) if exists(self.cacheDir) else []:
+				path = join(self.cacheDir, child)
+				if child.startswith('.staging-') and time.time() - self._modified(path) > STALE_STAGING_AGE:
+					print('Removing stale staging directory {}...'.format(path), flush=True)
+					self._removeTree(path)
+				elif ENTRY_PATTERN.match(child) is not None and child not in index:
+					lock = self._tryLockEntry(child)
+					if lock is not None:
+						print('Removing orphaned cache entry {}...'.format(path), flush=True)
+						self._removeTree(path)
+						lock.release()
+			
+			totalSize = sum([entry['size'] for entry in index.values()])
+			for key in sorted(index.keys(), key=lambda k: index[k]['lastUsed']):
+				if totalSize <= self.maxSize:
+					break
+				
+				# Skip any entries that are currently being used
+				lock = self._tryLockEntry(key)
+				if lock is None:
+					continue
+				
+				print('Evicting cached source code for package {}...'.format(index[key]['reference']), flush=True)
+				self._removeTree(join(self.cacheDir, key))
+				lock.release()
+				totalSize -= index[key]['size']
+				del index[key]
+			
+			self._writeIndex(index)
+	
+	def _lockIndex(self):
+		'''
+		Returns a lock that must be held whilst reading, modifying and writing the cache index, so concurrent runs do not lose each other's changes
+		(The index is only ever locked briefly, so we wait silently rather than reporting that we are waiting)
+		'''
+		return FileLock(self._indexFile, quiet=True)
+	
+	def _entryLock(self, key, shared):
+		'''
+		Returns the lock for the specified cache entry, which runs hold shared whilst using the entry and exclusive whilst removing it
+		(Exclusive locks are only ever taken whilst holding the index lock, so acquiring a shared lock whilst holding the index lock never waits)
+		'''
+		return FileLock(join(self.cacheDir, key), shared=shared, quiet=True)
+	
+	def _pin(self, key):
+		'''
+		Acquires a shared lock on the specified cache entry, which must be called whilst holding the index lock
+		'''
+		if key not in self._pins:
+			self._pins[key] = self._entryLock(key, True).acquire()
+	
+	def _tryLockEntry(self, key):
+		'''
+		Attempts to acquire an exclusive lock on the specified cache entry without waiting, returning None if any run is using the entry
+		'''
+		lock = self._entryLock(key, False)
+		return lock if lock.tryAcquire() == True else None
+	
+	def _readIndex(self):
+		'''
+		Reads the cache index, which maps cache keys to their package reference, size and last use time
+		'''
+		if not exists(self._indexFile):
+			return {}
+		return json.loads(Utility.readFile(self._indexFile))
+	
+	def _writeIndex(self, index):
+		'''
+		Atomically replaces the cache index with the supplied data
+		'''
+		os.makedirs(self.cacheDir, exist_ok=True)
+		handle, tempFile = tempfile.mkstemp(prefix='.index-', suffix='.tmp', dir=self.cacheDir)
+		with os.fdopen(handle, 'wb') as f:
+			f.write(json.dumps(index, sort_keys=True, indent=4).encode('utf-8'))
+		os.replace(tempFile, self._indexFile)
+	
+	def _modified(self, path):
+		'''
+		Returns the modification time of the specified path, treating paths that have just been removed by another run as brand new
+		'''
+		try:
+			return os.stat(path).st_mtime
+		except FileNotFoundError:
+			return time.time()
+	
+	def _treeSize(self, directory):
+		'''
+		Computes the total size of the files in the specified directory tree
+		'''
+		total = 0
+		for dirpath, dirnames, filenames in os.walk(directory):
+			total += sum([os.lstat(join(dirpath, f)).st_size for f in filenames])
+		return total
+	
+	def _removeTree(self, directory):
+		'''
+		Removes a directory tree, including any read-only files (such as those found in git repositories)
+		'''
+		Utility.repeat(lambda: shutil.rmtree(directory, onerror=_clearReadOnly))
@@ -0,0 +1,238 @@
+from .CommandTracer import CommandTracer
+from .ConanWorker import ConanWorker
+from .OfflineMode import OfflineMode
+from collections import deque
+import atexit, os, subprocess, sys, threading, time
+
+# The default number of trailing output lines that are retained to provide context when a command fails
+DEFAULT_CONTEXT_LINES = 50
+
+# The maximum number of bytes that are read as a single line, to bound memory usage for output without line breaks
+MAX_LINE_LENGTH = 64 * 1024
+
+
+class SubprocessResult(object):
+	'''
+	Represents the result of a command executed by SubprocessRunner
+	'''
+	
+	def __init__(self, command, returncode, duration, stdout, stderr, tail, peakRSS=None):
+		self.command = command
+		self.returncode = returncode
+		self.duration = duration
+		self.stdout = stdout
+		self.stderr = stderr
+		self.tail = tail
+		self.peakRSS = peakRSS
+	
+	def succeeded(self):
+		'''
+		Determines whether the command completed successfully
+		'''
+		return self.returncode == 0
+
+
+class ConsoleTee(object):
+	'''
+	Output callback that echoes each line to the corresponding stream of the current process
+	'''
+	
+	def __call__(self, line, stream):
+		(sys.stderr if stream == 'stderr' else sys.stdout).write(line)
+		(sys.stderr if stream == 'stderr' else sys.stdout).flush()
+
+
+class LogFile(object):
+	'''
+	Output callback that appends each line to a log file
+	'''
+	
+	def __init__(self, filename):
+		self._file = open(filename, 'a', encoding='utf-8')
+		self._lock = threading.Lock()
+	
+	def __call__(self, line, stream):
+		with self._lock:
+			self._file.write(line)
+	
+	def begin(self, command):
+		'''
+		Writes a header line identifying the command whose output follows
+		'''
+		with self._lock:
+			self._file.write('$ {}\n'.format(' '.join(command) if isinstance(command, list) else command))
+			self._file.flush()
+	
+	def close(self):
+		self._file.close()
+
+
+class RingBuffer(object):
+	'''
+	Output callback that retains only the most recent lines of output
+	'''
+	
+	def __init__(self, maxLines):
+		self._lines = deque(maxlen=maxLines)
+		self._lock = threading.Lock()
+	
+	def __call__(self, line, stream):
+		with self._lock:
+			self._lines.append(line)
+	
+	def lines(self):
+		with self._lock:
+			return list(self._lines)
+
+
+class _Capture(object):
+	'''
+	Output callback that retains all output for a single stream, for commands whose output we need to parse
+	'''
+	
+	def __init__(self):
+		self._chunks = []
+	
+	def __call__(self, line, stream):
+		self._chunks.append(line)
+	
+	def value(self):
+		return ''.join(self._chunks)
+
+
+class _ChildWaiter(threading.Thread):
+	'''
+	Waits for a child process to complete, retrieving its peak resident set size on platforms that support `os.wait4()`
+	'''
+	
+	def __init__(self, proc):
+		super().__init__(daemon=True)
+		self.proc = proc
+		self.peakRSS = None
+	
+	def run(self):
+		if hasattr(os, 'wait4') == False:
+			self.proc.wait()
+			return
+		
+		# Reap the child ourselves so we can retrieve its resource usage, then inform the Popen object of its exit code
+		_, status, rusage = os.wait4(self.proc.pid, 0)
+		self.peakRSS = CommandTracer.peakRSS(rusage)
+		self.proc.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+
+
+class SubprocessRunner(object):
+	'''
+	Provides functionality for executing commands whilst streaming their output line by line to callbacks
+	'''
+	
+	# The log file that the output of every command is appended to, if any
+	_log = None
+	
+	@staticmethod
+	def setLogFile(filename):
+		'''
+		Appends the output of every command run for the lifetime of the current process to the specified log file
+		'''
+		SubprocessRunner._log = LogFile(filename)
+		atexit.register(SubprocessRunner._log.close)
+	
+	@staticmethod
+	def run(command, check=True, capture=False, echo=True, callbacks=[], timeout=None, contextLines=DEFAULT_CONTEXT_LINES, **kwargs):
+		'''
+		Executes a command, passing each line of its output to the supplied callbacks as it is produced.
+		Output is echoed to the console if `echo` is True, and is only retained in full if `capture` is True,
+		otherwise only the last `contextLines` lines are retained so they can be reported if the command fails.
+		Raises an exception if the command fails or exceeds its timeout (unless `check` is set to False).
+		'''
+		
+		# Build the list of callbacks for each output stream
+		tail = RingBuffer(contextLines)
+		captured = {'stdout': _Capture(), 'stderr': _Capture()}
+		sinks = {}
+		for stream in ['stdout', 'stderr']:
+			sinks[stream] = [tail] + list(callbacks)
+			if echo == True:
+				sinks[stream].append(ConsoleTee())
+			if capture == True:
+				sinks[stream].append(captured[stream])
+			if SubprocessRunner._log is not None:
+				sinks[stream].append(SubprocessRunner._log)
+		
+		# Identify the command in the log file (if logging is enabled)
+		if SubprocessRunner._log is not None:
+			SubprocessRunner._log.begin(command)
+		
+		# Run the command, either in our Conan API worker process (if it is enabled and this is a Conan command) or as a child process
+		# (In offline mode, Conan child processes are run via a wrapper that hides the configured remotes)
+		started = time.time()
+		worker = ConanWorker.forCommand(command, kwargs)
+		if worker is not None:
+			returncode, timedOut = worker.run(command[1:], kwargs.get('cwd'), kwargs.get('env'), sinks, timeout)
+			peakRSS = None
+		else:
+			returncode, timedOut, peakRSS = SubprocessRunner._runChild(OfflineMode.wrapCommand(command), sinks, timeout, kwargs)
+		finished = time.time()
+		
+		result = SubprocessResult(
+			command,
+			returncode,
+			finished - started,
+			captured['stdout'].value() if capture == True else None,
+			captured['stderr'].value() if capture == True else None,
+			tail.lines(),
+			peakRSS
+		)
+		
+		# Record the command in the trace, if tracing is enabled
+		CommandTracer.recordCommand(command, kwargs.get('cwd'), started, finished, returncode, peakRSS)
+		
+		# Report failures along with the most recent output to provide context
+		if check == True and (timedOut == True or returncode != 0):
+			reason = 'timed out after {} seconds'.format(timeout) if timedOut == True else 'failed with exit code {}'.format(returncode)
+			raise RuntimeError(
+				'child process {} {}'.format(command, reason) +
+				'\nlast {} lines of output:\n{}'.format(len(result.tail), ''.join(result.tail))
+			)
+		
+		return result
+	
+	@staticmethod
+	def _runChild(command, sinks, timeout, kwargs):
+		'''
+		Runs a command as a child process, returning its exit code, whether it timed out and its peak resident set size
+		'''
+		
+		# Start the child process and spawn a thread to read each of its output streams
+		proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs)
+		readers = [
+			threading.Thread(target=SubprocessRunner._pump, args=(proc.stdout, 'stdout', sinks['stdout']), daemon=True),
+			threading.Thread(target=SubprocessRunner._pump, args=(proc.stderr, 'stderr', sinks['stderr']), daemon=True)
+		]
+		for reader in readers:
+			reader.start()
+		
+		# Wait for the child process to complete, killing it if it exceeds its timeout
+		timedOut = False
+		waiter = _ChildWaiter(proc)
+		waiter.start()
+		waiter.join(timeout)
+		if waiter.is_alive():
+			timedOut = True
+			proc.kill()
+			waiter.join()
+		for reader in readers:
+			reader.join()
+		
+		return (proc.returncode, timedOut, waiter.peakRSS)
+	
+	@staticmethod
+	def _pump(pipe, stream, sinks):
+		'''
+		Reads lines from a pipe until it is closed, passing each line to the supplied callbacks
+		'''
+		with pipe:
+			for line in iter(lambda: pipe.readline(MAX_LINE_LENGTH), b''):
+				decoded = line.decode('utf-8', errors='replace').replace('\r\n', '\n')
+				for sink in sinks:
+					sink(decoded, stream)
@@ -1,5 +1,7 @@
-import glob, importlib.util, json, os, shutil, subprocess, sys, tempfile, time
+import importlib.util, json, os, shutil, sys, tempfile, time
 from os.path import basename, dirname, exists, isdir, join
+from urllib.parse import urlparse
+from .SubprocessRunner import SubprocessRunner
 
 class Utility(object):
 	'''
@@ -23,22 +25,15 @@ class Utility(object):
 		'''
 		Executes a command and returns its output, raising an exception if it fails (unless `check` is set to False)
 		'''
-		proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, **kwargs)
-		(stdout, stderr) = proc.communicate(input)
-		if proc.returncode != 0 and check == True:
-			raise Exception(
-				'child process {} failed with exit code {}'.format(command, proc.returncode) +
-				'\nstdout: "{}"\nstderr: "{}"'.format(stdout, stderr)
-			)
-		
-		return (stdout, stderr)
+		result = SubprocessRunner.run(command, check=check, capture=True, echo=False, **kwargs)
+		return (result.stdout, result.stderr)
 	
 	@staticmethod
 	def capture(command, **kwargs):
 		'''
 		Executes the supplied command and captures the output
 		'''
-		return subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs)
+		return SubprocessRunner.run(command, check=True, capture=True, echo=False, **kwargs)
 	
 	@staticmethod
 	def copyFileOrDir(source, destDir):
@@ -73,13 +68,30 @@ class Utility(object):
 		# Create the directory and any missing parent directories
 		os.makedirs(dirPath)
 	
+	@staticmethod
+	def localPath(location):
+		'''
+		Resolves the local filesystem path for a location that is either a `file://` URL or a plain path.
+		Returns None if the location is a URL for any other scheme.
+		'''
+		parsed = urlparse(location)
+		if parsed.scheme == 'file':
+			from urllib.request import url2pathname
+			return url2pathname(parsed.path)
+		elif len(parsed.scheme) <= 1:
+			
+			# Plain paths have no scheme, although Windows drive letters look like single-character schemes
+			return location
+		
+		return None
+	
 	@staticmethod
 	def listPackagesInDir(directory):
 		'''
 		Retrieves the list of available package recipes contained in a directory
 		'''
-		allPackages = glob.glob(join(directory, '*', '*', 'conanfile.py'))
-		uniqueNames = set([basename(dirname(dirname(p))) for p in allPackages])
+		from .RecipeIndex import RecipeIndex
+		uniqueNames = set([entry['name'] for entry in RecipeIndex.forDirectory(directory).values()])
 		return list(uniqueNames)
 	
 	@staticmethod
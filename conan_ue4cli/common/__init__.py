@@ -1,12 +1,20 @@
 from .CommandExecutor import CommandExecutor
+from .CommandTracer import CommandTracer
 from .ConanTools import ConanTools
+from .ConanWorker import ConanWorker
 from .DelegateManager import DelegateManager
 from .ExecutableResolver import ExecutableResolver
+from .FileLock import FileLock
 from .LibraryResolver import LibraryResolver
+from .OfflineMode import OfflineMode
 from .PackageBuilder import PackageBuilder
 from .PackageManagement import PackageManagement
 from .PluginConfiguration import PluginConfiguration
 from .ProfileManagement import ProfileManagement
 from .RecipeCache import RecipeCache
+from .RecipeIndex import RecipeIndex
 from .RecipeManagement import RecipeManagement
+from .SourceArchiver import SourceArchiver
+from .SourceCache import SourceCache
+from .SubprocessRunner import SubprocessRunner
 from .Utility import Utility
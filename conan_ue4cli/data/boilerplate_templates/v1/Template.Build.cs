@@ -6,6 +6,9 @@ using System;
 using System.IO;
 using UnrealBuildTool;
 using System.Diagnostics;
+using System.Security.Cryptography;
+using System.Text;
+using System.Collections.Generic;
 
 //For Tools.DotNETCommon.JsonObject and Tools.DotNETCommon.FileReference
 using Tools.DotNETCommon;
@@ -80,6 +83,98 @@ public class ${MODULE} : ModuleRules
 		}
 	}
 	
+	//Resolves the path to the Conan profile file with the specified name
+	private string ProfileFile(string profile)
+	{
+		string conanHome = Environment.GetEnvironmentVariable("CONAN_USER_HOME");
+		if (conanHome == null || conanHome.Length == 0) {
+			conanHome = Environment.GetFolderPath(Environment.SpecialFolder.UserProfile);
+		}
+		
+		return Path.Combine(conanHome, ".conan", "profiles", profile);
+	}
+	
+	//Computes a fingerprint of the inputs to `conan install` (our conanfile, the profile and any lockfile) along with its arguments
+	private string ComputeInstallFingerprint(string arguments, string profile)
+	{
+		string[] inputs = new string[]{
+			Path.Combine(ModuleDirectory, "conanfile.py"),
+			this.ProfileFile(profile),
+			Path.Combine(ModuleDirectory, "conan.lock")
+		};
+		
+		using (SHA256 sha = SHA256.Create())
+		{
+			StringBuilder fingerprint = new StringBuilder(arguments);
+			foreach (string input in inputs)
+			{
+				string digest = File.Exists(input) ? BitConverter.ToString(sha.ComputeHash(File.ReadAllBytes(input))) : "missing";
+				fingerprint.Append("\n" + input + "=" + digest);
+			}
+			
+			return BitConverter.ToString(sha.ComputeHash(Encoding.UTF8.GetBytes(fingerprint.ToString()))).Replace("-", "");
+		}
+	}
+	
+	//Installs our dependencies using Conan, unless the existing conanbuildinfo.json was generated from identical inputs
+	private void InstallDependencies(ReadOnlyTargetRules target, string engineVersion)
+	{
+		string profile = "ue" + engineVersion + "-" + this.TargetIdentifier(target);
+		string arguments = "install . -g=json --profile=" + profile;
+		string buildInfo = Path.Combine(ModuleDirectory, "conanbuildinfo.json");
+		string fingerprintFile = Path.Combine(ModuleDirectory, "conanbuildinfo.fingerprint");
+		
+		//Skip the install if none of the inputs have changed since the last successful install
+		if (File.Exists(buildInfo) && File.Exists(fingerprintFile) && File.ReadAllText(fingerprintFile).Trim() == this.ComputeInstallFingerprint(arguments, profile)) {
+			return;
+		}
+		
+		//Remove any existing fingerprint so that a failed or interrupted install is always retried
+		File.Delete(fingerprintFile);
+		Process process = Process.Start(new ProcessStartInfo
+		{
+			FileName = "conan",
+			Arguments = arguments,
+			WorkingDirectory = ModuleDirectory,
+			UseShellExecute = false
+		});
+		process.WaitForExit();
+		
+		//Record the fingerprint once the install succeeds (computing it afterwards, since Conan may have updated the lockfile)
+		if (process.ExitCode == 0 && File.Exists(buildInfo)) {
+			File.WriteAllText(fingerprintFile, this.ComputeInstallFingerprint(arguments, profile));
+		}
+	}
+	
+	//Lists the files in the lib, bin and data subdirectories of a precomputed data directory, using the manifest written by `ue4 conan precompute`
+	//(Precomputed data generated by older versions of conan-ue4cli has no manifest, so in that case we fall back to scanning the directories)
+	private Dictionary<string, string[]> ListPrecomputedFiles(string targetDir)
+	{
+		string manifestFile = Path.Combine(targetDir, "manifest.json");
+		JsonObject manifest = (File.Exists(manifestFile)) ? JsonObject.Read(new FileReference(manifestFile)) : null;
+		
+		Dictionary<string, string[]> files = new Dictionary<string, string[]>();
+		foreach (string dir in new string[]{ "lib", "bin", "data" })
+		{
+			if (manifest != null) {
+				files[dir] = Array.ConvertAll(manifest.GetStringArrayField(dir), file => Path.Combine(targetDir, file));
+			}
+			else
+			{
+				string dirPath = Path.Combine(targetDir, dir);
+				SearchOption option = ((dir == "data") ? SearchOption.AllDirectories : SearchOption.TopDirectoryOnly);
+				files[dir] = ((Directory.Exists(dirPath)) ? Directory.GetFiles(dirPath, "*", option) : new string[0]);
+			}
+		}
+		
+		return files;
+	}
+	
+	//Filters a list of files to include only those with one of the specified file extensions
+	private string[] FilterByExtension(string[] files, params string[] extensions) {
+		return Array.FindAll(files, file => Array.Exists(extensions, extension => file.EndsWith(extension)));
+	}
+	
 	//Determines if we have precomputed dependency data for the specified target and Engine version, and processes it if we do
 	private bool ProcessPrecomputedData(ReadOnlyTargetRules target, string engineVersion, string stagingDir)
 	{
@@ -95,12 +190,15 @@ public class ${MODULE} : ModuleRules
 			return false;
 		}
 		
+		//Retrieve the lists of files in the lib, bin and data directories
+		Dictionary<string, string[]> precomputed = this.ListPrecomputedFiles(targetDir);
+		
 		//Add the precomputed include directory to our search paths
 		PublicIncludePaths.Add(includeDir);
 		
 		//Link against all static library files in the lib directory
 		string libExtension = ((this.IsWindows(target)) ? ".lib" : ".a");
-		string[] libs = Directory.GetFiles(libDir, "*" + libExtension);
+		string[] libs = this.FilterByExtension(precomputed["lib"], libExtension);
 		foreach(string lib in libs) {
 			PublicAdditionalLibraries.Add(lib);
 		}
@@ -123,8 +221,7 @@ public class ${MODULE} : ModuleRules
 		}
 		
 		//Copy any data files needed by the package into our staging directory
-		string[] files = Directory.GetFiles(dataDir, "*", SearchOption.AllDirectories);
-		foreach(string file in files) {
+		foreach(string file in precomputed["data"]) {
 			RuntimeDependencies.Add(Path.Combine(stagingDir, Path.GetFileName(file)), file, StagedFileType.NonUFS);
 		}
 		
@@ -145,15 +242,8 @@ public class ${MODULE} : ModuleRules
 		string engineVersion = this.GetEngineVersion();
 		if (this.ProcessPrecomputedData(Target, engineVersion, stagingDir) == false)
 		{
-			//No precomputed data detected, install third-party dependencies using Conan
-			Process.Start(new ProcessStartInfo
-			{
-				FileName = "conan",
-				Arguments = "install . -g=json --profile=ue" + engineVersion + "-" + this.TargetIdentifier(Target),
-				WorkingDirectory = ModuleDirectory,
-				UseShellExecute = false
-			})
-			.WaitForExit();
+			//No precomputed data detected, install third-party dependencies using Conan (if they have changed since the last install)
+			this.InstallDependencies(Target, engineVersion);
 			
 			//Link against our Conan-installed dependencies
 			this.ProcessDependencies(Path.Combine(ModuleDirectory, "conanbuildinfo.json"), Target, stagingDir);
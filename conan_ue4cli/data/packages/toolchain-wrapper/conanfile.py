@@ -1,5 +1,6 @@
 from conans import ConanFile
-import glob, os, tempfile
+import glob, json, os, re, shutil, subprocess, tempfile
+from fnmatch import fnmatch
 from os.path import dirname, join
 
 class ToolchainWrapper(ConanFile):
@@ -11,7 +12,27 @@ class ToolchainWrapper(ConanFile):
     homepage = "https://llvm.org/"
     license = "Apache-2.0"
     settings = "os", "compiler", "arch"
-    exports = "*.py"
+    exports = "*.py", "manifest.json"
+    
+    # Linker settings that can be configured at the profile level (e.g. `toolchain-wrapper:gc_sections=True` in the [options] section)
+    # (These only affect how the wrappers invoke the toolchain, not the packaged files, so they don't affect the package ID)
+    # Note that `link_threads` requires lld 11 or newer, since older versions of lld only accept the boolean `--threads` flag
+    options = {
+        "link_threads": [None, "ANY"],
+        "thinlto_cache_dir": [None, "ANY"],
+        "thinlto_cache_policy": [None, "ANY"],
+        "gc_sections": [True, False],
+        "gdb_index": [True, False],
+        "split_dwarf": [True, False]
+    }
+    default_options = {
+        "link_threads": None,
+        "thinlto_cache_dir": None,
+        "thinlto_cache_policy": None,
+        "gc_sections": False,
+        "gdb_index": False,
+        "split_dwarf": False
+    }
     
     def _find_clang(self, root, architecture):
         '''
@@ -68,21 +89,194 @@ class ToolchainWrapper(ConanFile):
         # Locate the libc++ library files for the target architecture
         libraries = dirname(self._find_libcxx(libcxx, architecture))
         
-        # Copy the toolchain files into our package
-        print('Copying toolchain files from "{}"...'.format(toolchain))
-        self.copy("*", src=toolchain)
-        
-        # Copy the libc++ header files into our package
+        # Determine if we are copying only the files listed in our manifest rather than the entire toolchain
         headers = join(libcxx, 'include')
-        print('Copying libc++ header files from "{}"...'.format(headers))
-        self.copy("*", dst="libc++/include", src=headers)
+        if os.environ.get("WRAPPED_TOOLCHAIN_PRUNE", "") == "1":
+            manifest = self._load_manifest(architecture)
+            
+            # Copy only the parts of the toolchain, libc++ headers and libc++ libraries that the wrappers actually use
+            print('Copying pruned toolchain files from "{}"...'.format(toolchain))
+            self._copy_pruned(toolchain, self.package_folder, manifest["toolchain"])
+            print('Copying pruned libc++ header files from "{}"...'.format(headers))
+            self._copy_pruned(headers, join(self.package_folder, "libc++", "include"), manifest["libcxx_include"])
+            print('Copying pruned libc++ library files from "{}"...'.format(libraries))
+            self._copy_pruned(libraries, join(self.package_folder, "libc++", "lib"), manifest["libcxx_lib"])
         
-        # Copy the libc++ library files into our package
-        print('Copying libc++ library files from "{}"...'.format(libraries))
-        self.copy("*", dst="libc++/lib", src=libraries)
+        else:
+            
+            # Copy the toolchain files into our package
+            print('Copying toolchain files from "{}"...'.format(toolchain))
+            self.copy("*", src=toolchain)
+            
+            # Copy the libc++ header files into our package
+            print('Copying libc++ header files from "{}"...'.format(headers))
+            self.copy("*", dst="libc++/include", src=headers)
+            
+            # Copy the libc++ library files into our package
+            print('Copying libc++ library files from "{}"...'.format(libraries))
+            self.copy("*", dst="libc++/lib", src=libraries)
         
         # Copy our compiler wrapper scripts into the package
         self.copy("*")
+        
+        # Precompute the flags that our wrapper scripts add to each compiler and linker invocation
+        self._write_flags(join(self.package_folder, "wrappers", "flags.json"))
+        
+        # Record the version of lld in the toolchain, so we can reject linker settings that it doesn't support
+        with open(join(self.package_folder, "toolchain.json"), "w") as f:
+            json.dump({"lld_version": self._lld_version()}, f, indent=4)
+        
+        # If requested, verify that the packaged toolchain contains everything the wrappers need
+        if os.environ.get("WRAPPED_TOOLCHAIN_VERIFY", "") == "1":
+            self._verify(self._load_manifest(architecture))
+    
+    def _lld_version(self):
+        '''
+        Determines the major version of the packaged lld linker, or returns None if it cannot be determined
+        '''
+        linker = join(self.package_folder, "bin", "ld.lld")
+        if os.path.exists(linker):
+            proc = subprocess.run([linker, "--version"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            match = re.search(r"LLD ([0-9]+)\.", proc.stdout.decode("utf-8", errors="replace"))
+            if match is not None:
+                return int(match.group(1))
+        print("Warning: could not determine the version of lld in the packaged toolchain")
+        return None
+    
+    def _load_manifest(self, architecture):
+        '''
+        Loads the manifest of toolchain files that the wrappers use, filling in the target architecture
+        '''
+        with open(join(self.build_folder, "manifest.json"), "r") as f:
+            return json.loads(f.read().replace("{arch}", str(architecture)))
+    
+    def _copy_pruned(self, source, dest, rules):
+        '''
+        Copies the files under the source directory that match the manifest rules, preserving symlinks
+        '''
+        matches = lambda path, patterns: any([fnmatch(path, pattern) for pattern in patterns])
+        
+        # Determine the literal prefix of each include pattern, so we can avoid walking directories that cannot contain matches
+        prefixes = [re.split(r"[\*\?\[]", pattern, 1)[0] for pattern in rules["include"]]
+        candidate = lambda directory: any([prefix.startswith(directory + "/") or (directory + "/").startswith(prefix) for prefix in prefixes])
+        
+        copied = 0
+        skipped = 0
+        for dirpath, dirnames, filenames in os.walk(source):
+            relative = os.path.relpath(dirpath, source).replace(os.sep, "/")
+            relative = "" if relative == "." else relative + "/"
+            
+            # Treat symlinks to directories as files, and skip directories that are excluded or cannot contain matches
+            entries = list(filenames) + [d for d in dirnames if os.path.islink(join(dirpath, d))]
+            dirnames[:] = [
+                d for d in dirnames
+                if not os.path.islink(join(dirpath, d)) and candidate(relative + d) and not matches(relative + d + "/", rules["exclude"])
+            ]
+            
+            for entry in entries:
+                path = join(dirpath, entry)
+                if matches(relative + entry, rules["include"]) and not matches(relative + entry, rules["exclude"]):
+                    target = join(dest, relative, entry)
+                    os.makedirs(dirname(target), exist_ok=True)
+                    if os.path.islink(path):
+                        os.symlink(os.readlink(path), target)
+                    else:
+                        shutil.copy2(path, target)
+                        copied += os.path.getsize(path)
+                elif not os.path.islink(path):
+                    skipped += os.path.getsize(path)
+        
+        print("Copied {:.1f} MiB, skipped at least {:.1f} MiB".format(copied / (1024 ** 2), skipped / (1024 ** 2)))
+    
+    def _verify(self, manifest):
+        '''
+        Verifies that the package contains every file listed as required in the manifest,
+        and that the wrappers can compile and link a simple C++ program using only the packaged files
+        '''
+        print("Verifying the packaged toolchain...")
+        missing = [pattern for pattern in manifest["required"] if len(glob.glob(join(self.package_folder, pattern))) == 0]
+        if len(missing) > 0:
+            raise RuntimeError("the packaged toolchain is missing required files: {}".format(", ".join(missing)))
+        
+        # Build a test program using the wrappers, with the same environment that package_info() provides to consumers
+        environment = dict(os.environ)
+        environment.update({
+            "WRAPPED_CC": join(self.package_folder, "bin", "clang"),
+            "WRAPPED_CXX": join(self.package_folder, "bin", "clang++"),
+            "WRAPPED_LIBCXX": join(self.package_folder, "libc++"),
+            "WRAPPED_SYSROOT": self.package_folder
+        })
+        with tempfile.TemporaryDirectory() as tempDir:
+            source = join(tempDir, "verify.cpp")
+            with open(source, "w") as f:
+                f.write("#include <iostream>\n#include <vector>\nint main() { std::vector<int> v{1}; std::cout << v.size() << std::endl; return 0; }\n")
+            command = ["python3", join(self.package_folder, "wrappers", "clang++.py"), source, "-o", join(tempDir, "verify"), "-lpthread", "---link"]
+            proc = subprocess.run(command, env=environment, cwd=tempDir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            if proc.returncode != 0:
+                raise RuntimeError("the packaged toolchain failed to build a test program:\n{}".format(proc.stdout.decode("utf-8", errors="replace")))
+        print("The packaged toolchain was verified successfully.")
+    
+    def _write_flags(self, flags_file):
+        '''
+        Writes the flags that our compiler wrapper scripts add to each invocation, so the wrappers don't need to compute them
+        (Paths are expressed in terms of the sysroot and libc++ directories, which the wrappers fill in from their environment)
+        '''
+        flags = {
+            
+            # Common compiler flags
+            "compile": [
+                "-Wno-unused-command-line-argument",
+                "--sysroot={sysroot}",
+                "-B{sysroot}/usr/lib",
+                "-B{sysroot}/usr/lib64",
+                "-fPIC"
+            ],
+            
+            # C++-specific compiler flags
+            "compile_cxx": [
+                "-I{libcxx}/include",
+                "-I{libcxx}/include/c++/v1",
+                "-nostdinc++"
+            ],
+            
+            # Common linker flags
+            "link": [
+                "-L{sysroot}/usr/lib",
+                "-L{sysroot}/usr/lib64",
+                "-fuse-ld=lld",
+                "-nodefaultlibs",
+                "-lm",
+                "-lc",
+                "-lgcc_s",
+                "-lgcc"
+            ],
+            
+            # C++-specific linker flags
+            "link_cxx": [
+                "{libcxx}/lib/libc++.a",
+                "{libcxx}/lib/libc++abi.a"
+            ]
+        }
+        
+        with open(flags_file, "w") as f:
+            json.dump(flags, f, indent=4)
+    
+    def _load_toolchain_info(self):
+        '''
+        Loads the details of the packaged toolchain that were recorded when the package was created
+        (Packages created before these details were recorded have no toolchain info file, so we return an empty dictionary)
+        '''
+        info_file = join(self.package_folder, "toolchain.json")
+        if not os.path.exists(info_file):
+            return {}
+        with open(info_file, "r") as f:
+            return json.load(f)
+    
+    def package_id(self):
+        
+        # Our options only control the flags that our wrappers pass at build time, so all values share the same package
+        for option in self.default_options:
+            delattr(self.info.options, option)
     
     def package_info(self):
         
@@ -95,5 +289,23 @@ class ToolchainWrapper(ConanFile):
         self.env_info.WRAPPED_SYSROOT = self.package_folder
         self.env_info.LDFLAGS = "---link"
         
+        # Expose our linker settings to the wrappers, which translate them into compiler and linker flags
+        # (lld only accepts a thread count from version 11 onwards, and older versions would fail every link with `--threads=N`)
+        if str(self.options.link_threads) != "None":
+            lld_version = self._load_toolchain_info().get("lld_version", None)
+            if lld_version is not None and lld_version < 11:
+                raise RuntimeError("the link_threads option requires lld 11 or newer, but the packaged toolchain uses lld {}!".format(lld_version))
+            self.env_info.WRAPPER_LINK_THREADS = str(self.options.link_threads)
+        if str(self.options.thinlto_cache_dir) != "None":
+            self.env_info.WRAPPER_THINLTO_CACHE_DIR = os.path.expanduser(str(self.options.thinlto_cache_dir))
+        if str(self.options.thinlto_cache_policy) != "None":
+            self.env_info.WRAPPER_THINLTO_CACHE_POLICY = str(self.options.thinlto_cache_policy)
+        if self.options.gc_sections == True:
+            self.env_info.WRAPPER_GC_SECTIONS = "1"
+        if self.options.gdb_index == True:
+            self.env_info.WRAPPER_GDB_INDEX = "1"
+        if self.options.split_dwarf == True:
+            self.env_info.WRAPPER_SPLIT_DWARF = "1"
+        
         # Ensure our compiler wrapper scripts are executable
         self.run("chmod +x {}/wrappers/clang.py {}/wrappers/clang++.py".format(self.package_folder, self.package_folder))
@@ -1,12 +1,138 @@
-import os, subprocess, sys
+import json, os, sys, time
+from contextlib import contextmanager
+from os.path import abspath, basename, dirname, join
 
-def _run(command, verbose):
+# The file containing the flags we add to compiler and linker invocations, which is generated when the package is created
+FLAGS_FILE = join(dirname(abspath(__file__)), "flags.json")
+
+# The maximum depth of nested response files that we expand
+MAX_RESPONSE_FILE_DEPTH = 16
+
+def _load_flags(cxx, sysroot, libcxx):
+    
+    # Read the precomputed flag lists and fill in the sysroot and libc++ paths from our environment
+    with open(FLAGS_FILE, "r") as f:
+        flags = json.load(f)
+    fill = lambda values: [value.format(sysroot=sysroot, libcxx=libcxx) for value in values]
+    compile_flags = fill(flags["compile"] + (flags["compile_cxx"] if cxx == True else []))
+    link_flags = fill(flags["link"] + (flags["link_cxx"] if cxx == True else []))
+    return compile_flags, link_flags
+
+def _fast_link_flags(args):
+    
+    # Translate the linker settings from the toolchain-wrapper package options into compiler and linker flags
+    # (Debug-related flags are only added when the invocation is actually generating debug information)
+    debug = any([arg.startswith("-g") and arg != "-g0" and arg.startswith("-gcc") == False for arg in args])
+    compile_flags = []
+    link_flags = []
+    if len(os.environ.get("WRAPPER_LINK_THREADS", "")) > 0:
+        link_flags.append("-Wl,--threads={}".format(os.environ["WRAPPER_LINK_THREADS"]))
+    if len(os.environ.get("WRAPPER_THINLTO_CACHE_DIR", "")) > 0:
+        link_flags.append("-Wl,--thinlto-cache-dir={}".format(os.environ["WRAPPER_THINLTO_CACHE_DIR"]))
+        if len(os.environ.get("WRAPPER_THINLTO_CACHE_POLICY", "")) > 0:
+            link_flags.append("-Wl,--thinlto-cache-policy,{}".format(os.environ["WRAPPER_THINLTO_CACHE_POLICY"]))
+    if os.environ.get("WRAPPER_GC_SECTIONS", "") == "1":
+        compile_flags.extend(["-ffunction-sections", "-fdata-sections"])
+        link_flags.append("-Wl,--gc-sections")
+    if os.environ.get("WRAPPER_GDB_INDEX", "") == "1":
+        compile_flags.extend(["-ggnu-pubnames"] if debug == True else [])
+        link_flags.append("-Wl,--gdb-index")
+    if os.environ.get("WRAPPER_SPLIT_DWARF", "") == "1" and debug == True:
+        compile_flags.append("-gsplit-dwarf")
+    return compile_flags, link_flags
+
+def _tokenize(contents):
+    
+    # Split the contents of a response file into arguments using the same GNU-style quoting rules as clang
+    # (Arguments are separated by whitespace, quotes group characters into a single argument and backslashes escape the next character)
+    if "\"" not in contents and "'" not in contents and "\\" not in contents:
+        return contents.split()
+    tokens = []
+    token = None
+    quote = None
+    chars = iter(contents)
+    for char in chars:
+        if char == "\\":
+            token = (token or "") + next(chars, "")
+        elif quote is not None:
+            if char == quote:
+                quote = None
+            else:
+                token += char
+        elif char in "\"'":
+            quote = char
+            token = token or ""
+        elif char.isspace():
+            if token is not None:
+                tokens.append(token)
+            token = None
+        else:
+            token = (token or "") + char
+    if token is not None:
+        tokens.append(token)
+    return tokens
+
+def _expand_response_files(args, depth=0):
+    
+    # Replace any `@file` arguments with the arguments contained in the response file, recursively expanding nested response files
+    # (As with clang, arguments referring to files that do not exist are passed through verbatim)
+    expanded = []
+    found = False
+    for arg in args:
+        if arg.startswith("@") and depth < MAX_RESPONSE_FILE_DEPTH and os.path.isfile(arg[1:]):
+            with open(arg[1:], "r", encoding="utf-8", errors="surrogateescape") as f:
+                nested, _ = _expand_response_files(_tokenize(f.read()), depth + 1)
+            expanded.extend(nested)
+            found = True
+        else:
+            expanded.append(arg)
+    return expanded, found
+
+@contextmanager
+def _prepare(command, response):
+    
+    # If we were passed any response files then write the arguments to a new response file so long command lines
+    # don't exceed the operating system's limit, and yield the command that refers to it (removing it once we're done)
+    if response == False:
+        yield command
+        return
+    
+    import tempfile
+    fd, filename = tempfile.mkstemp(suffix=".rsp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", errors="surrogateescape") as f:
+            f.write("\n".join(['"{}"'.format(arg.replace("\\", "\\\\").replace('"', '\\"')) for arg in command[1:]]))
+        yield [command[0], "@" + filename]
+    finally:
+        os.unlink(filename)
+
+def _run(command, response, verbose):
+    import subprocess
+    
+    # Run the real compiler as a child process, for when we need to do something after it completes
+    # (such as removing a temporary response file or recording telemetry)
     if verbose == True:
-        print(command, file=sys.stderr)
-    return subprocess.call(command)
+        print(command, file=sys.stderr, flush=True)
+    with _prepare(command, response) as prepared:
+        return subprocess.call(prepared)
+
+def _exec(command, verbose):
+    if verbose == True:
+        print(command, file=sys.stderr, flush=True)
+    
+    # Replace the current process with the real compiler, so no Python interpreter remains resident for the duration of the compile
+    sys.stdout.flush()
+    try:
+        os.execv(command[0], command)
+    except OSError as err:
+        print("Error: failed to run {}: {}".format(command[0], err), file=sys.stderr)
+        sys.exit(1)
 
 def interpose(cxx):
     
+    # Record our start time for telemetry purposes
+    started = time.time()
+    
     # Retrieve our libc++ and sysroot directories from our environment variables
     libcxx = os.environ["WRAPPED_LIBCXX"]
     sysroot = os.environ["WRAPPED_SYSROOT"]
@@ -14,60 +140,40 @@ def interpose(cxx):
     # Determine if verbose output is enabled (useful when debugging the wrappers themselves)
     verbose = os.environ.get("VERBOSE_WRAPPER", "").lower() in ["1", "true"]
     
-    # Filter out any `-stdlib=<LIB>` flags from the supplied command-line arguments
-    args = list([arg for arg in sys.argv[1:] if arg.startswith("-stdlib=") == False])
-    
-    # Apply common compiler flags
-    args.extend([
-        "-Wno-unused-command-line-argument",
-        "--sysroot={}".format(sysroot),
-        "-B{}/usr/lib".format(sysroot),
-        "-B{}/usr/lib64".format(sysroot),
-        "-fPIC"
-    ])
-    
-    # Apply C++-specific compiler flags
-    if cxx == True:
-        args.extend([
-            "-I{}/include".format(libcxx),
-            "-I{}/include/c++/v1".format(libcxx),
-            "-nostdinc++"
-        ])
+    # Expand the contents of any response files, so our flag filtering also applies to the arguments they contain
+    argv, response = _expand_response_files(sys.argv[1:])
+    
+    # Determine if this is a link invocation, as indicated by the presence of our linker sentinel flag
+    link = "---link" in argv
+    
+    # Filter out any `-stdlib=<LIB>` flags and our linker sentinel flag from the supplied command-line arguments in a single pass
+    # (Some versions of some build systems (such as autotools) may erroneously prefix fully-qualified library file paths with `-l`,
+    # so for link invocations we also collect these so the prefixes can be removed to ensure the correct linker behaviour)
+    args = []
+    prefixed = []
+    for arg in argv:
+        if arg == "---link" or arg.startswith("-stdlib="):
+            continue
+        elif link == True and arg.startswith("-l") and "." in basename(arg):
+            prefixed.append(arg[2:])
+        else:
+            args.append(arg)
+    
+    # Apply our compiler flags, along with any flags for the linker settings configured in the profile
+    compile_flags, link_flags = _load_flags(cxx, sysroot, libcxx)
+    fast_compile_flags, fast_link_flags = _fast_link_flags(args)
+    args.extend(compile_flags + fast_compile_flags)
     
     # Apply verbose compiler flags (if requested)
     if verbose == True:
         args.extend(["-v"])
     
     # If this is a link invocation, append our custom linker flags
-    if "---link" in args:
-        
-        # Filter out our linker sentinel flag
-        args = list([arg for arg in args if arg != "---link"])
+    if link == True:
         
-        # Some versions of some build systems (such as autotools) may erroneously prefix fully-qualified library
-        # file paths with `-l`, so these prefixes need to be removed to ensure the correct linker behaviour
-        prefixed = [arg for arg in args if arg.startswith("-l") and "." in os.path.basename(arg)]
-        args = list([arg for arg in args if arg not in prefixed])
-        args.extend([lib[2:] for lib in prefixed])
-        
-        # Apply common linker flags
-        args.extend([
-            "-L{}/usr/lib".format(sysroot),
-            "-L{}/usr/lib64".format(sysroot),
-            "-fuse-ld=lld",
-            "-nodefaultlibs",
-            "-lm",
-            "-lc",
-            "-lgcc_s",
-            "-lgcc"
-        ])
-        
-        # Apply C++-specific linker flags
-        if cxx == True:
-            args.extend([
-                "{}/lib/libc++.a".format(libcxx),
-                "{}/lib/libc++abi.a".format(libcxx)
-            ])
+        # Pass fully-qualified library file paths with their erroneous `-l` prefixes removed
+        args.extend(prefixed)
+        args.extend(link_flags + fast_link_flags)
         
         # Apply verbose linker flags (if requested)
         if verbose == True:
@@ -76,6 +182,25 @@ def interpose(cxx):
                 "-Wl,--trace"
             ])
     
-    # Forward all arguments to the real clang executable
+    # If the compile cache is enabled then attempt to retrieve the object file for compile-only invocations from the cache
     clang = os.environ["WRAPPED_CXX"] if cxx == True else os.environ["WRAPPED_CC"]
-    sys.exit(_run([clang] + args, verbose))
+    returncode = None
+    if len(os.environ.get("WRAPPER_CACHE_DIR", "")) > 0 and link == False:
+        from CompileCache import CompileCache
+        returncode = CompileCache(os.environ["WRAPPER_CACHE_DIR"], sysroot, libcxx, verbose).compile([clang] + args, lambda command: _prepare(command, response))
+    
+    # Forward all arguments to the real clang executable, running it as a child process if we were passed any response files
+    # or are recording telemetry, and otherwise replacing the current process with it
+    telemetry = os.environ.get("WRAPPER_TELEMETRY_DIR", "")
+    if returncode is None:
+        if response == True or len(telemetry) > 0:
+            returncode = _run([clang] + args, response, verbose)
+        else:
+            _exec([clang] + args, verbose)
+    
+    # Record the resources consumed by this invocation, if telemetry is enabled
+    if len(telemetry) > 0:
+        from Telemetry import record
+        record(telemetry, started, args, link, returncode)
+    
+    sys.exit(returncode)
@@ -0,0 +1,356 @@
+import fcntl, hashlib, json, os, re, subprocess, sys
+from os.path import basename, dirname, exists, isabs, join, relpath, splitext
+
+# The compile cache is controlled by the following environment variables:
+#
+# - WRAPPER_CACHE_DIR: the directory that stores cached object files (the cache is disabled if this is not set)
+# - WRAPPER_CACHE_SIZE: the maximum size of the cache, with an optional K/M/G/T suffix such as 512M or 5GiB (defaults to 5G)
+# - WRAPPER_CACHE_BASEDIR: absolute paths under this directory are treated as relative to the working directory when
+#   computing cache keys, so the same sources built in different Conan build folders can share cache entries
+# - WRAPPER_CACHE_STATS: a JSON file that accumulates hit/miss statistics across all compiler invocations
+
+# The default maximum size of the cache, in bytes
+DEFAULT_MAX_SIZE = 5 * 1024 * 1024 * 1024
+
+# When the cache exceeds its maximum size, we evict entries until it is within this fraction of the maximum
+EVICTION_TARGET = 0.9
+
+# The version of the cache key format, which is bumped whenever the way we compute keys changes
+KEY_VERSION = 2
+
+# The file extensions that identify source files
+SOURCE_EXTENSIONS = [".c", ".cc", ".cp", ".cpp", ".cxx", ".c++", ".C", ".CC", ".CPP", ".m", ".mm", ".S"]
+
+# Flags whose outputs we can't cache, or which mean the invocation doesn't produce an object file
+UNCACHEABLE_FLAGS = ["-E", "-S", "-M", "-MM", "-MJ", "-gsplit-dwarf", "--coverage", "-ftest-coverage", "-fsyntax-only", "-"]
+UNCACHEABLE_PREFIXES = ["-save-temps", "-ftime-trace", "-fprofile-generate"]
+
+# Flags that take a value as a separate argument
+VALUE_FLAGS = [
+    "-o", "-MF", "-MT", "-MQ", "-D", "-U", "-I", "-include", "-imacros", "-iquote", "-isystem", "-idirafter",
+    "-isysroot", "-iprefix", "-iwithprefix", "-x", "-arch", "-target", "-Xclang", "-Xassembler", "-Xpreprocessor"
+]
+
+# Dependency file flags whose values don't affect the generated object file
+DEPENDENCY_FLAGS = ["-MF", "-MT", "-MQ"]
+
+# The multipliers for the size suffixes that we accept when parsing the maximum cache size
+SIZE_SUFFIXES = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+# The preprocessor line markers that record the file each line of preprocessed source came from
+LINE_MARKER = re.compile(rb'^(#(?:line)? [0-9]+ ")((?:[^"\\]|\\.)*)(".*)$', re.DOTALL)
+
+def _parse_size(size):
+    '''
+    Parses a size such as "512M", "5G" or "5GiB" into a number of bytes, returning None if the size is invalid
+    '''
+    match = re.match(r"^([0-9]+(\.[0-9]+)?)\s*([KMGT]?)(I?B)?$", size.strip().upper())
+    return int(float(match.group(1)) * SIZE_SUFFIXES[match.group(3)]) if match is not None else None
+
+def _joined_dependency_flag(arg):
+    '''
+    Returns the dependency file flag for an argument that specifies one with its value joined (e.g. `-MFfile.d` or `-MF=file.d`), or None
+    '''
+    return arg[:3] if arg[:3] in DEPENDENCY_FLAGS and len(arg) > 3 else None
+
+class CompileCache(object):
+    '''
+    A size-bounded cache of object files for compile-only invocations, keyed on the preprocessed source,
+    the compiler arguments and the identity of the compiler itself
+    '''
+    
+    def __init__(self, cache_dir, sysroot, libcxx, verbose):
+        self.cache_dir = cache_dir
+        self.max_size = DEFAULT_MAX_SIZE
+        if len(os.environ.get("WRAPPER_CACHE_SIZE", "")) > 0:
+            
+            # An invalid size shouldn't break every compile, so we warn and fall back to the default
+            parsed = _parse_size(os.environ["WRAPPER_CACHE_SIZE"])
+            if parsed is None:
+                print("Warning: ignoring invalid WRAPPER_CACHE_SIZE value \"{}\"".format(os.environ["WRAPPER_CACHE_SIZE"]), file=sys.stderr, flush=True)
+            else:
+                self.max_size = parsed
+        self.base_dir = os.environ.get("WRAPPER_CACHE_BASEDIR", "")
+        self.stats_file = os.environ.get("WRAPPER_CACHE_STATS", "")
+        self.sysroot = sysroot
+        self.libcxx = libcxx
+        self.verbose = verbose
+    
+    def compile(self, command, prepare):
+        '''
+        Compiles using the cache, returning the compiler's exit code, or None if the invocation can't be cached.
+        The `prepare` argument is a function that returns a context manager yielding the command to actually run
+        (which allows the caller to move long argument lists into a response file).
+        '''
+        
+        # Determine if the invocation is cacheable and identify its output file
+        details = self._parse(command[1:])
+        if details is None:
+            self._record("uncacheable")
+            return None
+        output, dependencies = details
+        
+        # Preprocess the source file and compute the cache key
+        key = self._key(command, output, dependencies, prepare)
+        if key is None:
+            self._record("uncacheable")
+            return None
+        
+        # If the object file is cached then copy it to the output location and replay any diagnostics
+        entry = join(self.cache_dir, key[:2], key)
+        if exists(entry + ".o"):
+            try:
+                self._copy(entry + ".o", output)
+                os.utime(entry + ".o")
+                if exists(entry + ".stderr"):
+                    with open(entry + ".stderr", "rb") as f:
+                        sys.stderr.buffer.write(f.read())
+                        sys.stderr.flush()
+                if self.verbose == True:
+                    print("Compile cache hit: {}".format(output), file=sys.stderr, flush=True)
+                self._record("hits")
+                return 0
+            except OSError:
+                
+                # The entry may have been evicted by a concurrent invocation, so treat this as a miss
+                pass
+        
+        # Run the compiler, capturing its diagnostics so they can be replayed for future cache hits
+        with prepare(command) as prepared:
+            proc = subprocess.run(prepared, stderr=subprocess.PIPE)
+        sys.stderr.buffer.write(proc.stderr)
+        sys.stderr.flush()
+        self._record("misses")
+        
+        # Store the object file in the cache if compilation succeeded
+        if proc.returncode == 0 and exists(output):
+            try:
+                self._store(entry, output, proc.stderr)
+            except OSError as err:
+                print("Warning: failed to store object file in the compile cache: {}".format(err), file=sys.stderr, flush=True)
+        
+        return proc.returncode
+    
+    def _parse(self, args):
+        '''
+        Determines whether an invocation is cacheable, returning its output file and the arguments needed to ensure
+        dependency files are generated when preprocessing, or None if the invocation is not cacheable
+        '''
+        if "-c" not in args:
+            return None
+        
+        output = None
+        sources = []
+        dependency_flags = {}
+        iterator = iter(args)
+        for arg in iterator:
+            if arg in UNCACHEABLE_FLAGS or any([arg.startswith(prefix) for prefix in UNCACHEABLE_PREFIXES]):
+                return None
+            elif arg in VALUE_FLAGS:
+                value = next(iterator, None)
+                if arg == "-o":
+                    output = value
+                elif arg in DEPENDENCY_FLAGS:
+                    dependency_flags[arg] = value
+            elif arg.startswith("-o"):
+                output = arg[2:]
+            elif _joined_dependency_flag(arg) is not None:
+                dependency_flags[_joined_dependency_flag(arg)] = arg[3:].lstrip("=")
+            elif arg.startswith("-") == False and splitext(arg)[1] in SOURCE_EXTENSIONS:
+                sources.append(arg)
+        
+        # We only cache invocations that compile a single source file to an explicitly-specified object file
+        if output is None or len(sources) != 1:
+            return None
+        
+        # If a dependency file is being generated then make sure preprocessing produces the same file that compilation would
+        # (Since we don't pass `-o` to the preprocessor, we need to specify the target and filename that it would otherwise derive)
+        dependencies = []
+        if "-MD" in args or "-MMD" in args:
+            if "-MT" not in dependency_flags and "-MQ" not in dependency_flags:
+                dependencies.extend(["-MT", output])
+            if "-MF" not in dependency_flags:
+                dependencies.extend(["-MF", splitext(output)[0] + ".d"])
+        
+        return output, dependencies
+    
+    def _key(self, command, output, dependencies, prepare):
+        '''
+        Computes the cache key for an invocation, or returns None if the source file could not be preprocessed
+        '''
+        key = hashlib.sha256()
+        cwd = os.getcwd()
+        
+        # Hash the identity of the compiler (copies of the same compiler in different packages will share cache entries)
+        details = os.stat(command[0])
+        key.update("{}\0{}\0{}\0{}\n".format(KEY_VERSION, basename(command[0]), details.st_size, details.st_mtime).encode("utf-8"))
+        
+        # Hash the arguments, excluding those that only affect output locations (in both their separate and joined forms) and normalising package and build paths
+        # (Debug information embeds the working directory, so we can only share entries across directories without it)
+        debug = any([arg.startswith("-g") and arg not in ["-g0", "-gno-split-dwarf"] for arg in command[1:]])
+        if debug == True:
+            key.update("{}\n".format(cwd).encode("utf-8"))
+        iterator = iter(command[1:])
+        for arg in iterator:
+            if arg == "-o" or arg in DEPENDENCY_FLAGS:
+                next(iterator, None)
+            elif arg.startswith("-o") == False and _joined_dependency_flag(arg) is None:
+                key.update("{}\n".format(self._normalise(arg, cwd)).encode("utf-8"))
+        
+        # Hash the preprocessed source including its line markers, since the line numbers they record end up in diagnostics and
+        # debug information (the paths in the markers are normalised in the same way as the paths in the arguments)
+        preprocess = [command[0]] + [arg for arg in self._strip_output(command[1:]) if arg != "-c"] + dependencies + ["-E"]
+        with prepare(preprocess) as prepared:
+            proc = subprocess.Popen(prepared, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            for line in proc.stdout:
+                key.update(self._normalise_marker(line, cwd) if line.startswith(b"#") else line)
+            proc.stdout.close()
+            if proc.wait() != 0:
+                return None
+        
+        return key.hexdigest()
+    
+    def _strip_output(self, args):
+        '''
+        Removes the `-o` flag and its value from a list of arguments
+        '''
+        stripped = []
+        iterator = iter(args)
+        for arg in iterator:
+            if arg == "-o":
+                next(iterator, None)
+            elif arg.startswith("-o") == False:
+                stripped.append(arg)
+        return stripped
+    
+    def _normalise(self, arg, cwd):
+        '''
+        Replaces the paths in an argument that vary between packages and build folders with placeholders
+        '''
+        if len(self.base_dir) > 0 and self.base_dir in arg:
+            
+            # Rewrite absolute paths under the base directory relative to the working directory (including those in flags such as `-I/path`)
+            start = arg.index(self.base_dir)
+            if isabs(arg[start:]):
+                arg = arg[:start] + relpath(arg[start:], cwd)
+        return arg.replace(self.libcxx, "{libcxx}").replace(self.sysroot, "{sysroot}")
+    
+    def _normalise_marker(self, line, cwd):
+        '''
+        Normalises the path in a preprocessor line marker, leaving any other line unmodified
+        '''
+        match = LINE_MARKER.match(line)
+        if match is None:
+            return line
+        path = self._normalise(match.group(2).decode("utf-8", "surrogateescape"), cwd)
+        return match.group(1) + path.encode("utf-8", "surrogateescape") + match.group(3)
+    
+    def _copy(self, source, dest):
+        '''
+        Copies a file into place atomically, so build systems never see a partially-written object file
+        '''
+        temp = "{}.tmp.{}".format(dest, os.getpid())
+        with open(source, "rb") as infile, open(temp, "wb") as outfile:
+            while True:
+                chunk = infile.read(1024 * 1024)
+                if len(chunk) == 0:
+                    break
+                outfile.write(chunk)
+        os.replace(temp, dest)
+    
+    def _store(self, entry, output, stderr):
+        '''
+        Adds an object file to the cache and evicts the least recently used entries if the cache has grown too large
+        '''
+        os.makedirs(dirname(entry), exist_ok=True)
+        if len(stderr) > 0:
+            with open(entry + ".stderr.tmp.{}".format(os.getpid()), "wb") as f:
+                f.write(stderr)
+            os.replace(entry + ".stderr.tmp.{}".format(os.getpid()), entry + ".stderr")
+        self._copy(output, entry + ".o")
+        
+        # Keep a running total of the cache size so we only need to scan the cache when it exceeds its maximum size
+        with self._lock():
+            total = self._read_size() + os.stat(entry + ".o").st_size + len(stderr)
+            if total > self.max_size:
+                total = self._evict()
+            self._write_size(total)
+    
+    def _evict(self):
+        '''
+        Removes the least recently used entries until the cache is within its eviction target, returning the new total size
+        '''
+        entries = []
+        for prefix in os.listdir(self.cache_dir):
+            directory = join(self.cache_dir, prefix)
+            if os.path.isdir(directory):
+                for filename in os.listdir(directory):
+                    if filename.endswith(".o"):
+                        path = join(directory, filename)
+                        details = os.stat(path)
+                        stderr = path[:-2] + ".stderr"
+                        size = details.st_size + (os.stat(stderr).st_size if exists(stderr) else 0)
+                        entries.append((details.st_mtime, size, path))
+        
+        total = sum([entry[1] for entry in entries])
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_size * EVICTION_TARGET:
+                break
+            for filename in [path, path[:-2] + ".stderr"]:
+                if exists(filename):
+                    os.unlink(filename)
+            total -= size
+            self._record("evictions")
+        
+        return total
+    
+    def _read_size(self):
+        size_file = join(self.cache_dir, "size")
+        if not exists(size_file):
+            return 0
+        with open(size_file, "r") as f:
+            return int(f.read().strip() or "0")
+    
+    def _write_size(self, size):
+        with open(join(self.cache_dir, "size"), "w") as f:
+            f.write(str(size))
+    
+    def _lock(self):
+        '''
+        Returns a context manager that holds an exclusive lock on the cache, since many compiles typically run in parallel
+        '''
+        return FileLock(join(self.cache_dir, "lock"))
+    
+    def _record(self, counter):
+        '''
+        Increments the specified counter in the statistics file, if statistics have been requested
+        '''
+        if len(self.stats_file) == 0:
+            return
+        with FileLock(self.stats_file + ".lock"):
+            stats = {"hits": 0, "misses": 0, "uncacheable": 0, "evictions": 0}
+            if exists(self.stats_file):
+                with open(self.stats_file, "r") as f:
+                    stats.update(json.load(f))
+            stats[counter] += 1
+            with open(self.stats_file + ".tmp", "w") as f:
+                json.dump(stats, f, indent=4, sort_keys=True)
+            os.replace(self.stats_file + ".tmp", self.stats_file)
+
+class FileLock(object):
+    '''
+    An exclusive advisory lock on a file, for coordinating between concurrent compiler invocations
+    '''
+    
+    def __init__(self, filename):
+        self.filename = filename
+    
+    def __enter__(self):
+        os.makedirs(dirname(os.path.abspath(self.filename)), exist_ok=True)
+        self._file = open(self.filename, "a")
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+    
+    def __exit__(self, *args):
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
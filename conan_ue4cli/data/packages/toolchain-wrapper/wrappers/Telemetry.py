@@ -0,0 +1,63 @@
+import json, os, re, resource, time
+from os.path import exists, getsize, join, splitext
+from CompileCache import SOURCE_EXTENSIONS, VALUE_FLAGS, FileLock
+
+# Telemetry is enabled by setting WRAPPER_TELEMETRY_DIR to the directory that will hold the per-package JSON-lines logs.
+# The package that is being built is identified from the layout of the Conan build directory, and can be overridden by
+# setting WRAPPER_TELEMETRY_PACKAGE. Use `ue4 conan telemetry` to summarise the recorded data.
+
+# Matches the package reference in the path of a Conan build directory (`data/NAME/VERSION/USER/CHANNEL/build/...`)
+BUILD_DIR_PATTERN = re.compile("/data/([^/]+)/([^/]+)/([^/]+)/([^/]+)/build/")
+
+def _package():
+    
+    # Determine the reference of the package being built, from either our environment or our working directory
+    override = os.environ.get("WRAPPER_TELEMETRY_PACKAGE", "")
+    if len(override) > 0:
+        return override
+    match = BUILD_DIR_PATTERN.search(os.getcwd() + "/")
+    return "{}/{}@{}/{}".format(*match.groups()) if match is not None else "unknown"
+
+def _inputs_and_output(args):
+    
+    # Identify the source files and output file of an invocation
+    sources = []
+    output = None
+    iterator = iter(args)
+    for arg in iterator:
+        if arg in VALUE_FLAGS:
+            value = next(iterator, None)
+            if arg == "-o":
+                output = value
+        elif arg.startswith("-o") and len(arg) > 2:
+            output = arg[2:]
+        elif arg.startswith("-") == False and splitext(arg)[1] in SOURCE_EXTENSIONS:
+            sources.append(arg)
+    return sources, output
+
+def record(directory, started, args, link, returncode):
+    
+    # Gather the resources consumed by the compiler (and any other child processes that we ran, such as the preprocessor)
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    sources, output = _inputs_and_output(args)
+    package = _package()
+    entry = {
+        "time": started,
+        "package": package,
+        "mode": "link" if link == True else ("compile" if "-c" in args else "other"),
+        "source": sources[0] if len(sources) == 1 else sources,
+        "output": os.path.abspath(output) if output is not None else None,
+        "output_size": getsize(output) if output is not None and exists(output) else None,
+        "wall": time.time() - started,
+        "user": usage.ru_utime,
+        "sys": usage.ru_stime,
+        "max_rss": usage.ru_maxrss * 1024,
+        "returncode": returncode,
+        "cwd": os.getcwd()
+    }
+    
+    # Append the entry to the log file for the package, holding a lock since many compiles typically run in parallel
+    logfile = join(directory, "{}.jsonl".format(package.replace("/", "-")))
+    with FileLock(logfile + ".lock"):
+        with open(logfile, "a") as f:
+            f.write(json.dumps(entry) + "\n")
@@ -1,14 +1,36 @@
-from ue4cli import UnrealManagerFactory, PrintingFormat
+from ue4cli import UnrealManagerFactory, PrintingFormat, ThirdPartyLibraryDetails
+from ue4cli.ConfigurationManager import ConfigurationManager
+import glob, hashlib, json, os, tempfile
+
+# The fields of the library details that we store in our on-disk cache
+DETAILS_FIELDS = ["prefixDirs", "includeDirs", "linkDirs", "libs", "systemLibs", "definitions", "cxxFlags", "ldFlags", "cmakeFlags"]
+
+# Setting this environment variable to 1 disables our on-disk cache and always queries UnrealBuildTool
+NO_CACHE_ENVVAR = "UE4LIB_NO_CACHE"
 
 class UE4Lib():
     
+    # The UnrealManager instance and engine root shared by all instances in the current process
+    _unreal = None
+    _engineRoot = None
+    
+    # The details for each library that we have already retrieved in the current process
+    _cache = {}
+    
     def __init__(self, libName):
         """
         Queries ue4cli to retrieve the details for the specified library
         """
-        self.unreal = UnrealManagerFactory.create()
-        self.engineRoot = self.unreal.getEngineRoot()
-        self.details = self.unreal.getThirdpartyLibs([libName], includePlatformDefaults = False)
+        if UE4Lib._unreal is None:
+            UE4Lib._unreal = UnrealManagerFactory.create()
+            UE4Lib._engineRoot = UE4Lib._unreal.getEngineRoot()
+        if libName not in UE4Lib._cache:
+            UE4Lib._cache[libName] = UE4Lib._retrieveDetails(libName)
+        
+        self.unreal = UE4Lib._unreal
+        self.engineRoot = UE4Lib._engineRoot
+        self.details = UE4Lib._cache[libName]
+        self._resolved = {}
     
     def __repr__(self):
         return repr(self.details)
@@ -17,52 +39,134 @@ class UE4Lib():
         """
         Returns the header include directories for this library
         """
-        return self.details.resolveRoot(self.details.includeDirs, self.engineRoot)
+        return self._resolve("includeDirs")
     
     def libdirs(self):
         """
         Returns the library linker directories for this library
         """
-        return self.details.resolveRoot(self.details.linkDirs, self.engineRoot)
+        return self._resolve("linkDirs")
     
     def libs(self):
         """
         Returns the list of library files for this library
         """
-        return self.details.resolveRoot(self.details.libs, self.engineRoot)
+        return self._resolve("libs")
     
     def systemlibs(self):
         """
         Returns the list of system library files for this library
         """
-        return self.details.systemLibs
+        return list(self.details.systemLibs)
     
     def defines(self):
         """
         Returns the preprocessor definitions for this library
         """
-        return self.details.resolveRoot(self.details.definitions, self.engineRoot)
+        return self._resolve("definitions")
     
     def cxxflags(self):
         """
         Returns the compiler flags for this library
         """
-        return self.details.resolveRoot(self.details.cxxFlags, self.engineRoot)
+        return self._resolve("cxxFlags")
     
     def ldflags(self):
         """
         Returns the linker flags for this library
         """
-        return self.details.resolveRoot(self.details.ldFlags, self.engineRoot)
+        return self._resolve("ldFlags")
     
     def combined_compiler_flags(self):
         """
         Returns the combined compiler flags (defines + includedirs + cxxflags) for this library as a single string
         """
-        return self.details.getCompilerFlags(self.engineRoot, PrintingFormat.singleLine())
+        if "compilerFlags" not in self._resolved:
+            self._resolved["compilerFlags"] = self.details.getCompilerFlags(self.engineRoot, PrintingFormat.singleLine())
+        return self._resolved["compilerFlags"]
     
     def combined_linker_flags(self):
         """
         Returns the combined linker flags (libdirs + libs + ldflags) for this library as a single string
         """
-        return self.details.getLinkerFlags(self.engineRoot, PrintingFormat.singleLine())
+        if "linkerFlags" not in self._resolved:
+            self._resolved["linkerFlags"] = self.details.getLinkerFlags(self.engineRoot, PrintingFormat.singleLine())
+        return self._resolved["linkerFlags"]
+    
+    def _resolve(self, field):
+        """
+        Resolves the engine root placeholders in the specified details field, memoising the result
+        """
+        if field not in self._resolved:
+            self._resolved[field] = self.details.resolveRoot(getattr(self.details, field), self.engineRoot)
+        return list(self._resolved[field])
+    
+    @staticmethod
+    def _retrieveDetails(libName):
+        """
+        Retrieves the details for the specified library from our on-disk cache, querying UnrealBuildTool if the cached details are stale
+        """
+        cacheFile = UE4Lib._cacheFile(libName)
+        if cacheFile is not None and os.path.exists(cacheFile):
+            try:
+                with open(cacheFile, "r") as f:
+                    cached = json.load(f)
+                fingerprint = UE4Lib._fingerprint(cached["buildFiles"])
+                if fingerprint is not None and fingerprint == cached["fingerprint"]:
+                    return ThirdPartyLibraryDetails(**cached["details"])
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+        
+        # Query UnrealBuildTool for the library details
+        details = UE4Lib._unreal.getThirdpartyLibs([libName], includePlatformDefaults = False)
+        
+        # Identify the build rules files for the library's modules, which live in the module root directories
+        buildFiles = sorted(set([buildFile for prefix in details.prefixDirs for buildFile in glob.glob(os.path.join(prefix, "*.Build.cs"))]))
+        
+        # Store the details in our on-disk cache, writing to a temporary file first so concurrent readers never see a partial file
+        # (We don't cache the details of unsupported libraries, so the warning emitted by ue4cli is still displayed for subsequent queries)
+        if cacheFile is not None and len(buildFiles) > 0:
+            try:
+                os.makedirs(os.path.dirname(cacheFile), exist_ok=True)
+                handle, tempFile = tempfile.mkstemp(dir=os.path.dirname(cacheFile), suffix=".tmp")
+                with os.fdopen(handle, "w") as f:
+                    json.dump({
+                        "buildFiles": buildFiles,
+                        "fingerprint": UE4Lib._fingerprint(buildFiles),
+                        "details": {field: getattr(details, field) for field in DETAILS_FIELDS}
+                    }, f)
+                os.replace(tempFile, cacheFile)
+            except OSError:
+                pass
+        
+        return details
+    
+    @staticmethod
+    def _cacheFile(libName):
+        """
+        Returns the path to the on-disk cache file for the specified library, or None if caching is unavailable
+        """
+        versionFile = os.path.join(UE4Lib._engineRoot, "Engine", "Build", "Build.version")
+        if os.environ.get(NO_CACHE_ENVVAR, "") == "1" or os.path.exists(versionFile) == False:
+            return None
+        
+        # Key the cache by the engine root and version details, so different engine installations and upgrades never share entries
+        key = hashlib.sha256()
+        key.update(os.path.abspath(UE4Lib._engineRoot).encode("utf-8") + b"\0")
+        with open(versionFile, "rb") as f:
+            key.update(f.read())
+        return os.path.join(ConfigurationManager.getConfigDirectory(), "cache", "ue4lib", "{}-{}.json".format(key.hexdigest()[:16], libName))
+    
+    @staticmethod
+    def _fingerprint(buildFiles):
+        """
+        Computes the fingerprint of the contents of the specified build rules files (or None if any of them is missing)
+        """
+        fingerprint = hashlib.sha256()
+        for buildFile in buildFiles:
+            try:
+                with open(buildFile, "rb") as f:
+                    fingerprint.update(buildFile.encode("utf-8") + b"\0" + hashlib.sha256(f.read()).digest())
+            except OSError:
+                return None
+        return fingerprint.hexdigest()
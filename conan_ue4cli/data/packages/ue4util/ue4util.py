@@ -1,15 +1,95 @@
-import glob, os
+import os, re
+
+# The file extensions of static libraries and shared libraries, which we use to rank matches when resolving library names
+STATIC_EXTENSIONS = [".a", ".lib"]
+SHARED_PATTERN = re.compile(r"\.(so(\.[0-9]+)*|dylib|dll)$")
+
+class DirectoryIndex:
+    """
+    Lists the contents of a directory once, and resolves any number of file names against it
+    """
+    
+    def __init__(self, directory):
+        self.directory = directory
+        self.entries = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+        self._resolved = {}
+    
+    def resolve(self, name):
+        """
+        Resolves the absolute path to the file whose name best matches the supplied name, or None if no file matches.
+        Files with exactly the supplied name are preferred, followed by library files named `NAME.EXT` or `libNAME.EXT`
+        and then any other file that contains the supplied name. Within each of these, static libraries are preferred
+        over shared libraries, then shorter filenames over longer ones, and then filenames are ordered alphabetically.
+        """
+        if name not in self._resolved:
+            
+            # As with glob, hidden files only match names that start with a dot
+            candidates = [
+                entry for entry in self.entries
+                if name in entry and (entry.startswith(".") == False or name.startswith("."))
+            ]
+            ranked = sorted(candidates, key=lambda entry: (self._rank(entry, name), len(entry), entry))
+            self._resolved[name] = os.path.join(self.directory, ranked[0]) if len(ranked) > 0 else None
+        
+        return self._resolved[name]
+    
+    def resolve_all(self, names):
+        """
+        Resolves each of the supplied names, returning a list of paths (or None for names that do not match any file)
+        """
+        return [self.resolve(name) for name in names]
+    
+    def _rank(self, entry, name):
+        
+        # Determine whether the file is a static library, a shared library, or some other type of file
+        static = os.path.splitext(entry)[1] in STATIC_EXTENSIONS
+        shared = SHARED_PATTERN.search(entry)
+        kind = 0 if static == True else (1 if shared is not None else 2)
+        
+        # Determine how closely the filename matches the supplied name
+        if entry == name:
+            return (0, kind)
+        stem = os.path.splitext(entry)[0] if static == True else (entry[:shared.start()] if shared is not None else None)
+        if stem is not None and (stem == name or stem == "lib" + name):
+            return (1, kind)
+        return (2, kind)
+
 
 class Utility:
     """
-    Provides utility functionality for packages consuming conan-ue4cli wrapper packages 
+    Provides utility functionality for packages consuming conan-ue4cli wrapper packages
     """
     
+    # The directory indices that we have already created in the current process, along with the modification time of each directory
+    _indices = {}
+    
+    @staticmethod
+    def index(searchdir):
+        """
+        Returns the DirectoryIndex for the specified directory, reusing the existing index if the directory is unchanged
+        """
+        try:
+            modified = os.stat(searchdir).st_mtime_ns
+        except OSError:
+            modified = None
+        cached = Utility._indices.get(searchdir)
+        if cached is None or cached[0] != modified:
+            cached = (modified, DirectoryIndex(searchdir))
+            Utility._indices[searchdir] = cached
+        return cached[1]
+    
     @staticmethod
     def resolve_file(searchdir, name):
         """
         Helper method to resolve the absolute path to a header/library/binary/etc.
         This is useful when the absolute path to a file needs to be passed to Configure/CMake/etc.
         """
-        matches = glob.glob(os.path.join(searchdir, "*{}*".format(name)))
-        return matches[0] if len(matches) > 0 else None
+        return Utility.index(searchdir).resolve(name)
+    
+    @staticmethod
+    def resolve_files(searchdir, names):
+        """
+        Resolves the absolute paths to multiple files in the same directory, listing the directory only once.
+        Returns a list of paths in the same order as the supplied names, with None for any names that do not match a file.
+        """
+        return Utility.index(searchdir).resolve_all(names)
@@ -25,6 +25,25 @@ class ${LIBNAME}Conan(ConanFile):
     def flags_filename(self):
         return os.path.join(self.package_folder, "flags.json")
     
+    def ordered_libs(self, copied):
+        
+        # List the library files in the order that UnrealBuildTool specified them, followed by any that were added by the package delegate
+        # (We recognise the same file extensions as `tools.collect_libs()`, and likewise strip any `lib` prefix from the library names)
+        libdir = os.path.join(self.package_folder, "lib")
+        present = sorted(os.listdir(libdir)) if os.path.isdir(libdir) else []
+        extensions = [".a", ".lib", ".so", ".dylib", ".bc"]
+        files = [f for f in copied if f in present] + [f for f in present if f not in copied and os.path.splitext(f)[1] in extensions]
+        
+        names = []
+        for filename in files:
+            name, ext = os.path.splitext(filename)
+            name = name[3:] if ext != ".lib" and name.startswith("lib") else name
+            if name not in names:
+                names.append(name)
+        
+        sizes = {filename: os.path.getsize(os.path.join(libdir, filename)) for filename in files}
+        return names, sizes
+    
     def package(self):
         
         # Retrieve the details for the wrapped library from ue4cli
@@ -47,6 +66,7 @@ class ${LIBNAME}Conan(ConanFile):
         # Copy any static library files into our package, ignoring shared libraries
         # and gathering a list of any system libraries that need to be linked against
         systemLibs = details.systemlibs()
+        copied = []
         for lib in details.libs():
             
             # Determine if this is a system library
@@ -59,6 +79,8 @@ class ${LIBNAME}Conan(ConanFile):
                 # Verify that the library file exists prior to attempting to copy it
                 if os.path.exists(lib) == True and os.path.isfile(lib) == True:
                     self.copy(os.path.basename(lib), "lib", src=os.path.dirname(lib))
+                    if os.path.basename(lib) not in copied:
+                        copied.append(os.path.basename(lib))
         
         # Serialise our defines and compiler flags so they can be retrieved later
         flags = {
@@ -68,10 +90,13 @@ class ${LIBNAME}Conan(ConanFile):
             "exelinkflags":    details.ldflags(),
             "systemlibs":      systemLibs
         }
-        tools.save(self.flags_filename(), json.dumps(flags))
         
         # Perform any package-specific post-build logic
         PackageDelegate.post_build(self)
+        
+        # Record the final ordered list of libraries and their sizes, so consumers don't need to scan our lib directory
+        flags["libs"], flags["libsizes"] = self.ordered_libs(copied)
+        tools.save(self.flags_filename(), json.dumps(flags))
     
     def package_info(self):
         
@@ -83,7 +108,8 @@ class ${LIBNAME}Conan(ConanFile):
         self.cpp_info.exelinkflags = flags["exelinkflags"]
         
         # Export our static libraries and system libraries
-        self.cpp_info.libs = tools.collect_libs(self)
+        # (Packages created by older versions of conan-ue4cli don't record their libraries, so we fall back to scanning for them)
+        self.cpp_info.libs = flags["libs"] if "libs" in flags else tools.collect_libs(self)
         self.cpp_info.system_libs = flags['systemlibs']
         
         # Perform any package-specific post-info logic
@@ -1,39 +1,117 @@
-from .commands import boilerplate, build, generate, precompute, sources, update
-import os, platform, sys
+import importlib, os, platform, sys, time
+
+# Our supported subcommands, mapped to the command modules that implement them
+# (Command modules are only imported when their subcommand is invoked, to keep plugin loading fast)
+SUBCOMMANDS = {
+	'bake': {
+		'module': 'precompute',
+		'description': 'Short alias for the precompute command'
+	},
+	'boilerplate': {
+		'module': 'boilerplate',
+		'description': 'Generates UE4 modules with boilerplate code for wrapping external dependencies'
+	},
+	'build': {
+		'module': 'build',
+		'description': 'Builds Conan packages that depend on conan-ue4cli wrappers'
+	},
+	'generate': {
+		'module': 'generate',
+		'description': 'Generates the UE4 Conan profile and associated packages'
+	},
+	'precompute': {
+		'module': 'precompute',
+		'description': 'Generates precomputed dependency data for UE4 boilerplate modules'
+	},
+	'sources': {
+		'module': 'sources',
+		'description': 'Retrieves the source code of the dependencies for one or more conanfiles'
+	},
+	'telemetry': {
+		'module': 'telemetry',
+		'description': 'Summarises the compile and link telemetry recorded by the toolchain wrapper'
+	},
+	'update': {
+		'module': 'update',
+		'description': 'Caches the latest recipe data from the ue4-conan-recipes repo'
+	}
+}
+
+# Our supported global options, which are specified before the subcommand
+# (Options with a metavar take a value, whilst options without one are simple flags)
+GLOBAL_OPTIONS = {
+	'--backend': {
+		'metavar': 'NAME',
+		'description': 'Runs Conan commands using the specified backend: "cli" or "api" (or set CONAN_UE4CLI_BACKEND)'
+	},
+	'--log': {
+		'metavar': 'FILE',
+		'description': 'Appends the output of the external commands that are run to the specified log file'
+	},
+	'--offline': {
+		'metavar': None,
+		'description': 'Runs Conan commands against the local cache only, without contacting any remotes (or set CONAN_UE4CLI_OFFLINE=1)'
+	},
+	'--trace': {
+		'metavar': 'FILE',
+		'description': 'Writes a Chrome trace of the external commands that are run (or set CONAN_UE4CLI_TRACE)'
+	}
+}
+
+def _resolveSubcommand(subcommand):
+	'''
+	Imports the command module for the specified subcommand and returns the function that implements it
+	'''
+	name = SUBCOMMANDS[subcommand]['module']
+	module = importlib.import_module('.commands.{}'.format(name), __package__)
+	return getattr(module, name)
+
+def _parseGlobalOptions(args):
+	'''
+	Parses the options that precede the subcommand, returning the option values and the remaining arguments
+	'''
+	options = {}
+	remaining = list(args)
+	while len(remaining) > 0 and remaining[0].startswith('--'):
+		option, _, value = remaining.pop(0).partition('=')
+		if option not in GLOBAL_OPTIONS:
+			raise RuntimeError('unrecognised option "{}"'.format(option))
+		if GLOBAL_OPTIONS[option]['metavar'] is not None and value == '':
+			if len(remaining) == 0:
+				raise RuntimeError('the {} option requires a value'.format(option))
+			value = remaining.pop(0)
+		options[option] = value if GLOBAL_OPTIONS[option]['metavar'] is not None else True
+	
+	return options, remaining
 
 def main(manager, args):
 	
-	# Our supported subcommands
-	SUBCOMMANDS = {
-		'bake': {
-			'function': precompute,
-			'description': 'Short alias for the precompute command'
-		},
-		'boilerplate': {
-			'function': boilerplate,
-			'description': 'Generates UE4 modules with boilerplate code for wrapping external dependencies'
-		},
-		'build': {
-			'function': build,
-			'description': 'Builds Conan packages that depend on conan-ue4cli wrappers'
-		},
-		'generate': {
-			'function': generate,
-			'description': 'Generates the UE4 Conan profile and associated packages'
-		},
-		'precompute': {
-			'function': precompute,
-			'description': 'Generates precomputed dependency data for UE4 boilerplate modules'
-		},
-		'sources': {
-			'function': sources,
-			'description': 'Retrieves the source code of the dependencies for one or more conanfiles'
-		},
-		'update': {
-			'function': update,
-			'description': 'Caches the latest recipe data from the ue4-conan-recipes repo'
-		}
-	}
+	# (Our common modules are imported here rather than at the top level, since the plugin descriptor imports this module)
+	from .common.CommandTracer import CommandTracer
+	from .common.ConanWorker import ConanWorker
+	from .common.OfflineMode import OfflineMode
+	from .common.SubprocessRunner import SubprocessRunner
+	
+	# Process any global options that precede the subcommand
+	try:
+		options, args = _parseGlobalOptions(args)
+		if '--trace' in options:
+			CommandTracer.enable(options['--trace'])
+		if '--backend' in options:
+			ConanWorker.setBackend(options['--backend'])
+		if '--log' in options:
+			SubprocessRunner.setLogFile(options['--log'])
+		if '--offline' in options:
+			OfflineMode.enable()
+	except RuntimeError as err:
+		print('Error: {}.'.format(err), file=sys.stderr)
+		return
+	
+	# Tracing can also be enabled via an environment variable, which is useful when we are invoked by other tools
+	CommandTracer.enableFromEnvironment()
+	
+	# Offline mode can also be enabled via an environment variable or the `offline` plugin setting
+	OfflineMode.enableFromConfiguration()
 	
 	# Determine if a subcommand has been specified
 	if len(args) > 0:
@@ -44,9 +122,14 @@ def main(manager, args):
 			print('Error: unrecognised subcommand "{}".'.format(subcommand), file=sys.stderr)
 			return
 		
-		# Invoke the subcommand
-		SUBCOMMANDS[subcommand]['function'](manager, args[1:])
-		
+		# Invoke the subcommand, recording it as the top-level span in the trace (if tracing is enabled)
+		started = time.time()
+		try:
+			_resolveSubcommand(subcommand)(manager, args[1:])
+		finally:
+			CommandTracer.record('ue4 conan {}'.format(subcommand), 'command', started, time.time(), {'args': args[1:]})
+			CommandTracer.write()
+	
 	else:
 		
 		# Determine the longest subcommand name so we can format our list in nice columns
@@ -62,4 +145,11 @@ def main(manager, args):
 				whitespace,
 				SUBCOMMANDS[subcommand]['description']
 			))
+		# Print our list of global options
+		longestName = max([len(o) + len(GLOBAL_OPTIONS[o]['metavar'] or '') for o in GLOBAL_OPTIONS])
+		print('\nGlobal options (specified before the subcommand):')
+		for option, details in GLOBAL_OPTIONS.items():
+			usage = '{} {}'.format(option, details['metavar']) if details['metavar'] is not None else option
+			whitespace = ' ' * ((longestName + minSpaces) - len(usage))
+			print('  {}{}{}'.format(usage, whitespace, details['description']))
 		print('\nRun `ue4 conan SUBCOMMAND --help` for more information on a subcommand.')
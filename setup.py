@@ -37,12 +37,16 @@ setup(
 		'ue4cli>=0.0.49',
 		'wheel'
 	],
+	extras_require = {
+		'zstd': ['zstandard']
+	},
 	package_data = {
 		'conan_ue4cli': [
 			'data/*/*.py',
 			'data/*/*/*.py',
 			'data/*/*/*/*.py',
-			'data/*/*/*.cs'
+			'data/*/*/*.cs',
+			'data/*/*/*.json'
 		]
 	},
 	entry_points = {
@@ -0,0 +1,124 @@
+'''
+Tests for conditional and atomic recipe cache updates, using a local HTTP server in place of GitHub.
+
+Example usage:
+	
+	python3 -m unittest discover -s tests -v
+'''
+import http.server, io, os, shutil, sys, tempfile, threading, unittest, zipfile
+from os.path import abspath, dirname, join
+from unittest import mock
+
+# Ensure we test the conan-ue4cli source tree that this script lives in, rather than any installed copy
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from conan_ue4cli.common import ConanTools, PluginConfiguration, RecipeCache
+
+
+class _RecipeServer(http.server.BaseHTTPRequestHandler):
+	'''
+	Serves a zip file of recipe data with an ETag, honouring If-None-Match, or a configurable error response
+	'''
+	
+	# The response that the server sends for each request, which the tests modify between updates
+	etag = '"v1"'
+	version = '1.0.0'
+	failure = None
+	requests = []
+	
+	def do_GET(self):
+		_RecipeServer.requests.append(dict(self.headers))
+		if _RecipeServer.failure == 'error':
+			self.send_error(500)
+			return
+		if self.headers.get('If-None-Match') == _RecipeServer.etag:
+			self.send_response(304)
+			self.end_headers()
+			return
+		
+		body = b'this is not a zip file' if _RecipeServer.failure == 'corrupt' else _RecipeServer._archive()
+		self.send_response(200)
+		self.send_header('ETag', _RecipeServer.etag)
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+	
+	def log_message(self, format, *args):
+		pass
+	
+	@staticmethod
+	def _archive():
+		buffer = io.BytesIO()
+		with zipfile.ZipFile(buffer, 'w') as zf:
+			zf.writestr('ue4-conan-recipes-master/example/{}/conanfile.py'.format(_RecipeServer.version), 'class Example(object):\n\tname = "example"\n\tversion = "{}"\n'.format(_RecipeServer.version))
+		return buffer.getvalue()
+
+
+class RecipeCacheTests(unittest.TestCase):
+	
+	def setUp(self):
+		
+		# Redirect our config directory (which holds both the recipe cache and our lock files) to a temporary directory
+		self.configDir = tempfile.mkdtemp()
+		self.patches = [
+			mock.patch.object(PluginConfiguration, 'getConfigDirectory', return_value=self.configDir),
+			mock.patch.object(ConanTools, 'getNetworkSettings', return_value=({}, ['*'], None))
+		]
+		for patch in self.patches:
+			patch.start()
+		
+		# Start the HTTP server on a free port
+		_RecipeServer.etag = '"v1"'
+		_RecipeServer.version = '1.0.0'
+		_RecipeServer.failure = None
+		_RecipeServer.requests = []
+		self.server = http.server.HTTPServer(('127.0.0.1', 0), _RecipeServer)
+		self.thread = threading.Thread(target=self.server.serve_forever)
+		self.thread.start()
+		self.url = 'http://127.0.0.1:{}/master.zip'.format(self.server.server_address[1])
+	
+	def tearDown(self):
+		self.server.shutdown()
+		self.server.server_close()
+		self.thread.join()
+		for patch in self.patches:
+			patch.stop()
+		shutil.rmtree(self.configDir)
+	
+	def _cachedVersions(self):
+		return sorted(os.listdir(join(RecipeCache.getCacheDirectory(), 'example')))
+	
+	def test_download_swaps_in_new_recipes(self):
+		self.assertTrue(RecipeCache.updateCache(self.url))
+		self.assertEqual(self._cachedVersions(), ['1.0.0'])
+		self.assertEqual(RecipeCache.getMetadata()['etag'], '"v1"')
+		
+		_RecipeServer.etag = '"v2"'
+		_RecipeServer.version = '2.0.0'
+		self.assertTrue(RecipeCache.updateCache(self.url))
+		self.assertEqual(self._cachedVersions(), ['2.0.0'])
+		self.assertEqual(_RecipeServer.requests[-1].get('If-None-Match'), '"v1"')
+	
+	def test_not_modified_returns_false(self):
+		self.assertTrue(RecipeCache.updateCache(self.url))
+		updated = RecipeCache.getMetadata()['updated']
+		self.assertFalse(RecipeCache.updateCache(self.url))
+		self.assertEqual(RecipeCache.getMetadata()['updated'], updated)
+		self.assertEqual(self._cachedVersions(), ['1.0.0'])
+	
+	def test_failed_download_leaves_cache_intact(self):
+		self.assertTrue(RecipeCache.updateCache(self.url))
+		for failure in ['error', 'corrupt']:
+			_RecipeServer.etag = '"v2"'
+			_RecipeServer.version = '2.0.0'
+			_RecipeServer.failure = failure
+			with self.assertRaises(RuntimeError):
+				RecipeCache.updateCache(self.url)
+			self.assertEqual(self._cachedVersions(), ['1.0.0'])
+			self.assertEqual(RecipeCache.getMetadata()['etag'], '"v1"')
+		
+		# No staging directories should be left behind alongside the cache
+		self.assertEqual([child for child in os.listdir(self.configDir) if child.startswith('.recipes-staging-')], [])
+
+
+if __name__ == '__main__':
+	unittest.main()